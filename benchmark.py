@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""
+benchmark.py  --version=1.0
+
+Measure migration throughput against an in-process fake NVP controller.
+
+A throw-away sqlite Quantum database is filled with synthetic networks and
+ports, then migrated once for every combination of the worker counts and
+batch sizes given. Every run starts from an empty fake controller. Each
+fake request sleeps for the given latency, so that the concurrency settings
+matter the way they do against a real cluster.
+
+Usage:
+  benchmark [--networks=<n>] [--ports=<n>] [--workers=<list>] [--batch-size=<list>] [--latency=<s>] [--db=<file>] [--diff] [--verbose]
+  benchmark -h | --help
+
+Options:
+  -h --help            Show this screen.
+  --networks=<n>       Number of networks to create. [default: 1000].
+  --ports=<n>          Number of ports to create per network. [default: 99].
+  --workers=<list>     Comma separated worker counts to try. [default: 1,10,50,100].
+  --batch-size=<list>  Comma separated database batch sizes to try. [default: 100,500,2000].
+  --latency=<s>        Seconds every controller request takes. [default: 0.005].
+  --db=<file>          sqlite file holding the synthetic database. [default: benchmark.db].
+  --diff               After each run, time a --mode=diff plan against the
+                       migrated controller, which pages through everything.
+  --verbose            Keep the per object logging of the migration, which
+                       slows it down noticeably.
+
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import logging
+import os
+import sys
+import time
+
+from docopt import docopt
+from oslo.config import cfg
+
+# Registers the models RetrieveValues reads before the tables are created
+from common import retvals
+from common import migrator
+from common import resync
+from common.drivers import fake_nvp
+from quantum.db import api as db
+from quantum.db import models_v2
+
+TENANT_ID = 'benchmark'
+# Rows inserted per statement while populating the database
+INSERT_CHUNK = 5000
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def _insert(session, model, rows):
+    table = model.__table__
+    for i in xrange(0, len(rows), INSERT_CHUNK):
+        session.execute(table.insert(), rows[i:i + INSERT_CHUNK])
+
+
+def populate(networks, ports_per_network):
+    """Fill the database with networks, one subnet each, and their ports."""
+    session = db.get_session()
+    with session.begin():
+        for n in xrange(networks):
+            net_id = 'net-%08d' % n
+            subnet_id = 'subnet-%08d' % n
+            cidr_prefix = '10.%d.%d' % (n // 256 % 256, n % 256)
+            _insert(session, models_v2.Network, [
+                {'id': net_id, 'tenant_id': TENANT_ID, 'name': net_id,
+                 'status': 'ACTIVE', 'admin_state_up': True,
+                 'shared': False}])
+            _insert(session, models_v2.Subnet, [
+                {'id': subnet_id, 'tenant_id': TENANT_ID,
+                 'network_id': net_id, 'ip_version': 4,
+                 'cidr': cidr_prefix + '.0/24',
+                 'gateway_ip': cidr_prefix + '.1',
+                 'enable_dhcp': True, 'shared': False}])
+            ports = []
+            allocations = []
+            for p in xrange(ports_per_network):
+                port_id = '%s-port-%05d' % (net_id, p)
+                ports.append(
+                    {'id': port_id, 'tenant_id': TENANT_ID,
+                     'network_id': net_id, 'name': port_id,
+                     'mac_address': 'fa:16:%02x:%02x:%02x:%02x' % (
+                         n // 65536 % 256, n // 256 % 256, n % 256, p % 256),
+                     'admin_state_up': True, 'status': 'ACTIVE',
+                     'device_id': 'vm-%d' % p,
+                     'device_owner': 'compute:nova'})
+                allocations.append(
+                    {'port_id': port_id, 'subnet_id': subnet_id,
+                     'network_id': net_id,
+                     'ip_address': '%s.%d' % (cidr_prefix, p % 253 + 2)})
+            _insert(session, models_v2.Port, ports)
+            _insert(session, models_v2.IPAllocation, allocations)
+
+
+def run_once(workers, batch_size, latency, diff):
+    controller = fake_nvp.FakeNvpController(latency=latency)
+    driver = fake_nvp.FakeNvpDriver(controller)
+    retriever = retvals.RetrieveValues(batch_size=batch_size)
+    runner = migrator.Migrator(driver, retriever, workers=workers,
+                               connected=False)
+    stages = (migrator.NETWORKS, migrator.PORTS)
+    start = time.time()
+    stats = runner.run(stages)
+    elapsed = time.time() - start
+    objects = sum(stats[stage][migrator.CREATED] for stage in stages)
+    failed = sum(stats[stage][migrator.FAILED] for stage in stages)
+    result = {'objects': objects, 'failed': failed, 'seconds': elapsed,
+              'requests': sum(controller.requests.values())}
+    if diff:
+        before = sum(controller.requests.values())
+        start = time.time()
+        plan = resync.DiffMigrator(driver, retriever,
+                                   workers=workers).build_plan(stages)
+        result['diff_seconds'] = time.time() - start
+        result['diff_requests'] = sum(controller.requests.values()) - before
+        result['diff_actions'] = sum(len(actions)
+                                     for actions in plan.itervalues())
+    return result
+
+
+def main(args):
+    networks = int(args['--networks'])
+    ports = int(args['--ports'])
+    latency = float(args['--latency'])
+    diff = args['--diff']
+    if not args['--verbose']:
+        # nvplib logs every object it creates at debug level
+        logging.disable(logging.INFO)
+
+    if os.path.exists(args['--db']):
+        os.remove(args['--db'])
+    cfg.CONF.set_override('sql_connection', 'sqlite:///%s' % args['--db'],
+                          'DATABASE')
+    db.configure_db()
+    start = time.time()
+    populate(networks, ports)
+    print "Populated %d networks and %d ports in %.1fs" % (
+        networks, networks * ports, time.time() - start)
+
+    header = "%8s %10s %9s %7s %9s %10s" % ('workers', 'batch-size',
+                                            'objects', 'failed', 'seconds',
+                                            'objects/s')
+    if diff:
+        header += " %9s %13s %8s" % ('diff(s)', 'diff requests', 'actions')
+    print header
+    for workers in parse_list(args['--workers']):
+        for batch_size in parse_list(args['--batch-size']):
+            res = run_once(workers, batch_size, latency, diff)
+            line = "%8d %10d %9d %7d %9.1f %10.0f" % (
+                workers, batch_size, res['objects'], res['failed'],
+                res['seconds'], res['objects'] / res['seconds'])
+            if diff:
+                line += " %9.1f %13d %8d" % (res['diff_seconds'],
+                                             res['diff_requests'],
+                                             res['diff_actions'])
+            print line
+            sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version='Quantum Migrate Benchmark 1.0')
+    sys.exit(main(args))
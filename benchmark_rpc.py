@@ -0,0 +1,122 @@
+#!/usr/bin/python
+"""
+benchmark_rpc.py  --version=1.0
+
+Measure RPC cast and call throughput, in process.
+
+A consumer and its callers run in the same process. impl_fake dispatches
+messages directly and gives the cost of the RPC layer itself. impl_kombu
+runs over the in-memory kombu transport, used for fake_rabbit, so that
+what the driver does for each message is measured without a broker: the
+publisher declarations, the channels and the reply queues. The kombu
+driver is timed without publisher reuse, as it used to work, with the
+default settings, and with amqp_rpc_single_reply_queue, which waits for
+the replies of every call on one queue instead of a queue per call.
+
+Usage:
+  benchmark_rpc [--messages=<n>] [--concurrency=<n>]
+  benchmark_rpc -h | --help
+
+Options:
+  -h --help            Show this screen.
+  --messages=<n>       Number of messages sent per case. [default: 2000].
+  --concurrency=<n>    Number of green threads sending them. [default: 8].
+
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import logging
+import sys
+import time
+
+from docopt import docopt
+from oslo.config import cfg
+
+from quantum.common import config
+from quantum import context
+from quantum.openstack.common import rpc
+from quantum.openstack.common.rpc import dispatcher
+from quantum.openstack.common.rpc import proxy
+
+TOPIC = 'benchmark'
+KOMBU = 'quantum.openstack.common.rpc.impl_kombu'
+FAKE = 'quantum.openstack.common.rpc.impl_fake'
+
+
+class Callback(object):
+    RPC_API_VERSION = '1.0'
+
+    def __init__(self):
+        self.received = 0
+
+    def echo(self, context, value):
+        self.received += 1
+        return value
+
+
+def timed(messages, concurrency, send):
+    pool = eventlet.GreenPool(concurrency)
+    start = time.time()
+    for i in xrange(messages):
+        pool.spawn_n(send, i)
+    pool.waitall()
+    return time.time() - start
+
+
+def run_case(backend, overrides, messages, concurrency):
+    cfg.CONF.set_override('rpc_backend', backend)
+    rpc._RPCIMPL = None
+    # The driver registers its options when imported
+    rpc._get_impl()
+    for name, value in overrides.iteritems():
+        cfg.CONF.set_override(name, value)
+    callback = Callback()
+    connection = rpc.create_connection(new=True)
+    connection.create_consumer(TOPIC, dispatcher.RpcDispatcher([callback]))
+    connection.consume_in_thread()
+    api = proxy.RpcProxy(topic=TOPIC, default_version='1.0')
+    ctx = context.get_admin_context_without_session()
+    try:
+        # Casts are only done once the consumer got them all
+        start = time.time()
+        timed(messages, concurrency,
+              lambda i: api.cast(ctx, api.make_msg('echo', value=i)))
+        while callback.received < messages:
+            eventlet.sleep(0.01)
+        cast_time = time.time() - start
+        call_time = timed(messages, concurrency,
+                          lambda i: api.call(ctx, api.make_msg('echo',
+                                                               value=i)))
+    finally:
+        connection.close()
+        rpc.cleanup()
+        for name in overrides:
+            cfg.CONF.clear_override(name)
+    return messages / cast_time, messages / call_time
+
+
+def main(args):
+    messages = int(args['--messages'])
+    concurrency = int(args['--concurrency'])
+    config.parse(args=[])
+    cfg.CONF.set_override('fake_rabbit', True)
+    logging.disable(logging.WARNING)
+
+    cases = (('impl_fake', FAKE, {}),
+             ('impl_kombu, no reuse', KOMBU,
+              {'rabbit_publisher_cache_size': 0}),
+             ('impl_kombu', KOMBU, {}),
+             ('impl_kombu, one queue', KOMBU,
+              {'amqp_rpc_single_reply_queue': True}))
+    print "%-22s %12s %12s" % ('case', 'casts/s', 'calls/s')
+    for name, backend, overrides in cases:
+        casts, calls = run_case(backend, overrides, messages, concurrency)
+        print "%-22s %12.0f %12.0f" % (name, casts, calls)
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__, version='Quantum Migrate RPC Benchmark 1.0')
+    sys.exit(main(args))
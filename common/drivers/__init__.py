@@ -0,0 +1,176 @@
+#!/usr/bin/python
+"""
+Controller drivers for migrate.py.
+
+A driver knows how to replay quantum objects on one kind of controller and
+how to read and remove what is already there. Drivers are looked up by the
+<cntlr> name given on the command line.
+
+"""
+from abc import ABCMeta, abstractmethod
+
+from quantum.openstack.common import importutils
+
+DRIVERS = {
+    'nvp': 'common.drivers.nvp.NvpDriver',
+    'fake-nvp': 'common.drivers.fake_nvp.FakeNvpDriver',
+}
+
+
+class DriverError(Exception):
+    """Raised when a driver cannot be set up or cannot honour a request."""
+
+
+class DriverNotFound(DriverError):
+    """Raised when no driver is registered under a name."""
+
+
+def get_driver_class(name):
+    """Return the driver class registered as name.
+
+    A full class path is accepted too, so that out of tree drivers do not
+    need to be registered.
+    """
+    path = DRIVERS.get(name, name)
+    try:
+        return importutils.import_class(path)
+    except ImportError:
+        raise DriverNotFound("No controller driver '%s', expected one of: "
+                             "%s" % (name, ', '.join(sorted(DRIVERS))))
+
+
+class ControllerDriver(object):
+    """
+    Minimum set of operations migrate.py needs from a controller.
+
+    Quantum objects are passed as the dicts built by RetrieveValues, the
+    controller objects returned by get and list methods are whatever the
+    controller hands out; list methods may return any iterable, to be
+    consumed once. Every create method returns the controller uuid of the
+    new object.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @classmethod
+    def from_config(cls, conf, workers):
+        """Build a driver out of the parsed configuration.
+
+        : param conf: oslo.config ConfigOpts holding the plugin options
+        : param workers: number of requests issued concurrently
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def create_switch(self, network):
+        pass
+
+    @abstractmethod
+    def get_switch(self, switch_id):
+        pass
+
+    @abstractmethod
+    def list_switches(self):
+        pass
+
+    @abstractmethod
+    def update_switch(self, switch_id, network):
+        pass
+
+    @abstractmethod
+    def delete_switch(self, switch_id):
+        pass
+
+    @abstractmethod
+    def create_port(self, switch_id, port):
+        pass
+
+    @abstractmethod
+    def get_port(self, switch_id, port_id):
+        pass
+
+    @abstractmethod
+    def list_ports(self, switch_id='*'):
+        pass
+
+    @abstractmethod
+    def find_port(self, quantum_port_id):
+        """Return the switch port created for a quantum port, or None."""
+        pass
+
+    @abstractmethod
+    def update_port(self, switch_id, port_id, port):
+        pass
+
+    @abstractmethod
+    def delete_port(self, switch_id, port_id):
+        pass
+
+    @abstractmethod
+    def create_router(self, router):
+        """Create a router together with its external gateway.
+
+        : returns: {'uuid': router uuid, 'gw_lport': gateway port uuid}
+        """
+        pass
+
+    @abstractmethod
+    def get_router(self, router_id):
+        pass
+
+    @abstractmethod
+    def list_routers(self):
+        pass
+
+    @abstractmethod
+    def update_router(self, router_id, router):
+        pass
+
+    @abstractmethod
+    def delete_router(self, router_id):
+        pass
+
+    @abstractmethod
+    def create_router_port(self, router_id, port, peer_port_id):
+        """Create a router interface patched to switch port peer_port_id."""
+        pass
+
+    @abstractmethod
+    def list_router_ports(self, router_id='*'):
+        pass
+
+    @abstractmethod
+    def update_router_port(self, router_id, port_id, port):
+        pass
+
+    @abstractmethod
+    def delete_router_port(self, router_id, port_id):
+        pass
+
+    @abstractmethod
+    def create_nat_rule(self, router_id, rule):
+        """Create a NAT rule.
+
+        : param rule: dict with 'type' (SourceNatRule, NoSourceNatRule or
+            DestinationNatRule), 'match', 'order' and the translated
+            addresses (to_source_ip_address_min/max or
+            to_destination_ip_address)
+        """
+        pass
+
+    @abstractmethod
+    def list_nat_rules(self, router_id='*'):
+        pass
+
+    @abstractmethod
+    def delete_nat_rule(self, router_id, rule_id):
+        pass
+
+    @abstractmethod
+    def update_gateway_ips(self, router_id, gw_port_id, ips_to_add,
+                           ips_to_remove):
+        """Add/remove addresses on the external gateway of a router.
+
+        : param gw_port_id: gateway port uuid, None to look it up
+        """
+        pass
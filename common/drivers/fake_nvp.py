@@ -0,0 +1,250 @@
+#!/usr/bin/python
+"""
+In-process stand-in for an NVP controller cluster.
+
+FakeNvpController answers the /ws.v1 requests nvplib issues for logical
+switches, logical routers, their ports and NAT rules, with the paging
+semantics of NVP: at most _page_length results per page (NVP default and
+maximum is 1000) and a page_cursor to send back as _page_cursor until the
+last page, which comes without one. It keeps everything in memory and is
+meant for benchmarking migrations at scale without a live controller.
+
+"""
+import collections
+import json
+import logging
+import urlparse
+import uuid
+
+import eventlet
+
+from common.drivers import nvp
+from quantum.plugins.nicira.nicira_nvp_plugin import nvp_cluster
+from quantum.plugins.nicira.nicira_nvp_plugin import NvpApiClient
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_VERSION = '3.1'
+MAX_PAGE_LENGTH = 1000
+
+# Fake uuids the fake cluster is configured with
+FAKE_TZ_UUID = '00000000-0000-0000-0000-00000000000a'
+FAKE_L3_GW_SERVICE_UUID = '00000000-0000-0000-0000-00000000000b'
+
+# Query parameters which are not filters
+_NON_FILTERS = ('fields', 'relations', '_page_length', '_page_cursor',
+                'tag', 'tag_scope')
+
+
+class FakeNvpController(object):
+    """
+    Implements request() and get_nvp_version() of NVPApiHelper.
+
+    @latency  seconds every request takes, to make concurrency matter
+    @version  NVP version reported to nvplib
+    """
+
+    # resource type -> child resource types
+    CHILDREN = {'lswitch': ('lport',), 'lrouter': ('lport', 'nat')}
+
+    def __init__(self, latency=0, version=DEFAULT_VERSION):
+        self.latency = latency
+        self.version = version
+        # (parent type, child type) or (type, None) -> {uuid: object}
+        self._objects = collections.defaultdict(dict)
+        # (parent type, child type) -> {parent uuid: set(child uuids)}
+        self._children = collections.defaultdict(
+            lambda: collections.defaultdict(set))
+        # page cursor -> remaining uuids of a listing
+        self._cursors = {}
+        self.requests = collections.defaultdict(int)
+
+    def get_nvp_version(self):
+        return self.version
+
+    def count(self, resource, child=None):
+        """Number of objects of a kind, e.g. count('lswitch', 'lport')."""
+        return len(self._objects[(resource, child)])
+
+    def request(self, method, url, body="", content_type="application/json"):
+        self.requests[method] += 1
+        if self.latency:
+            eventlet.sleep(self.latency)
+        parsed = urlparse.urlparse(url)
+        params = dict((k, v[0]) for k, v in
+                      urlparse.parse_qs(parsed.query).iteritems())
+        # /ws.v1/<type>[/<uuid>[/<child type>[/<uuid>[/attachment]]]]
+        parts = parsed.path.split('/')[2:]
+        resource = parts[0]
+        if resource not in self.CHILDREN:
+            raise NvpApiClient.ResourceNotFound()
+        parent_id = len(parts) > 1 and parts[1] or None
+        child = len(parts) > 2 and parts[2] or None
+        if child and child not in self.CHILDREN[resource]:
+            raise NvpApiClient.ResourceNotFound()
+        child_id = len(parts) > 3 and parts[3] or None
+        body = body and json.loads(body) or None
+        if child is None:
+            result = self._handle((resource, None), None, parent_id, method,
+                                  params, body)
+        elif len(parts) > 4 and parts[4] == 'attachment':
+            result = self._attach((resource, child), parent_id, child_id,
+                                  body)
+        else:
+            result = self._handle((resource, child), parent_id, child_id,
+                                  method, params, body)
+        return result is not None and json.dumps(result) or ""
+
+    def _handle(self, kind, parent_id, obj_id, method, params, body):
+        if method == "GET":
+            if obj_id:
+                return self._render(self._get(kind, obj_id), params)
+            return self._list(kind, parent_id, params)
+        if method == "POST":
+            return self._create(kind, parent_id, body)
+        if method == "PUT":
+            obj = self._get(kind, obj_id)
+            obj.update(body)
+            return self._render(obj, {})
+        if method == "DELETE":
+            self._delete(kind, obj_id)
+            return None
+        raise NvpApiClient.NvpApiException()
+
+    def _get(self, kind, obj_id):
+        try:
+            return self._objects[kind][obj_id]
+        except KeyError:
+            raise NvpApiClient.ResourceNotFound()
+
+    def _create(self, kind, parent_id, body):
+        resource, child = kind
+        if child:
+            # Make sure the parent exists
+            self._get((resource, None), parent_id)
+        obj = dict(body)
+        obj['uuid'] = str(uuid.uuid4())
+        if child:
+            obj['_href'] = "/ws.v1/%s/%s/%s/%s" % (resource, parent_id,
+                                                   child, obj['uuid'])
+            obj['_parent'] = parent_id
+            self._children[kind][parent_id].add(obj['uuid'])
+        else:
+            obj['_href'] = "/ws.v1/%s/%s" % (resource, obj['uuid'])
+        self._objects[kind][obj['uuid']] = obj
+        return self._render(obj, {})
+
+    def _delete(self, kind, obj_id):
+        obj = self._get(kind, obj_id)
+        resource, child = kind
+        if child:
+            self._children[kind][obj['_parent']].discard(obj_id)
+        else:
+            # Children go away with their parent
+            for child in self.CHILDREN[resource]:
+                child_kind = (resource, child)
+                for child_id in self._children[child_kind].pop(obj_id, ()):
+                    del self._objects[child_kind][child_id]
+        del self._objects[kind][obj_id]
+
+    def _attach(self, kind, parent_id, obj_id, body):
+        obj = self._get(kind, obj_id)
+        obj['_attachment'] = body
+        if body['type'] == 'PatchAttachment':
+            # NVP patches the peer port as well
+            peer_kind = (kind[0] == 'lrouter' and 'lswitch' or 'lrouter',
+                         'lport')
+            peer = self._get(peer_kind, body['peer_port_uuid'])
+            peer['_attachment'] = {'type': 'PatchAttachment',
+                                   'peer_port_uuid': obj_id}
+        return body
+
+    def _render(self, obj, params):
+        res = dict((k, v) for k, v in obj.iteritems()
+                   if k == '_href' or not k.startswith('_'))
+        relations = params.get('relations')
+        if relations:
+            res['_relations'] = {}
+            for relation in relations.split(','):
+                if relation == 'LogicalPortAttachment':
+                    attachment = obj.get('_attachment') or {
+                        'type': 'NoAttachment'}
+                    res['_relations'][relation] = attachment
+                else:
+                    res['_relations'][relation] = {'type': relation,
+                                                   'fabric_status': True}
+        return res
+
+    def _match(self, obj, params):
+        if 'tag' in params or 'tag_scope' in params:
+            if not any(tag['tag'] == params.get('tag', tag['tag']) and
+                       tag['scope'] == params.get('tag_scope', tag['scope'])
+                       for tag in obj.get('tags', [])):
+                return False
+        for key, value in params.iteritems():
+            if key in _NON_FILTERS:
+                continue
+            if key == 'attachment_gwsvc_uuid':
+                attachment = obj.get('_attachment') or {}
+                actual = attachment.get('l3_gateway_service_uuid')
+                if not actual or value not in ('*', actual):
+                    return False
+            elif key == 'attachment_vif_uuid':
+                attachment = obj.get('_attachment') or {}
+                if attachment.get('vif_uuid') != value:
+                    return False
+            elif obj.get(key) != value:
+                return False
+        return True
+
+    def _list(self, kind, parent_id, params):
+        page_length = min(int(params.get('_page_length', MAX_PAGE_LENGTH)),
+                          MAX_PAGE_LENGTH)
+        cursor = params.get('_page_cursor')
+        if cursor:
+            try:
+                remaining = self._cursors.pop(cursor)
+            except KeyError:
+                raise NvpApiClient.ResourceNotFound()
+        else:
+            if parent_id and parent_id != '*':
+                self._get((kind[0], None), parent_id)
+                candidates = self._children[kind][parent_id]
+            else:
+                candidates = self._objects[kind].keys()
+            # Snapshot the listing, objects deleted while paging are
+            # skipped like NVP does
+            remaining = sorted(obj_id for obj_id in candidates
+                               if self._match(self._objects[kind][obj_id],
+                                              params))
+            remaining.reverse()
+        results = []
+        objects = self._objects[kind]
+        while remaining and len(results) < page_length:
+            obj_id = remaining.pop()
+            if obj_id in objects:
+                results.append(self._render(objects[obj_id], params))
+        res = {'results': results, 'result_count': len(results)}
+        if remaining:
+            cursor = str(uuid.uuid4())
+            self._cursors[cursor] = remaining
+            res['page_cursor'] = cursor
+        return res
+
+
+class FakeNvpDriver(nvp.NvpDriver):
+    """NVP driver talking to a FakeNvpController."""
+
+    def __init__(self, controller=None):
+        self.controller = controller or FakeNvpController()
+        cluster = nvp_cluster.NVPCluster('fake')
+        cluster.add_controller('127.0.0.1', '443', 'admin', 'admin', 30, 10,
+                               2, 2, FAKE_TZ_UUID,
+                               default_l3_gw_service_uuid=(
+                                   FAKE_L3_GW_SERVICE_UUID))
+        cluster.api_client = self.controller
+        super(FakeNvpDriver, self).__init__(cluster)
+
+    @classmethod
+    def from_config(cls, conf, workers):
+        return cls()
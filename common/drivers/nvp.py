@@ -0,0 +1,229 @@
+#!/usr/bin/python
+"""
+Controller driver for Nicira NVP, built on the nvplib of the NVP plugin.
+
+Objects are replayed the way the NVP plugin creates them, so that a
+running plugin can manage them afterwards.
+
+"""
+import json
+import logging
+
+from common import drivers
+from quantum.db import l3_db
+from quantum.openstack.common import excutils
+from quantum.plugins.nicira.nicira_nvp_plugin import nvplib
+from quantum.plugins.nicira.nicira_nvp_plugin import QuantumPlugin
+
+LOG = logging.getLogger(__name__)
+
+# The NVP plugin creates routers with this next hop when the router has no
+# external gateway
+DEFAULT_NEXTHOP = '1.1.1.1'
+
+# Logical routers carry no reference to the quantum router they implement,
+# the migrated ones are tagged so that they can be found again
+ROUTER_TAG_SCOPE = 'q_router_id'
+
+# Largest page NVP hands out, fewer round trips for bulk reads
+PAGE_LENGTH = 1000
+
+
+class NvpDriver(drivers.ControllerDriver):
+    """
+    Replay quantum objects on an NVP cluster.
+
+    @cluster  NVPCluster requests are issued to
+    """
+
+    def __init__(self, cluster):
+        self.cluster = cluster
+
+    @classmethod
+    def from_config(cls, conf, workers):
+        nvp_opts, clusters_opts = QuantumPlugin.parse_config()
+        if not clusters_opts:
+            raise drivers.DriverError("No NVP clusters configured")
+        # One connection per worker so that requests do not queue up in
+        # the api client
+        clusters, default_cluster = QuantumPlugin.parse_clusters_opts(
+            clusters_opts, max(workers, nvp_opts.concurrent_connections),
+            nvp_opts.nvp_gen_timeout, nvp_opts.default_cluster_name)
+        return cls(default_cluster)
+
+    def _get(self, path):
+        return json.loads(nvplib.do_single_request(nvplib.HTTP_GET, path,
+                                                   cluster=self.cluster))
+
+    def _list(self, path):
+        # Objects are streamed page by page, the next page being fetched
+        # while the current one is consumed
+        return nvplib.iter_query_pages(
+            "%s?fields=*&_page_length=%d" % (path, PAGE_LENGTH),
+            self.cluster)
+
+    def create_switch(self, network):
+        binding = network.get('binding') or {}
+        lswitch = nvplib.create_lswitch(
+            self.cluster, network['tenant_id'], network['name'],
+            binding.get('binding_type'), binding.get('phy_uuid'),
+            binding.get('vlan_id'), quantum_net_id=network['id'],
+            shared=network['shared'])
+        return lswitch['uuid']
+
+    def get_switch(self, switch_id):
+        return self._get("/ws.v1/lswitch/%s" % switch_id)
+
+    def list_switches(self):
+        return self._list("/ws.v1/lswitch")
+
+    def update_switch(self, switch_id, network):
+        tags = [{'scope': 'quantum_net_id', 'tag': network['id']}]
+        if network['shared']:
+            tags.append({'scope': 'shared', 'tag': 'true'})
+        nvplib.update_lswitch(self.cluster, switch_id, network['name'],
+                              network['tenant_id'], tags=tags)
+
+    def delete_switch(self, switch_id):
+        nvplib.delete_networks(self.cluster, switch_id, [switch_id])
+
+    def _port_security(self, port):
+        # As in the plugin, no port security on router interfaces
+        return (port['port_security_enabled'] and
+                port['device_owner'] != l3_db.DEVICE_OWNER_ROUTER_INTF)
+
+    def create_port(self, switch_id, port):
+        lport = nvplib.create_lport(
+            self.cluster, switch_id, port['tenant_id'], port['id'],
+            port['name'], port['device_id'], port['admin_state_up'],
+            port['mac_address'], port['fixed_ips'],
+            self._port_security(port))
+        # Router interfaces get their patch attachment from the router
+        # port, once it exists
+        if port['device_owner'] != l3_db.DEVICE_OWNER_ROUTER_INTF:
+            try:
+                nvplib.plug_interface(self.cluster, switch_id,
+                                      lport['uuid'], "VifAttachment",
+                                      port['id'])
+            except Exception:
+                # Do not leave a half configured port behind, a resumed
+                # run creates it again
+                with excutils.save_and_reraise_exception():
+                    nvplib.delete_port(self.cluster, switch_id,
+                                       lport['uuid'])
+        return lport['uuid']
+
+    def get_port(self, switch_id, port_id):
+        return nvplib.get_port(self.cluster, switch_id, port_id)
+
+    def list_ports(self, switch_id='*'):
+        return self._list("/ws.v1/lswitch/%s/lport" % switch_id)
+
+    def find_port(self, quantum_port_id):
+        results = nvplib.query_lswitch_lports(
+            self.cluster, '*',
+            filters={'tag': quantum_port_id, 'tag_scope': 'q_port_id'})
+        return results and results[0] or None
+
+    def update_port(self, switch_id, port_id, port):
+        nvplib.update_port(
+            self.cluster, switch_id, port_id, port['id'], port['tenant_id'],
+            port['name'], port['device_id'], port['admin_state_up'],
+            port['mac_address'], port['fixed_ips'],
+            self._port_security(port))
+
+    def delete_port(self, switch_id, port_id):
+        nvplib.delete_port(self.cluster, switch_id, port_id)
+
+    def create_router(self, router):
+        lrouter = nvplib.create_lrouter(
+            self.cluster, router['tenant_id'], router['name'],
+            router['nexthop'] or DEFAULT_NEXTHOP,
+            tags=[{'scope': ROUTER_TAG_SCOPE, 'tag': router['id']}])
+        # The gateway port is created together with the router, otherwise
+        # the fabric status of the NVP router will be down
+        gw_port = router['gw_port'] or {}
+        gw_lport = nvplib.create_router_lport(
+            self.cluster, lrouter['uuid'], router['tenant_id'],
+            gw_port.get('id', 'fake'), gw_port.get('name', 'fake'), True,
+            gw_port.get('ip_addresses') or ['0.0.0.0/31'])
+        attachment = self.cluster.default_l3_gw_service_uuid
+        attachment_vlan = None
+        binding = router.get('gw_binding')
+        if (binding and binding['binding_type'] ==
+                QuantumPlugin.NetworkTypes.L3_EXT):
+            attachment = binding['phy_uuid']
+            attachment_vlan = binding['vlan_id']
+        nvplib.plug_router_port_attachment(self.cluster, lrouter['uuid'],
+                                           gw_lport['uuid'], attachment,
+                                           "L3GatewayAttachment",
+                                           attachment_vlan)
+        return {'uuid': lrouter['uuid'], 'gw_lport': gw_lport['uuid']}
+
+    def get_router(self, router_id):
+        return nvplib.get_lrouter(self.cluster, router_id)
+
+    def list_routers(self):
+        return self._list("/ws.v1/lrouter")
+
+    def update_router(self, router_id, router):
+        nvplib.update_lrouter(self.cluster, router_id, router['name'],
+                              router['nexthop'] or DEFAULT_NEXTHOP)
+
+    def delete_router(self, router_id):
+        nvplib.delete_lrouter(self.cluster, router_id)
+
+    def create_router_port(self, router_id, port, peer_port_id):
+        lport = nvplib.create_router_lport(
+            self.cluster, router_id, port['tenant_id'], port['id'],
+            port['name'], port['admin_state_up'], port['ip_addresses'])
+        nvplib.plug_router_port_attachment(self.cluster, router_id,
+                                           lport['uuid'], peer_port_id,
+                                           "PatchAttachment")
+        return lport['uuid']
+
+    def list_router_ports(self, router_id='*'):
+        return self._list("/ws.v1/lrouter/%s/lport" % router_id)
+
+    def update_router_port(self, router_id, port_id, port):
+        nvplib.update_router_lport(
+            self.cluster, router_id, port_id, port['tenant_id'], port['id'],
+            port['name'], port['admin_state_up'], port['ip_addresses'])
+
+    def delete_router_port(self, router_id, port_id):
+        nvplib.delete_router_lport(self.cluster, router_id, port_id)
+
+    def create_nat_rule(self, router_id, rule):
+        if rule['type'] == 'SourceNatRule':
+            nat_rule = nvplib.create_lrouter_snat_rule(
+                self.cluster, router_id, rule['to_source_ip_address_min'],
+                rule['to_source_ip_address_max'], order=rule.get('order'),
+                match_criteria=rule['match'])
+        elif rule['type'] == 'NoSourceNatRule':
+            nat_rule = nvplib.create_lrouter_nosnat_rule(
+                self.cluster, router_id, order=rule.get('order'),
+                match_criteria=rule['match'])
+        elif rule['type'] == 'DestinationNatRule':
+            nat_rule = nvplib.create_lrouter_dnat_rule(
+                self.cluster, router_id, rule['to_destination_ip_address'],
+                order=rule.get('order'), match_criteria=rule['match'])
+        else:
+            raise drivers.DriverError("Unsupported NAT rule type %s" %
+                                      rule['type'])
+        # No SNAT rules do not exist before NVP 3.0
+        return nat_rule and nat_rule['uuid']
+
+    def list_nat_rules(self, router_id='*'):
+        return self._list("/ws.v1/lrouter/%s/nat" % router_id)
+
+    def delete_nat_rule(self, router_id, rule_id):
+        nvplib.delete_router_nat_rule(self.cluster, router_id, rule_id)
+
+    def update_gateway_ips(self, router_id, gw_port_id, ips_to_add,
+                           ips_to_remove):
+        if not gw_port_id:
+            gw_port_id = nvplib.find_router_gw_port(None, self.cluster,
+                                                    router_id)['uuid']
+        nvplib.update_lrouter_port_ips(self.cluster, router_id, gw_port_id,
+                                       ips_to_add=ips_to_add,
+                                       ips_to_remove=ips_to_remove)
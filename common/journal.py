@@ -0,0 +1,103 @@
+#!/usr/bin/python
+"""
+Append-only record of what a migration already pushed to the controller.
+
+Every line is a JSON object {stage, id, state, result}; the last line seen
+for an object wins. Objects go from pending (handed to a worker) to created
+(the controller accepted it, result holds what the next stages need) and,
+for ports of a connected controller, to verified once
+quantum_nvp_port_mapping points at the new logical port.
+
+Writes are buffered and fsync'ed every sync_every entries or sync_interval
+seconds, whichever comes first. Entries lost in a host crash only make a
+resumed run replay a few objects again.
+
+"""
+import json
+import logging
+import os
+import time
+
+LOG = logging.getLogger(__name__)
+
+PENDING = 'pending'
+CREATED = 'created'
+VERIFIED = 'verified'
+# States a resumed run does not replay
+DONE_STATES = (CREATED, VERIFIED)
+
+DEFAULT_SYNC_EVERY = 500
+DEFAULT_SYNC_INTERVAL = 1.0
+
+
+class Journal(object):
+    """
+    Migration journal backed by a file.
+
+    @path           journal file
+    @resume         load the existing journal and append to it, otherwise
+                    the file is truncated
+    @sync_every     fsync after this many entries
+    @sync_interval  fsync when the last one is older than this many seconds
+    """
+
+    def __init__(self, path, resume=False, sync_every=DEFAULT_SYNC_EVERY,
+                 sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # (stage, id) -> last entry, only filled when resuming
+        self.entries = {}
+        if resume:
+            if os.path.exists(path):
+                self._load()
+            else:
+                LOG.warning("Journal %s not found, nothing to resume", path)
+        self._file = open(path, resume and 'a' or 'w')
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+    def _load(self):
+        size = 0
+        with open(self.path, 'r+') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    # Torn write at the end of an interrupted run, cut it
+                    # off or the next entry would be appended to it
+                    LOG.warning("Ignoring incomplete journal entry: %r",
+                                line)
+                    f.truncate(size)
+                    break
+                size += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    LOG.warning("Ignoring corrupt journal entry: %r", line)
+                    continue
+                self.entries[(entry['stage'], entry['id'])] = entry
+        LOG.info("Loaded %d journal entries from %s", len(self.entries),
+                 self.path)
+
+    def get(self, stage, obj_id):
+        """Return the last entry for an object, None if there is none."""
+        return self.entries.get((stage, obj_id))
+
+    def write(self, stage, obj_id, state, result=None):
+        self._file.write(json.dumps({'stage': stage, 'id': obj_id,
+                                     'state': state,
+                                     'result': result}) + '\n')
+        self._unsynced += 1
+        if (self._unsynced >= self.sync_every or
+                time.time() - self._last_sync >= self.sync_interval):
+            self.sync()
+
+    def sync(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.time()
+
+    def close(self):
+        self.sync()
+        self._file.close()
@@ -0,0 +1,346 @@
+#!/usr/bin/python
+"""
+Replay Quantum/Nuetron logical state onto a network controller.
+
+Objects are streamed out of the Quantum database by RetrieveValues and pushed
+to the controller through its driver by a bounded pool of green threads.
+Stages run in dependency order (networks, ports, routers, router interfaces
+and floating ips) and each stage is drained before the next one starts, so a
+port is never created before its logical switch.
+
+"""
+import collections
+import functools
+import logging
+import sys
+import time
+
+import eventlet
+
+from common import journal as mjournal
+from quantum.db import api as db
+from quantum.db import l3_db
+from quantum.plugins.nicira.nicira_nvp_plugin import nicira_models
+from quantum.plugins.nicira.nicira_nvp_plugin import (nicira_networkgw_db
+                                                      as networkgw_db)
+from quantum.plugins.nicira.nicira_nvp_plugin import QuantumPlugin
+
+LOG = logging.getLogger(__name__)
+
+# Number of objects in flight against the controller at any time
+DEFAULT_WORKERS = 10
+
+NETWORKS = 'networks'
+PORTS = 'ports'
+ROUTERS = 'routers'
+INTERFACES = 'interfaces'
+FLOATINGIPS = 'floatingips'
+# Dependency order, every stage relies on the ones before it
+STAGES = (NETWORKS, PORTS, ROUTERS, INTERFACES, FLOATINGIPS)
+
+CREATED = 'created'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+# Already done according to the journal of an earlier run
+RESUMED = 'resumed'
+
+
+class MigrationSkipped(Exception):
+    """Raised by a replay function when an object cannot be replayed."""
+
+
+class Migrator(object):
+    """
+    Push the logical state read by a RetrieveValues instance to a controller.
+
+    @driver     ControllerDriver of the controller the objects are created on
+    @retriever  RetrieveValues used to stream objects out of the database
+    @workers    size of the green thread pool issuing controller requests
+    @connected  when True quantum_nvp_port_mapping is updated with the new
+                logical port uuids so a running NVP plugin picks them up
+    @journal    optional Journal; objects it has as done are not replayed
+    """
+
+    # Outcomes counted for every stage
+    STATUSES = (CREATED, FAILED, SKIPPED, RESUMED)
+
+    def __init__(self, driver, retriever, workers=DEFAULT_WORKERS,
+                 connected=True, journal=None):
+        self.driver = driver
+        self.retriever = retriever
+        self.workers = workers
+        self.connected = connected
+        self.journal = journal
+        self.pool = eventlet.GreenPool(workers)
+        self.stats = {}
+        self._done = set()
+        # network id -> lswitch uuid
+        self._lswitches = {}
+        # router id -> {'uuid': lrouter uuid, 'gw_lport': gw lport uuid}
+        self._lrouters = {}
+        # router interface port id -> lswitch lport uuid
+        self._router_lports = {}
+        # Floating ips update the gateway port with a read-modify-write,
+        # so requests touching the same router must not overlap
+        self._router_locks = collections.defaultdict(
+            eventlet.semaphore.Semaphore)
+        # Writes go through their own session, the retriever session is
+        # busy streaming
+        self._session = None
+        # Port mappings are written once the stage is drained: the
+        # retriever holds its cursor open until then, and sqlite does not
+        # let another connection write while a read is in progress
+        self._pending_mappings = []
+        # network id -> transport zone binding, loaded on first use
+        self._bindings = None
+
+    def run(self, stages=STAGES):
+        """Run the requested stages in dependency order.
+
+        @return a dict stage -> {<status>: count, 'seconds': elapsed}
+        """
+        for stage in STAGES:
+            if stage in stages:
+                self._run_stage(stage)
+        return self.stats
+
+    def _attempt(self, replay, item):
+        try:
+            return item, CREATED, replay(item)
+        except MigrationSkipped as e:
+            return item, SKIPPED, e
+        except Exception as e:
+            return item, FAILED, e
+
+    def _guard(self, stream, failures):
+        """Stop cleanly on a database error and remember it.
+
+        GreenPool.imap reads the stream from a separate green thread; an
+        exception raised there would leave the consumer waiting forever.
+        """
+        try:
+            for item in stream:
+                yield item
+        except Exception:
+            failures.append(sys.exc_info())
+
+    def _restore(self, stage, record, item, entry):
+        """Bring back what a journaled object left in the maps."""
+        restore = getattr(self, '_restore_%s' % stage, None)
+        if restore:
+            restore(item, entry)
+        elif record:
+            record(item, entry['result'])
+
+    def _journaled(self, stage, stream, record, counts):
+        """Filter out objects already done, mark the others pending."""
+        for item in stream:
+            entry = self.journal.get(stage, item['id'])
+            if entry and entry['state'] in mjournal.DONE_STATES:
+                self._restore(stage, record, item, entry)
+                counts[RESUMED] += 1
+                continue
+            self.journal.write(stage, item['id'], mjournal.PENDING)
+            yield item
+
+    def _stage_ops(self, stage):
+        """Return the (stream, replay, record) of a stage."""
+        return (getattr(self, '_stream_%s' % stage)(),
+                getattr(self, '_replay_%s' % stage),
+                getattr(self, '_record_%s' % stage, None))
+
+    def _run_stage(self, stage):
+        LOG.info("Migrating %s with %d workers", stage, self.workers)
+        stream_failures = []
+        stream, replay, record = self._stage_ops(stage)
+        counts = dict.fromkeys(self.STATUSES, 0)
+        if self.journal:
+            stream = self._journaled(stage, stream, record, counts)
+        stream = self._guard(stream, stream_failures)
+        start = time.time()
+        # imap keeps at most self.workers objects in flight, and consumes
+        # the database stream only as fast as the controller answers
+        for item, status, result in self.pool.imap(
+                functools.partial(self._attempt, replay), stream):
+            counts[status] += 1
+            if status == SKIPPED:
+                LOG.warning("Skipped %s %s: %s", stage, item['id'], result)
+            elif status == FAILED:
+                LOG.error("Failed to migrate %s %s: %s",
+                          stage, item['id'], result)
+            else:
+                if self.journal:
+                    self.journal.write(stage, item['id'], mjournal.CREATED,
+                                       result)
+                if record:
+                    record(item, result)
+        self._flush_mappings()
+        if stream_failures:
+            exc_info = stream_failures[0]
+            raise exc_info[0], exc_info[1], exc_info[2]
+        counts['seconds'] = time.time() - start
+        self.stats[stage] = counts
+        self._done.add(stage)
+        LOG.info("Migrated %s: %s in %.1fs", stage,
+                 ', '.join('%d %s' % (counts[status], status)
+                           for status in self.STATUSES),
+                 counts['seconds'])
+
+    def _lswitch_uuid(self, network_id):
+        if NETWORKS not in self._done:
+            # Switches were not replayed in this run, the NVP plugin uses
+            # the quantum network id as lswitch uuid
+            return network_id
+        if network_id not in self._lswitches:
+            raise MigrationSkipped("logical switch for network %s was not "
+                                   "migrated" % network_id)
+        return self._lswitches[network_id]
+
+    def _lrouter(self, router_id):
+        if ROUTERS not in self._done:
+            return {'uuid': router_id, 'gw_lport': None}
+        if router_id not in self._lrouters:
+            raise MigrationSkipped("logical router %s was not migrated" %
+                                   router_id)
+        return self._lrouters[router_id]
+
+    def _binding_dict(self, network_id):
+        if self._bindings is None:
+            # Only provider networks have a binding, read them all at once
+            # rather than once per network
+            query = self.retriever.context.session.query(
+                nicira_models.NvpNetworkBinding)
+            self._bindings = dict(
+                (binding.network_id, {'binding_type': binding.binding_type,
+                                      'phy_uuid': binding.phy_uuid,
+                                      'vlan_id': binding.vlan_id})
+                for binding in query)
+            self.retriever.context.session.expunge_all()
+        return self._bindings.get(network_id)
+
+    def _stream_networks(self):
+        for network in self.retriever.get_networks_stream():
+            network['binding'] = self._binding_dict(network['id'])
+            yield network
+
+    def _replay_networks(self, network):
+        return self.driver.create_switch(network)
+
+    def _record_networks(self, network, lswitch_uuid):
+        self._lswitches[network['id']] = lswitch_uuid
+
+    def _stream_ports(self):
+        return self.retriever.get_ports_stream()
+
+    def _replay_ports(self, port):
+        if port['device_owner'] == networkgw_db.DEVICE_OWNER_NET_GW_INTF:
+            raise MigrationSkipped("network gateway connections are not "
+                                   "migrated")
+        return self.driver.create_port(self._lswitch_uuid(port['network_id']),
+                                       port)
+
+    def _record_ports(self, port, lport_uuid):
+        if port['device_owner'] == l3_db.DEVICE_OWNER_ROUTER_INTF:
+            self._router_lports[port['id']] = lport_uuid
+        if self.connected:
+            self._pending_mappings.append((port['id'], lport_uuid))
+
+    def _flush_mappings(self):
+        """Point quantum_nvp_port_mapping at the new logical ports."""
+        if not self._pending_mappings:
+            return
+        if not self._session:
+            self._session = db.get_session()
+        table = nicira_models.QuantumNvpPortMapping.__table__
+        batch_size = self.retriever.batch_size
+        # Two statements per batch, replacing whatever mapping was there
+        for i in xrange(0, len(self._pending_mappings), batch_size):
+            batch = self._pending_mappings[i:i + batch_size]
+            with self._session.begin(subtransactions=True):
+                self._session.execute(table.delete().where(
+                    table.c.quantum_id.in_([q_id for q_id, _n in batch])))
+                self._session.execute(table.insert(), [
+                    {'quantum_id': q_id, 'nvp_id': nvp_id}
+                    for q_id, nvp_id in batch])
+            if self.journal:
+                for quantum_id, nvp_id in batch:
+                    self.journal.write(PORTS, quantum_id,
+                                       mjournal.VERIFIED, nvp_id)
+        self._pending_mappings = []
+
+    def _restore_ports(self, port, entry):
+        if entry['state'] != mjournal.VERIFIED:
+            # The mapping may not have been written before the interruption
+            self._record_ports(port, entry['result'])
+        elif port['device_owner'] == l3_db.DEVICE_OWNER_ROUTER_INTF:
+            self._router_lports[port['id']] = entry['result']
+
+    def _stream_routers(self):
+        for router in self.retriever.get_routers_stream():
+            router['gw_binding'] = None
+            if router['gw_port']:
+                router['gw_binding'] = self._binding_dict(
+                    router['gw_port']['network_id'])
+            yield router
+
+    def _replay_routers(self, router):
+        return self.driver.create_router(router)
+
+    def _record_routers(self, router, lrouter):
+        self._lrouters[router['id']] = lrouter
+
+    def _stream_interfaces(self):
+        return self.retriever.get_router_interfaces_stream()
+
+    def _find_router_lport(self, port):
+        if port['id'] in self._router_lports:
+            return self._router_lports[port['id']]
+        if PORTS in self._done:
+            raise MigrationSkipped("switch port %s was not migrated" %
+                                   port['id'])
+        lport = self.driver.find_port(port['id'])
+        if not lport:
+            raise MigrationSkipped("switch port %s not found on the "
+                                   "controller" % port['id'])
+        return lport['uuid']
+
+    def _replay_interfaces(self, port):
+        lrouter = self._lrouter(port['router_id'])
+        lr_lport = self.driver.create_router_port(
+            lrouter['uuid'], port, self._find_router_lport(port))
+        for cidr in port['cidrs']:
+            if port['snat_ip']:
+                self.driver.create_nat_rule(lrouter['uuid'], {
+                    'type': 'SourceNatRule',
+                    'to_source_ip_address_min': port['snat_ip'],
+                    'to_source_ip_address_max': port['snat_ip'],
+                    'order': QuantumPlugin.NVP_EXTGW_NAT_RULES_ORDER,
+                    'match': {'source_ip_addresses': cidr}})
+            self.driver.create_nat_rule(lrouter['uuid'], {
+                'type': 'NoSourceNatRule',
+                'order': QuantumPlugin.NVP_NOSNAT_RULES_ORDER,
+                'match': {'destination_ip_addresses': cidr}})
+        return lr_lport
+
+    def _stream_floatingips(self):
+        return self.retriever.get_floatingips_stream()
+
+    def _replay_floatingips(self, fip):
+        lrouter = self._lrouter(fip['router_id'])
+        self.driver.create_nat_rule(lrouter['uuid'], {
+            'type': 'DestinationNatRule',
+            'to_destination_ip_address': fip['fixed_ip_address'],
+            'order': QuantumPlugin.NVP_FLOATINGIP_NAT_RULES_ORDER,
+            'match': {'destination_ip_addresses':
+                      fip['floating_ip_address']}})
+        self.driver.create_nat_rule(lrouter['uuid'], {
+            'type': 'SourceNatRule',
+            'to_source_ip_address_min': fip['floating_ip_address'],
+            'to_source_ip_address_max': fip['floating_ip_address'],
+            'order': QuantumPlugin.NVP_FLOATINGIP_NAT_RULES_ORDER,
+            'match': {'source_ip_addresses': fip['fixed_ip_address']}})
+        with self._router_locks[lrouter['uuid']]:
+            self.driver.update_gateway_ips(lrouter['uuid'],
+                                           lrouter['gw_lport'],
+                                           fip['ip_addresses'], [])
+        return lrouter['uuid']
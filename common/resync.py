@@ -0,0 +1,438 @@
+#!/usr/bin/python
+"""
+Incremental resync of Quantum/Nuetron logical state onto an NVP cluster.
+
+Instead of replaying everything, the logical state of the cluster is bulk
+fetched through the list methods of the driver, indexed by quantum id and
+compared with the quantum database. Only missing, divergent and orphaned objects end
+up in the plan, which can be printed (dry run) or executed.
+
+"""
+import collections
+import functools
+import logging
+
+from common.drivers import nvp
+from common import migrator
+from quantum.db import l3_db
+from quantum.db import models_v2
+from quantum.plugins.nicira.nicira_nvp_plugin import nvplib
+
+LOG = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+TENANT_TAG_SCOPE = 'os_tid'
+NET_TAG_SCOPE = 'quantum_net_id'
+PORT_TAG_SCOPE = 'q_port_id'
+# q_port_id of the gateway port of routers created without one
+FAKE_PORT_ID = 'fake'
+
+
+def _tag(nvp_obj, scope):
+    for tag in nvp_obj.get('tags') or []:
+        if tag['scope'] == scope:
+            return tag['tag']
+
+
+def _parent_uuid(nvp_obj):
+    """Return the lswitch/lrouter uuid out of a child resource _href."""
+    # /ws.v1/<parent type>/<parent uuid>/<type>/<uuid>
+    return nvp_obj['_href'].split('/')[3]
+
+
+def _truncate(name):
+    return (name or '')[:nvplib.MAX_DISPLAY_NAME_LEN]
+
+
+def _action(action, obj_id, item=None, nvp=None, reason=''):
+    return {'action': action, 'id': obj_id, 'item': item, 'nvp': nvp,
+            'reason': reason}
+
+
+class NvpIndex(object):
+    """
+    Logical state of an NVP cluster, indexed by quantum id.
+
+    Every index maps a quantum id to the list of NVP objects claiming it,
+    more than one means duplicates left behind by an earlier replay.
+
+    @driver  NvpDriver, or any driver handing out NVP shaped objects
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        # network id -> [lswitch]
+        self.lswitches = collections.defaultdict(list)
+        # port id -> [lswitch lport]
+        self.lports = collections.defaultdict(list)
+        # router id -> [lrouter]
+        self.lrouters = collections.defaultdict(list)
+        # port id -> [lrouter lport]
+        self.lrouter_lports = collections.defaultdict(list)
+        # lrouter uuid -> [nat rule]
+        self.nat_rules = collections.defaultdict(list)
+
+    def load(self, stages=migrator.STAGES):
+        """Fetch what the requested stages need to be planned."""
+        if set(stages) & set((migrator.NETWORKS, migrator.PORTS)):
+            for lswitch in self.driver.list_switches():
+                # The NVP plugin only tags the extra switches of a network,
+                # the first one has the network id as uuid
+                key = _tag(lswitch, NET_TAG_SCOPE) or lswitch['uuid']
+                self.lswitches[key].append(lswitch)
+        if set(stages) & set((migrator.PORTS, migrator.INTERFACES)):
+            for lport in self.driver.list_ports():
+                key = _tag(lport, PORT_TAG_SCOPE)
+                if key:
+                    self.lports[key].append(lport)
+        if set(stages) - set((migrator.NETWORKS, migrator.PORTS)):
+            for lrouter in self.driver.list_routers():
+                key = (_tag(lrouter, nvp.ROUTER_TAG_SCOPE) or
+                       lrouter['uuid'])
+                self.lrouters[key].append(lrouter)
+        if migrator.INTERFACES in stages:
+            for lport in self.driver.list_router_ports():
+                key = _tag(lport, PORT_TAG_SCOPE)
+                if key:
+                    self.lrouter_lports[key].append(lport)
+        if migrator.FLOATINGIPS in stages:
+            for rule in self.driver.list_nat_rules():
+                self.nat_rules[_parent_uuid(rule)].append(rule)
+        LOG.info("Indexed %d lswitches, %d lports, %d lrouters, %d lrouter "
+                 "lports and %d nat rules", len(self.lswitches),
+                 len(self.lports), len(self.lrouters),
+                 len(self.lrouter_lports), len(self.nat_rules))
+        return self
+
+
+class DiffMigrator(migrator.Migrator):
+    """
+    Migrator which only replays what the cluster is missing.
+
+    A plan is built per stage: quantum objects without an NVP counterpart
+    are created, divergent ones updated, and NVP objects whose quantum id
+    no longer exists (or which duplicate another one) are deleted.
+
+    @index  NvpIndex of the cluster, loaded on demand when None
+    """
+
+    STATUSES = (migrator.CREATED, UPDATED, DELETED, migrator.FAILED,
+                migrator.SKIPPED, migrator.RESUMED)
+    _STATUS = {CREATE: migrator.CREATED, UPDATE: UPDATED, DELETE: DELETED}
+
+    def __init__(self, driver, retriever, index=None, **kwargs):
+        super(DiffMigrator, self).__init__(driver, retriever, **kwargs)
+        self.index = index
+        self.plan = None
+        self._deleted_lswitches = set()
+        self._deleted_lrouters = set()
+
+    def build_plan(self, stages=migrator.STAGES):
+        """Compare the database with the cluster.
+
+        @return a dict stage -> list of actions
+        """
+        if self.index is None:
+            self.index = NvpIndex(self.driver).load(stages)
+        self.plan = {}
+        for stage in migrator.STAGES:
+            if stage in stages:
+                self.plan[stage] = list(getattr(self,
+                                                '_plan_%s' % stage)())
+        return self.plan
+
+    def run(self, stages=migrator.STAGES):
+        if self.plan is None:
+            self.build_plan(stages)
+        return super(DiffMigrator, self).run(stages)
+
+    def _attempt(self, replay, action):
+        item, status, result = super(DiffMigrator, self)._attempt(replay,
+                                                                  action)
+        if status == migrator.CREATED:
+            status = self._STATUS[action['action']]
+        return item, status, result
+
+    def _stage_ops(self, stage):
+        return (iter(self.plan[stage]),
+                functools.partial(self._execute, stage),
+                functools.partial(self._record_action, stage))
+
+    def _restore(self, stage, record, action, entry):
+        record(action, entry['result'])
+
+    def _execute(self, stage, action):
+        if action['action'] == CREATE:
+            return getattr(self, '_replay_%s' % stage)(action['item'])
+        return getattr(self, '_%s_%s' % (action['action'], stage))(action)
+
+    def _record_action(self, stage, action, result):
+        record = getattr(self, '_record_%s' % stage, None)
+        if record and action['action'] == CREATE:
+            record(action['item'], result)
+        elif stage == migrator.PORTS and action['action'] == UPDATE:
+            # Refresh the mapping, it may point at a stale lport
+            record(action['item'], action['nvp']['uuid'])
+
+    # Objects created in this run are looked up first, then the index
+
+    def _lswitch_uuid(self, network_id):
+        if network_id in self._lswitches:
+            return self._lswitches[network_id]
+        if not self.index.lswitches.get(network_id):
+            raise migrator.MigrationSkipped("no logical switch for network "
+                                            "%s" % network_id)
+        return self.index.lswitches[network_id][0]['uuid']
+
+    def _lrouter(self, router_id):
+        if router_id in self._lrouters:
+            return self._lrouters[router_id]
+        if not self.index.lrouters.get(router_id):
+            raise migrator.MigrationSkipped("no logical router for router "
+                                            "%s" % router_id)
+        return {'uuid': self.index.lrouters[router_id][0]['uuid'],
+                'gw_lport': None}
+
+    def _find_router_lport(self, port):
+        if port['id'] in self._router_lports:
+            return self._router_lports[port['id']]
+        if not self.index.lports.get(port['id']):
+            raise migrator.MigrationSkipped("no switch port for port %s" %
+                                            port['id'])
+        return self.index.lports[port['id']][0]['uuid']
+
+    def _plan_networks(self):
+        network_ids = self.retriever.get_ids(models_v2.Network)
+        for network in self._stream_networks():
+            lswitches = self.index.lswitches.get(network['id'])
+            if not lswitches:
+                yield _action(CREATE, network['id'], network,
+                              reason="no logical switch")
+                continue
+            lswitch = lswitches[0]
+            diffs = []
+            if lswitch['display_name'] != _truncate(network['name']):
+                diffs.append("name")
+            if _tag(lswitch, TENANT_TAG_SCOPE) != network['tenant_id']:
+                diffs.append("tenant")
+            if diffs:
+                yield _action(UPDATE, network['id'], network, lswitch,
+                              "%s differ" % ', '.join(diffs))
+        for network_id, lswitches in self.index.lswitches.iteritems():
+            if network_id in network_ids:
+                continue
+            for lswitch in lswitches:
+                # Leave alone switches OpenStack did not create
+                if _tag(lswitch, TENANT_TAG_SCOPE):
+                    self._deleted_lswitches.add(lswitch['uuid'])
+                    yield _action(DELETE, lswitch['uuid'], nvp=lswitch,
+                                  reason="network %s is gone" % network_id)
+
+    def _update_networks(self, action):
+        self.driver.update_switch(action['nvp']['uuid'], action['item'])
+
+    def _delete_networks(self, action):
+        self.driver.delete_switch(action['id'])
+
+    def _plan_ports(self):
+        port_ids = self.retriever.get_ids(models_v2.Port)
+        for port in self._stream_ports():
+            lswitches = set(lswitch['uuid'] for lswitch in
+                            self.index.lswitches.get(port['network_id'], []))
+            lports = self.index.lports.get(port['id'], [])
+            found = [lport for lport in lports
+                     if _parent_uuid(lport) in lswitches]
+            for lport in lports:
+                if not found or lport is not found[0]:
+                    yield _action(DELETE, lport['uuid'], nvp=lport,
+                                  reason="stray copy of port %s" % port['id'])
+            if not found:
+                yield _action(CREATE, port['id'], port,
+                              reason="no logical port")
+                continue
+            diffs = []
+            if (found[0].get('admin_status_enabled') !=
+                    port['admin_state_up']):
+                diffs.append("admin state")
+            if _tag(found[0], TENANT_TAG_SCOPE) != port['tenant_id']:
+                diffs.append("tenant")
+            if diffs:
+                yield _action(UPDATE, port['id'], port, found[0],
+                              "%s differ" % ', '.join(diffs))
+        for port_id, lports in self.index.lports.iteritems():
+            if port_id in port_ids:
+                continue
+            for lport in lports:
+                # Ports go away together with their switch
+                if _parent_uuid(lport) not in self._deleted_lswitches:
+                    yield _action(DELETE, lport['uuid'], nvp=lport,
+                                  reason="port %s is gone" % port_id)
+
+    def _update_ports(self, action):
+        self.driver.update_port(_parent_uuid(action['nvp']),
+                                action['nvp']['uuid'], action['item'])
+
+    def _delete_ports(self, action):
+        self.driver.delete_port(_parent_uuid(action['nvp']), action['id'])
+
+    def _plan_routers(self):
+        router_ids = self.retriever.get_ids(l3_db.Router)
+        for router in self._stream_routers():
+            lrouters = self.index.lrouters.get(router['id'])
+            if not lrouters:
+                yield _action(CREATE, router['id'], router,
+                              reason="no logical router")
+                continue
+            for lrouter in lrouters[1:]:
+                self._deleted_lrouters.add(lrouter['uuid'])
+                yield _action(DELETE, lrouter['uuid'], nvp=lrouter,
+                              reason="stray copy of router %s" %
+                              router['id'])
+            lrouter = lrouters[0]
+            diffs = []
+            if lrouter['display_name'] != _truncate(router['name']):
+                diffs.append("name")
+            next_hop = lrouter['routing_config'].get(
+                'default_route_next_hop', {}).get('gateway_ip_address')
+            if next_hop != (router['nexthop'] or nvp.DEFAULT_NEXTHOP):
+                diffs.append("nexthop")
+            if diffs:
+                yield _action(UPDATE, router['id'], router, lrouter,
+                              "%s differ" % ', '.join(diffs))
+        for router_id, lrouters in self.index.lrouters.iteritems():
+            if router_id in router_ids:
+                continue
+            for lrouter in lrouters:
+                if _tag(lrouter, TENANT_TAG_SCOPE):
+                    self._deleted_lrouters.add(lrouter['uuid'])
+                    yield _action(DELETE, lrouter['uuid'], nvp=lrouter,
+                                  reason="router %s is gone" % router_id)
+
+    def _update_routers(self, action):
+        self.driver.update_router(action['nvp']['uuid'], action['item'])
+
+    def _delete_routers(self, action):
+        self.driver.delete_router(action['id'])
+
+    def _plan_interfaces(self):
+        # Gateway ports are tagged with quantum ports too
+        port_ids = self.retriever.get_ids(models_v2.Port)
+        port_ids.add(FAKE_PORT_ID)
+        for port in self.retriever.get_router_interfaces_stream():
+            lrouters = set(lrouter['uuid'] for lrouter in
+                           self.index.lrouters.get(port['router_id'], []))
+            lports = self.index.lrouter_lports.get(port['id'], [])
+            found = [lport for lport in lports
+                     if _parent_uuid(lport) in lrouters]
+            for lport in lports:
+                if not found or lport is not found[0]:
+                    yield _action(DELETE, lport['uuid'], nvp=lport,
+                                  reason="stray copy of interface %s" %
+                                  port['id'])
+            if not found:
+                yield _action(CREATE, port['id'], port,
+                              reason="no logical router port")
+            elif (sorted(found[0].get('ip_addresses') or []) !=
+                    sorted(port['ip_addresses'])):
+                yield _action(UPDATE, port['id'], port, found[0],
+                              "ip addresses differ")
+        for port_id, lports in self.index.lrouter_lports.iteritems():
+            if port_id in port_ids:
+                continue
+            for lport in lports:
+                if _parent_uuid(lport) not in self._deleted_lrouters:
+                    yield _action(DELETE, lport['uuid'], nvp=lport,
+                                  reason="interface %s is gone" % port_id)
+
+    def _update_interfaces(self, action):
+        self.driver.update_router_port(_parent_uuid(action['nvp']),
+                                       action['nvp']['uuid'], action['item'])
+
+    def _delete_interfaces(self, action):
+        self.driver.delete_router_port(_parent_uuid(action['nvp']),
+                                       action['id'])
+
+    def _plan_floatingips(self):
+        # (lrouter uuid, floating ip address) of associated floating ips
+        expected = set()
+        for fip in self._stream_floatingips():
+            lrouters = self.index.lrouters.get(fip['router_id'])
+            if not lrouters:
+                yield _action(CREATE, fip['id'], fip,
+                              reason="no logical router")
+                continue
+            lrouter_id = lrouters[0]['uuid']
+            expected.add((lrouter_id, fip['floating_ip_address']))
+            dnat = [rule for rule in self.index.nat_rules.get(lrouter_id, [])
+                    if rule['type'] == 'DestinationNatRule' and
+                    rule.get('match', {}).get('destination_ip_addresses') ==
+                    fip['floating_ip_address']]
+            if not dnat:
+                yield _action(CREATE, fip['id'], fip, reason="no nat rules")
+            elif (dnat[0].get('to_destination_ip_address',
+                              fip['fixed_ip_address']) !=
+                    fip['fixed_ip_address']):
+                yield _action(UPDATE, fip['id'], fip, dnat[0],
+                              "fixed ip differs")
+        for lrouter_id, rules in self.index.nat_rules.iteritems():
+            if lrouter_id in self._deleted_lrouters:
+                continue
+            for rule in rules:
+                # Only floating ips are implemented with DNAT rules
+                if (rule['type'] == 'DestinationNatRule' and
+                        (lrouter_id, rule.get('match', {}).get(
+                            'destination_ip_addresses')) not in expected):
+                    yield _action(DELETE, rule['uuid'], nvp=rule,
+                                  reason="floating ip %s is gone" %
+                                  rule.get('match', {}).get(
+                                      'destination_ip_addresses'))
+
+    def _remove_floatingip(self, lrouter_id, dnat_rule):
+        """Remove the nat rules and the gateway address of a floating ip."""
+        floating_ip = dnat_rule.get('match',
+                                    {}).get('destination_ip_addresses')
+        self.driver.delete_nat_rule(lrouter_id, dnat_rule['uuid'])
+        for rule in self.index.nat_rules.get(lrouter_id, []):
+            if (rule['type'] == 'SourceNatRule' and
+                    rule.get('to_source_ip_address_min') == floating_ip):
+                self.driver.delete_nat_rule(lrouter_id, rule['uuid'])
+        # Only the gateway port carries floating ips
+        for lport in self.driver.list_router_ports(lrouter_id):
+            stale = [ip for ip in lport.get('ip_addresses') or []
+                     if ip.split('/')[0] == floating_ip]
+            if stale:
+                self.driver.update_gateway_ips(lrouter_id, lport['uuid'], [],
+                                               stale)
+
+    def _update_floatingips(self, action):
+        fip = action['item']
+        lrouter_id = _parent_uuid(action['nvp'])
+        with self._router_locks[lrouter_id]:
+            self._remove_floatingip(lrouter_id, action['nvp'])
+        return self._replay_floatingips(fip)
+
+    def _delete_floatingips(self, action):
+        lrouter_id = _parent_uuid(action['nvp'])
+        with self._router_locks[lrouter_id]:
+            self._remove_floatingip(lrouter_id, action['nvp'])
+
+
+def format_plan(plan):
+    """Render a plan as one line per action followed by a summary."""
+    lines = []
+    totals = collections.defaultdict(int)
+    for stage in migrator.STAGES:
+        for action in plan.get(stage, []):
+            totals[action['action']] += 1
+            lines.append("%-6s %-11s %s (%s)" % (action['action'], stage,
+                                                 action['id'],
+                                                 action['reason']))
+    lines.append("%d to create, %d to update, %d to delete" %
+                 (totals[CREATE], totals[UPDATE], totals[DELETE]))
+    return '\n'.join(lines)
@@ -3,36 +3,285 @@
 Fetch current logical state from Quantum/Nuetron Database.
 
 """
+import itertools
 import logging
+import operator
 
 import quantumclient  #used to varify changes have taken place
-from quantum.db.l3_db import L3_NAT_db_mixin 
+from quantum import context as q_context
+from quantum.db.l3_db import L3_NAT_db_mixin
+from quantum.db import l3_db
+from quantum.db import models_v2
 from quantum.db.db_base_plugin_v2 import QuantumDbPluginV2
-from quantum.openstack.common.context import RequestContext
+from quantum.db import portsecurity_db
 
 LOG = logging.getLogger(__name__)
 
+# Number of rows fetched from the database per round trip
+DEFAULT_BATCH_SIZE = 500
+
+# Ports with these owners do not map to a logical switch port on the
+# controller (gateway ports live on the logical router, floating ips are
+# NAT rules), so they are not replayed as ports.
+NON_SWITCH_PORT_OWNERS = (l3_db.DEVICE_OWNER_ROUTER_GW,
+                          l3_db.DEVICE_OWNER_FLOATINGIP)
+
+# Columns every port record is built from
+_PORT_COLUMNS = (models_v2.Port.id, models_v2.Port.name,
+                 models_v2.Port.network_id, models_v2.Port.tenant_id,
+                 models_v2.Port.mac_address, models_v2.Port.admin_state_up,
+                 models_v2.Port.status, models_v2.Port.device_id,
+                 models_v2.Port.device_owner)
+
+
 class RetrieveValues(QuantumDbPluginV2,L3_NAT_db_mixin):
     """
     Retrieve values from Quantum/Nuetron Database switches, subnets, ports
     @entities {switches,routers} or {switches,routers,ports} or {all}
+
+    Every get_*_stream() method is a generator over a single query joining
+    the rows an object is made of, ordered by object id and read batch_size
+    rows at a time with yield_per. Only columns are selected, no ORM
+    instance is built, so extraction costs one round trip per batch no
+    matter how many fixed ips the ports have, and memory stays flat.
+    Subnets and router gateways, which are few, are loaded once.
     """
-    
-    def __init__(self, entities={"all"}):
+
+    def __init__(self, entities={"all"}, batch_size=DEFAULT_BATCH_SIZE):
         QuantumDbPluginV2.__init__(self)
         L3_NAT_db_mixin.__init__(self)
         self.entities = entities
-        
+        self.batch_size = batch_size
+        self.context = q_context.get_admin_context()
+        # subnet_id -> {'network_id', 'cidr', 'gateway_ip'}
+        self._subnets = None
+        # network_id -> [subnet ids]
+        self._network_subnets = None
+        # router_id -> gateway port record (with fixed_ips), None if unset
+        self._router_gateways = None
+
     def _get_entities(self):
         return self.entities
-    
-    #TODO return queries in lists, bases on entities. 
-    
-    # Getting subnets, routers, ports should
-    # be inherited from QuantumDBPluginV2 and L3 mixin.
-    
-    
-    
-        
-    
 
+    def _stream(self, query, make_record):
+        """Yield make_record(rows) for each object of query.
+
+        query selects columns, the first of them labeled 'id', and is ordered
+        by it so that the rows of an object (one per joined fixed ip, for
+        instance) come one after the other.
+        """
+        rows = query.yield_per(self.batch_size)
+        for _id, group in itertools.groupby(rows, operator.itemgetter(0)):
+            yield make_record(list(group))
+
+    def get_ids(self, model):
+        """Return the set of ids of every row of model.
+
+        Only the id column is read, which keeps this cheap enough to hold
+        the ids of all ports in memory.
+        """
+        query = self.context.session.query(model.id)
+        return set(row.id for row in query.yield_per(self.batch_size))
+
+    def _load_subnets(self):
+        if self._subnets is not None:
+            return
+        self._subnets = {}
+        self._network_subnets = {}
+        query = self.context.session.query(
+            models_v2.Subnet.id, models_v2.Subnet.network_id,
+            models_v2.Subnet.cidr, models_v2.Subnet.gateway_ip)
+        for row in query.yield_per(self.batch_size):
+            self._subnets[row.id] = {'network_id': row.network_id,
+                                     'cidr': row.cidr,
+                                     'gateway_ip': row.gateway_ip}
+            self._network_subnets.setdefault(row.network_id,
+                                             []).append(row.id)
+
+    def _get_subnet_cidr(self, subnet_id):
+        self._load_subnets()
+        return self._subnets[subnet_id]['cidr']
+
+    def _ip_prefixes(self, fixed_ips):
+        """Turn port fixed_ips into the 'ip/prefixlen' list NVP expects."""
+        prefixes = []
+        for ip in fixed_ips:
+            cidr = self._get_subnet_cidr(ip['subnet_id'])
+            prefixes.append('%s/%s' % (ip['ip_address'], cidr.split('/')[1]))
+        return prefixes
+
+    def _port_query(self, *extra_columns):
+        """Port columns, joined with their fixed ips, ordered by port id."""
+        query = self.context.session.query(
+            *(_PORT_COLUMNS + (models_v2.IPAllocation.subnet_id,
+                               models_v2.IPAllocation.ip_address) +
+              extra_columns))
+        query = query.outerjoin(
+            models_v2.IPAllocation,
+            models_v2.IPAllocation.port_id == models_v2.Port.id)
+        return query.order_by(models_v2.Port.id)
+
+    def _make_port_record(self, rows):
+        """Build the _make_port_dict() of a port out of its joined rows."""
+        row = rows[0]
+        return {'id': row.id,
+                'name': row.name,
+                'network_id': row.network_id,
+                'tenant_id': row.tenant_id,
+                'mac_address': row.mac_address,
+                'admin_state_up': row.admin_state_up,
+                'status': row.status,
+                'fixed_ips': [{'subnet_id': r.subnet_id,
+                               'ip_address': r.ip_address}
+                              for r in rows if r.ip_address],
+                'device_id': row.device_id,
+                'device_owner': row.device_owner}
+
+    def _load_router_gateways(self):
+        if self._router_gateways is not None:
+            return
+        self._router_gateways = {}
+        query = self._port_query(l3_db.Router.id.label('router_id'))
+        query = query.join(l3_db.Router,
+                           l3_db.Router.gw_port_id == models_v2.Port.id)
+        for rows in self._stream(query, list):
+            self._router_gateways[rows[0].router_id] = (
+                self._make_port_record(rows))
+
+    def _get_router_snat_ip(self, router_id):
+        self._load_router_gateways()
+        gw_port = self._router_gateways.get(router_id)
+        if gw_port and gw_port['fixed_ips']:
+            return gw_port['fixed_ips'][0]['ip_address']
+
+    def _make_network_record(self, rows):
+        row = rows[0]
+        return {'id': row.id,
+                'name': row.name,
+                'tenant_id': row.tenant_id,
+                'admin_state_up': row.admin_state_up,
+                'status': row.status,
+                'shared': row.shared,
+                'subnets': list(self._network_subnets.get(row.id, []))}
+
+    def get_networks_stream(self):
+        """Stream non external networks.
+
+        External networks do not exist as logical switches on the controller.
+        """
+        self._load_subnets()
+        query = self.context.session.query(
+            models_v2.Network.id, models_v2.Network.name,
+            models_v2.Network.tenant_id, models_v2.Network.admin_state_up,
+            models_v2.Network.status, models_v2.Network.shared)
+        query = query.outerjoin(
+            l3_db.ExternalNetwork,
+            l3_db.ExternalNetwork.network_id == models_v2.Network.id)
+        query = query.filter(l3_db.ExternalNetwork.network_id == None)
+        return self._stream(query.order_by(models_v2.Network.id),
+                            self._make_network_record)
+
+    def _make_switch_port_record(self, rows):
+        res = self._make_port_record(rows)
+        res['port_security_enabled'] = bool(rows[0].port_security_enabled)
+        return res
+
+    def get_ports_stream(self):
+        """Stream ports that live on a logical switch.
+
+        Ports on external networks are left out, as are gateway and floating
+        ip ports. Port security bindings are joined in the same query.
+        """
+        binding = portsecurity_db.PortSecurityBinding
+        query = self._port_query(binding.port_security_enabled)
+        query = query.outerjoin(binding,
+                                binding.port_id == models_v2.Port.id)
+        query = query.outerjoin(
+            l3_db.ExternalNetwork,
+            l3_db.ExternalNetwork.network_id == models_v2.Port.network_id)
+        query = query.filter(
+            (l3_db.ExternalNetwork.network_id == None) &
+            ~models_v2.Port.device_owner.in_(NON_SWITCH_PORT_OWNERS))
+        return self._stream(query, self._make_switch_port_record)
+
+    def _make_router_record(self, rows):
+        row = rows[0]
+        res = {'id': row.id,
+               'name': row.name,
+               'tenant_id': row.tenant_id,
+               'admin_state_up': row.admin_state_up,
+               'status': row.status,
+               'external_gateway_info': None,
+               'gw_port': None,
+               'nexthop': None}
+        gw_port = self._router_gateways.get(row.id)
+        if gw_port:
+            res['external_gateway_info'] = {
+                'network_id': gw_port['network_id']}
+            res['gw_port'] = dict(gw_port)
+            res['gw_port']['ip_addresses'] = self._ip_prefixes(
+                gw_port['fixed_ips'])
+            ext_subnets = self._network_subnets.get(gw_port['network_id'])
+            if ext_subnets:
+                res['nexthop'] = self._subnets[ext_subnets[0]]['gateway_ip']
+        return res
+
+    def get_routers_stream(self):
+        """Stream routers, with their external gateway port if any."""
+        self._load_subnets()
+        self._load_router_gateways()
+        query = self.context.session.query(
+            l3_db.Router.id, l3_db.Router.name, l3_db.Router.tenant_id,
+            l3_db.Router.admin_state_up, l3_db.Router.status)
+        return self._stream(query.order_by(l3_db.Router.id),
+                            self._make_router_record)
+
+    def _make_router_interface_record(self, rows):
+        res = self._make_port_record(rows)
+        res['router_id'] = res['device_id']
+        res['ip_addresses'] = self._ip_prefixes(res['fixed_ips'])
+        res['cidrs'] = [self._get_subnet_cidr(ip['subnet_id'])
+                        for ip in res['fixed_ips']]
+        res['snat_ip'] = self._get_router_snat_ip(res['device_id'])
+        return res
+
+    def get_router_interfaces_stream(self):
+        """Stream router interface ports together with their router id."""
+        self._load_subnets()
+        self._load_router_gateways()
+        query = self._port_query().filter(
+            models_v2.Port.device_owner == l3_db.DEVICE_OWNER_ROUTER_INTF)
+        return self._stream(query, self._make_router_interface_record)
+
+    def _make_floatingip_record(self, rows):
+        row = rows[0]
+        res = {'id': row.id,
+               'tenant_id': row.tenant_id,
+               'floating_ip_address': row.floating_ip_address,
+               'floating_network_id': row.floating_network_id,
+               'router_id': row.router_id,
+               'port_id': row.fixed_port_id,
+               'fixed_ip_address': row.fixed_ip_address}
+        res['ip_addresses'] = self._ip_prefixes(
+            [{'subnet_id': r.subnet_id, 'ip_address': r.ip_address}
+             for r in rows if r.ip_address])
+        return res
+
+    def get_floatingips_stream(self):
+        """Stream floating IPs which are associated with a port.
+
+        The fixed ips of the floating ip port are joined in the same query.
+        """
+        self._load_subnets()
+        fip = l3_db.FloatingIP
+        query = self.context.session.query(
+            fip.id, fip.tenant_id, fip.floating_ip_address,
+            fip.floating_network_id, fip.router_id, fip.fixed_port_id,
+            fip.fixed_ip_address, models_v2.IPAllocation.subnet_id,
+            models_v2.IPAllocation.ip_address)
+        query = query.outerjoin(
+            models_v2.IPAllocation,
+            models_v2.IPAllocation.port_id == fip.floating_port_id)
+        query = query.filter(fip.fixed_port_id != None)
+        return self._stream(query.order_by(fip.id),
+                            self._make_floatingip_record)
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+"""
+Base test case for the migration tools.
+
+Every test gets a sqlite Quantum database holding a small topology and an
+empty in-process fake NVP controller to migrate it to.
+
+"""
+import os
+
+import fixtures
+
+from common.drivers import fake_nvp
+# Registers the models RetrieveValues reads before the tables are created
+from common import retvals
+from quantum.db import api as db
+from quantum.db import l3_db
+from quantum.db import models_v2
+from quantum.db import portsecurity_db
+from quantum.tests import base
+
+TENANT_ID = 'tenant'
+
+NETWORK_ID = 'net1'
+EXT_NETWORK_ID = 'ext-net'
+SUBNET_ID = 'subnet1'
+SUBNET2_ID = 'subnet2'
+EXT_SUBNET_ID = 'ext-subnet'
+# A vm port with an address on each subnet, and port security enabled
+VM_PORT_ID = 'vm-port1'
+# A vm port without port security binding
+VM_PORT2_ID = 'vm-port2'
+ROUTER_ID = 'router1'
+GW_PORT_ID = 'gw-port'
+ROUTER_PORT_ID = 'router-port'
+FIP_PORT_ID = 'fip-port'
+FIP_ID = 'fip1'
+FLOATING_IP = '172.24.4.3'
+
+
+class MigrateTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(MigrateTestCase, self).setUp()
+        db._ENGINE = None
+        db._MAKER = None
+        # The retriever streams through one connection while the port
+        # mappings are written through another, which an in-memory
+        # database does not allow
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        self.config(sql_connection='sqlite:///%s' % os.path.join(tempdir,
+                                                                 'db'),
+                    group='DATABASE')
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.session = db.get_session()
+        self._ports = 0
+        with self.session.begin():
+            self._populate()
+        self.controller = fake_nvp.FakeNvpController()
+        self.driver = fake_nvp.FakeNvpDriver(self.controller)
+
+    def _insert(self, model, **kwargs):
+        self.session.execute(model.__table__.insert(), [kwargs])
+
+    def _insert_port(self, port_id, network_id, device_owner, device_id,
+                     fixed_ips):
+        self._insert(models_v2.Port, id=port_id, tenant_id=TENANT_ID,
+                     network_id=network_id, name=port_id,
+                     mac_address='fa:16:3e:00:00:%02x' % self._ports,
+                     admin_state_up=True, status='ACTIVE',
+                     device_id=device_id, device_owner=device_owner)
+        self._ports += 1
+        for subnet_id, ip_address in fixed_ips:
+            self._insert(models_v2.IPAllocation, port_id=port_id,
+                         subnet_id=subnet_id, network_id=network_id,
+                         ip_address=ip_address)
+
+    def _populate(self):
+        for network_id in (NETWORK_ID, EXT_NETWORK_ID):
+            self._insert(models_v2.Network, id=network_id,
+                         tenant_id=TENANT_ID, name=network_id,
+                         status='ACTIVE', admin_state_up=True, shared=False)
+        self._insert(l3_db.ExternalNetwork, network_id=EXT_NETWORK_ID)
+        for subnet_id, network_id, cidr, gateway_ip in (
+                (SUBNET_ID, NETWORK_ID, '10.0.0.0/24', '10.0.0.1'),
+                (SUBNET2_ID, NETWORK_ID, '10.0.1.0/24', '10.0.1.1'),
+                (EXT_SUBNET_ID, EXT_NETWORK_ID, '172.24.4.0/24',
+                 '172.24.4.1')):
+            self._insert(models_v2.Subnet, id=subnet_id, tenant_id=TENANT_ID,
+                         network_id=network_id, ip_version=4, cidr=cidr,
+                         gateway_ip=gateway_ip, enable_dhcp=True,
+                         shared=False)
+        self._insert_port(VM_PORT_ID, NETWORK_ID, 'compute:nova', 'vm1',
+                          [(SUBNET_ID, '10.0.0.3'), (SUBNET2_ID, '10.0.1.3')])
+        self._insert(portsecurity_db.PortSecurityBinding,
+                     port_id=VM_PORT_ID, port_security_enabled=True)
+        self._insert_port(VM_PORT2_ID, NETWORK_ID, 'compute:nova', 'vm2',
+                          [(SUBNET_ID, '10.0.0.4')])
+        self._insert_port(GW_PORT_ID, EXT_NETWORK_ID,
+                          l3_db.DEVICE_OWNER_ROUTER_GW, ROUTER_ID,
+                          [(EXT_SUBNET_ID, '172.24.4.2')])
+        self._insert(l3_db.Router, id=ROUTER_ID, tenant_id=TENANT_ID,
+                     name=ROUTER_ID, status='ACTIVE', admin_state_up=True,
+                     gw_port_id=GW_PORT_ID)
+        self._insert_port(ROUTER_PORT_ID, NETWORK_ID,
+                          l3_db.DEVICE_OWNER_ROUTER_INTF, ROUTER_ID,
+                          [(SUBNET_ID, '10.0.0.1')])
+        self._insert_port(FIP_PORT_ID, EXT_NETWORK_ID,
+                          l3_db.DEVICE_OWNER_FLOATINGIP, FIP_ID,
+                          [(EXT_SUBNET_ID, FLOATING_IP)])
+        self._insert(l3_db.FloatingIP, id=FIP_ID, tenant_id=TENANT_ID,
+                     floating_ip_address=FLOATING_IP,
+                     floating_network_id=EXT_NETWORK_ID,
+                     floating_port_id=FIP_PORT_ID, fixed_port_id=VM_PORT_ID,
+                     fixed_ip_address='10.0.0.3', router_id=ROUTER_ID)
+
+    def retriever(self, batch_size=retvals.DEFAULT_BATCH_SIZE):
+        return retvals.RetrieveValues(batch_size=batch_size)
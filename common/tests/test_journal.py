@@ -0,0 +1,70 @@
+#!/usr/bin/python
+"""Tests of the migration journal."""
+import os
+
+import fixtures
+
+from common import journal as mjournal
+from quantum.tests import base
+
+
+class TestJournal(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'journal')
+
+    def test_last_entry_wins(self):
+        journal = mjournal.Journal(self.path)
+        journal.write('ports', 'p1', mjournal.PENDING)
+        journal.write('ports', 'p1', mjournal.CREATED, 'lport1')
+        journal.write('networks', 'p1', mjournal.PENDING)
+        journal.close()
+        journal = mjournal.Journal(self.path, resume=True)
+        self.assertEqual(journal.get('ports', 'p1'),
+                         {'stage': 'ports', 'id': 'p1',
+                          'state': mjournal.CREATED, 'result': 'lport1'})
+        self.assertEqual(journal.get('networks', 'p1')['state'],
+                         mjournal.PENDING)
+        self.assertIsNone(journal.get('ports', 'p2'))
+        journal.close()
+
+    def test_without_resume_the_journal_is_truncated(self):
+        journal = mjournal.Journal(self.path)
+        journal.write('ports', 'p1', mjournal.CREATED, 'lport1')
+        journal.close()
+        mjournal.Journal(self.path).close()
+        journal = mjournal.Journal(self.path, resume=True)
+        self.assertIsNone(journal.get('ports', 'p1'))
+        journal.close()
+
+    def test_resume_without_journal(self):
+        journal = mjournal.Journal(self.path, resume=True)
+        journal.write('ports', 'p1', mjournal.PENDING)
+        journal.close()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_sync_every(self):
+        journal = mjournal.Journal(self.path, sync_every=2,
+                                   sync_interval=3600)
+        journal.write('ports', 'p1', mjournal.PENDING)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        journal.write('ports', 'p2', mjournal.PENDING)
+        self.assertEqual(len(open(self.path).readlines()), 2)
+        journal.close()
+
+    def test_resume_cuts_off_torn_entry(self):
+        journal = mjournal.Journal(self.path)
+        journal.write('ports', 'p1', mjournal.CREATED, 'lport1')
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"stage": "ports", "id": "p2", "st')
+        journal = mjournal.Journal(self.path, resume=True)
+        self.assertIsNone(journal.get('ports', 'p2'))
+        journal.write('ports', 'p3', mjournal.CREATED, 'lport3')
+        journal.close()
+        journal = mjournal.Journal(self.path, resume=True)
+        self.assertEqual(journal.get('ports', 'p1')['result'], 'lport1')
+        self.assertEqual(journal.get('ports', 'p3')['result'], 'lport3')
+        journal.close()
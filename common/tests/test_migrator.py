@@ -0,0 +1,172 @@
+#!/usr/bin/python
+"""Tests of the replay of quantum objects on the fake NVP controller."""
+import os
+
+import fixtures
+import mock
+
+from common import journal as mjournal
+from common import migrator
+from common import resync
+from common.tests import base
+from quantum.plugins.nicira.nicira_nvp_plugin import nicira_models
+
+
+class TestMigrator(base.MigrateTestCase):
+
+    def _migrator(self, **kwargs):
+        return migrator.Migrator(self.driver, self.retriever(), workers=4,
+                                 **kwargs)
+
+    def _mappings(self):
+        return dict((mapping.quantum_id, mapping.nvp_id) for mapping in
+                    self.session.query(nicira_models.QuantumNvpPortMapping))
+
+    def _lports(self, switch_id='*'):
+        return dict((resync._tag(lport, resync.PORT_TAG_SCOPE), lport)
+                    for lport in self.driver.list_ports(switch_id))
+
+    def test_full_replay(self):
+        stats = self._migrator().run()
+        self.assertEqual(dict((stage, stats[stage][migrator.CREATED])
+                              for stage in migrator.STAGES),
+                         {migrator.NETWORKS: 1, migrator.PORTS: 3,
+                          migrator.ROUTERS: 1, migrator.INTERFACES: 1,
+                          migrator.FLOATINGIPS: 1})
+        for stage in migrator.STAGES:
+            self.assertEqual(stats[stage][migrator.FAILED], 0)
+        self.assertEqual(self.controller.count('lswitch'), 1)
+        self.assertEqual(self.controller.count('lswitch', 'lport'), 3)
+        self.assertEqual(self.controller.count('lrouter'), 1)
+        # The gateway port and the router interface
+        self.assertEqual(self.controller.count('lrouter', 'lport'), 2)
+        # SNAT and no SNAT for the interface, DNAT and SNAT for the
+        # floating ip
+        self.assertEqual(self.controller.count('lrouter', 'nat'), 4)
+        lswitch = list(self.driver.list_switches())[0]
+        lports = self._lports(lswitch['uuid'])
+        self.assertEqual(sorted(lports), [base.ROUTER_PORT_ID,
+                                          base.VM_PORT_ID,
+                                          base.VM_PORT2_ID])
+        self.assertEqual(self._mappings(),
+                         dict((port_id, lport['uuid'])
+                              for port_id, lport in lports.iteritems()))
+        gw_lport = [lport for lport in self.driver.list_router_ports()
+                    if '172.24.4.2/24' in lport['ip_addresses']][0]
+        self.assertIn('172.24.4.3/24', gw_lport['ip_addresses'])
+
+    def test_replay_not_connected_leaves_mappings_alone(self):
+        self._migrator(connected=False).run()
+        self.assertEqual(self._mappings(), {})
+
+    def test_failed_objects_are_counted(self):
+        create_port = self.driver.create_port
+
+        def fail_vm_port2(switch_id, port):
+            if port['id'] == base.VM_PORT2_ID:
+                raise Exception("boom")
+            return create_port(switch_id, port)
+
+        with mock.patch.object(self.driver, 'create_port',
+                               side_effect=fail_vm_port2):
+            stats = self._migrator().run((migrator.NETWORKS,
+                                          migrator.PORTS))
+        self.assertEqual(stats[migrator.PORTS][migrator.CREATED], 2)
+        self.assertEqual(stats[migrator.PORTS][migrator.FAILED], 1)
+        self.assertNotIn(base.VM_PORT2_ID, self._mappings())
+
+    def test_ports_of_networks_not_migrated_are_skipped(self):
+        runner = self._migrator()
+        runner.run((migrator.NETWORKS,))
+        runner._lswitches.clear()
+        stats = runner.run((migrator.PORTS,))
+        self.assertEqual(stats[migrator.PORTS][migrator.SKIPPED], 3)
+        self.assertEqual(self.controller.count('lswitch', 'lport'), 0)
+
+
+class TestMigratorResume(base.MigrateTestCase):
+
+    def setUp(self):
+        super(TestMigratorResume, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'journal')
+
+    def _run(self, stages=migrator.STAGES):
+        journal = mjournal.Journal(self.path, resume=True)
+        runner = migrator.Migrator(self.driver, self.retriever(), workers=4,
+                                   journal=journal)
+        try:
+            return runner.run(stages)
+        finally:
+            journal.close()
+
+    def test_resume_skips_done_objects(self):
+        lswitch_uuid = self.driver.create_switch(
+            {'id': base.NETWORK_ID, 'tenant_id': base.TENANT_ID,
+             'name': base.NETWORK_ID, 'shared': False})
+        ports = dict((port['id'], port)
+                     for port in self.retriever().get_ports_stream())
+        verified_lport = self.driver.create_port(lswitch_uuid,
+                                                 ports[base.VM_PORT_ID])
+        created_lport = self.driver.create_port(lswitch_uuid,
+                                                ports[base.VM_PORT2_ID])
+        journal = mjournal.Journal(self.path)
+        journal.write(migrator.NETWORKS, base.NETWORK_ID, mjournal.CREATED,
+                      lswitch_uuid)
+        journal.write(migrator.PORTS, base.VM_PORT_ID, mjournal.VERIFIED,
+                      verified_lport)
+        journal.write(migrator.PORTS, base.VM_PORT2_ID, mjournal.CREATED,
+                      created_lport)
+        # Handed to a worker, but interrupted before NVP answered
+        journal.write(migrator.PORTS, base.ROUTER_PORT_ID, mjournal.PENDING)
+        journal.close()
+
+        stats = self._run((migrator.NETWORKS, migrator.PORTS))
+
+        self.assertEqual(stats[migrator.NETWORKS][migrator.RESUMED], 1)
+        self.assertEqual(stats[migrator.NETWORKS][migrator.CREATED], 0)
+        self.assertEqual(stats[migrator.PORTS][migrator.RESUMED], 2)
+        self.assertEqual(stats[migrator.PORTS][migrator.CREATED], 1)
+        self.assertEqual(self.controller.count('lswitch'), 1)
+        self.assertEqual(self.controller.count('lswitch', 'lport'), 3)
+        mappings = dict(
+            (mapping.quantum_id, mapping.nvp_id) for mapping in
+            self.session.query(nicira_models.QuantumNvpPortMapping))
+        # The mapping of a verified port is already there, the one of a
+        # created port may not be
+        self.assertNotIn(base.VM_PORT_ID, mappings)
+        self.assertEqual(mappings[base.VM_PORT2_ID], created_lport)
+        router_lport = mappings[base.ROUTER_PORT_ID]
+        journal = mjournal.Journal(self.path, resume=True)
+        self.assertEqual(journal.get(migrator.PORTS, base.VM_PORT2_ID),
+                         {'stage': migrator.PORTS, 'id': base.VM_PORT2_ID,
+                          'state': mjournal.VERIFIED,
+                          'result': created_lport})
+        self.assertEqual(
+            journal.get(migrator.PORTS, base.ROUTER_PORT_ID)['state'],
+            mjournal.VERIFIED)
+        journal.close()
+
+        # Later stages still find the router port created before
+        stats = self._run((migrator.ROUTERS, migrator.INTERFACES))
+        self.assertEqual(stats[migrator.INTERFACES][migrator.CREATED], 1)
+        router_ports = [lport for lport in self.driver.list_router_ports()
+                        if resync._tag(lport, resync.PORT_TAG_SCOPE) ==
+                        base.ROUTER_PORT_ID]
+        self.assertEqual(len(router_ports), 1)
+        lport = self.controller._objects[('lswitch', 'lport')][router_lport]
+        self.assertEqual(lport['_attachment']['peer_port_uuid'],
+                         router_ports[0]['uuid'])
+
+    def test_resume_of_complete_run_replays_nothing(self):
+        self._run()
+        requests = sum(self.controller.requests.values())
+        stats = self._run()
+        self.assertEqual(sum(self.controller.requests.values()), requests)
+        self.assertEqual(dict((stage, (stats[stage][migrator.CREATED],
+                                       stats[stage][migrator.RESUMED]))
+                              for stage in migrator.STAGES),
+                         {migrator.NETWORKS: (0, 1), migrator.PORTS: (0, 3),
+                          migrator.ROUTERS: (0, 1),
+                          migrator.INTERFACES: (0, 1),
+                          migrator.FLOATINGIPS: (0, 1)})
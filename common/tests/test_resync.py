@@ -0,0 +1,93 @@
+#!/usr/bin/python
+"""Tests of the diff mode planning against the fake NVP controller."""
+from common import migrator
+from common import resync
+from common.tests import base
+
+
+class TestDiffMigrator(base.MigrateTestCase):
+
+    def _diff_migrator(self):
+        return resync.DiffMigrator(self.driver, self.retriever(), workers=4)
+
+    def _summary(self, plan):
+        return dict((stage, sorted((action['action'], action['id'])
+                                   for action in actions))
+                    for stage, actions in plan.iteritems() if actions)
+
+    def test_plan_on_empty_controller_creates_everything(self):
+        plan = self._diff_migrator().build_plan()
+        self.assertEqual(self._summary(plan), {
+            migrator.NETWORKS: [(resync.CREATE, base.NETWORK_ID)],
+            migrator.PORTS: [(resync.CREATE, base.ROUTER_PORT_ID),
+                             (resync.CREATE, base.VM_PORT_ID),
+                             (resync.CREATE, base.VM_PORT2_ID)],
+            migrator.ROUTERS: [(resync.CREATE, base.ROUTER_ID)],
+            migrator.INTERFACES: [(resync.CREATE, base.ROUTER_PORT_ID)],
+            migrator.FLOATINGIPS: [(resync.CREATE, base.FIP_ID)]})
+
+    def test_plan_after_full_replay_is_empty(self):
+        migrator.Migrator(self.driver, self.retriever()).run()
+        self.assertEqual(
+            self._summary(self._diff_migrator().build_plan()), {})
+
+    def test_plan_only_fixes_what_differs(self):
+        migrator.Migrator(self.driver, self.retriever()).run()
+        lswitch = list(self.driver.list_switches())[0]
+        self.controller._objects[('lswitch', None)][lswitch['uuid']][
+            'display_name'] = 'renamed'
+        lport = [lport for lport in self.driver.list_ports()
+                 if resync._tag(lport, resync.PORT_TAG_SCOPE) ==
+                 base.VM_PORT2_ID][0]
+        self.driver.delete_port(lswitch['uuid'], lport['uuid'])
+        orphan_uuid = self.driver.create_switch(
+            {'id': 'deleted-net', 'tenant_id': base.TENANT_ID,
+             'name': 'deleted-net', 'shared': False})
+        lrouter = list(self.driver.list_routers())[0]
+        dnat = [rule for rule in self.driver.list_nat_rules()
+                if rule['type'] == 'DestinationNatRule'][0]
+        self.driver.delete_nat_rule(lrouter['uuid'], dnat['uuid'])
+
+        runner = self._diff_migrator()
+        plan = runner.build_plan()
+        self.assertEqual(self._summary(plan), {
+            migrator.NETWORKS: [(resync.DELETE, orphan_uuid),
+                                (resync.UPDATE, base.NETWORK_ID)],
+            migrator.PORTS: [(resync.CREATE, base.VM_PORT2_ID)],
+            migrator.FLOATINGIPS: [(resync.CREATE, base.FIP_ID)]})
+        self.assertIn('name', plan[migrator.NETWORKS][0]['reason'])
+
+        stats = runner.run()
+        self.assertEqual(stats[migrator.NETWORKS][resync.UPDATED], 1)
+        self.assertEqual(stats[migrator.NETWORKS][resync.DELETED], 1)
+        self.assertEqual(stats[migrator.PORTS][migrator.CREATED], 1)
+        self.assertEqual(stats[migrator.FLOATINGIPS][migrator.CREATED], 1)
+        self.assertEqual(
+            self._summary(self._diff_migrator().build_plan()), {})
+
+    def test_stray_copies_are_deleted(self):
+        migrator.Migrator(self.driver, self.retriever()).run(
+            (migrator.NETWORKS, migrator.PORTS))
+        lswitch = list(self.driver.list_switches())[0]
+        port = [port for port in self.retriever().get_ports_stream()
+                if port['id'] == base.VM_PORT_ID][0]
+        self.driver.create_port(lswitch['uuid'], port)
+        copies = [lport['uuid'] for lport in self.driver.list_ports()
+                  if resync._tag(lport, resync.PORT_TAG_SCOPE) ==
+                  base.VM_PORT_ID]
+        runner = self._diff_migrator()
+        plan = runner.build_plan((migrator.NETWORKS, migrator.PORTS))
+        # Either copy may be kept
+        self.assertEqual(sorted(plan), [migrator.NETWORKS, migrator.PORTS])
+        self.assertEqual(plan[migrator.NETWORKS], [])
+        self.assertEqual(len(plan[migrator.PORTS]), 1)
+        self.assertEqual(plan[migrator.PORTS][0]['action'], resync.DELETE)
+        self.assertIn(plan[migrator.PORTS][0]['id'], copies)
+        runner.run((migrator.NETWORKS, migrator.PORTS))
+        self.assertEqual(self.controller.count('lswitch', 'lport'), 3)
+
+    def test_format_plan(self):
+        plan = self._diff_migrator().build_plan((migrator.NETWORKS,))
+        self.assertEqual(resync.format_plan(plan).splitlines(), [
+            "create networks    %s (no logical switch)" % base.NETWORK_ID,
+            "1 to create, 0 to update, 0 to delete"])
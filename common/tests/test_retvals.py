@@ -0,0 +1,77 @@
+#!/usr/bin/python
+"""Tests of the extraction of quantum objects out of the database."""
+from common.tests import base
+from quantum.db import models_v2
+
+
+class TestRetrieveValues(base.MigrateTestCase):
+
+    def _records(self, stream):
+        return dict((record['id'], record) for record in stream)
+
+    def test_get_networks_stream_skips_external_networks(self):
+        networks = list(self.retriever().get_networks_stream())
+        self.assertEqual([network['id'] for network in networks],
+                         [base.NETWORK_ID])
+        self.assertEqual(sorted(networks[0]['subnets']),
+                         [base.SUBNET_ID, base.SUBNET2_ID])
+        self.assertEqual(networks[0]['tenant_id'], base.TENANT_ID)
+        self.assertFalse(networks[0]['shared'])
+
+    def test_get_ports_stream(self):
+        ports = self._records(self.retriever().get_ports_stream())
+        # Gateway and floating ip ports do not live on a logical switch
+        self.assertEqual(sorted(ports), [base.ROUTER_PORT_ID,
+                                         base.VM_PORT_ID, base.VM_PORT2_ID])
+        port = ports[base.VM_PORT_ID]
+        self.assertEqual(sorted(port['fixed_ips']),
+                         [{'subnet_id': base.SUBNET_ID,
+                           'ip_address': '10.0.0.3'},
+                          {'subnet_id': base.SUBNET2_ID,
+                           'ip_address': '10.0.1.3'}])
+        self.assertTrue(port['port_security_enabled'])
+        self.assertEqual(port['device_owner'], 'compute:nova')
+        self.assertFalse(ports[base.VM_PORT2_ID]['port_security_enabled'])
+
+    def test_get_ports_stream_rows_of_a_port_span_batches(self):
+        ports = list(self.retriever(batch_size=1).get_ports_stream())
+        self.assertEqual(len(ports), 3)
+        port = [p for p in ports if p['id'] == base.VM_PORT_ID][0]
+        self.assertEqual(len(port['fixed_ips']), 2)
+
+    def test_get_routers_stream(self):
+        routers = list(self.retriever().get_routers_stream())
+        self.assertEqual(len(routers), 1)
+        router = routers[0]
+        self.assertEqual(router['id'], base.ROUTER_ID)
+        self.assertEqual(router['external_gateway_info'],
+                         {'network_id': base.EXT_NETWORK_ID})
+        self.assertEqual(router['gw_port']['id'], base.GW_PORT_ID)
+        self.assertEqual(router['gw_port']['ip_addresses'],
+                         ['172.24.4.2/24'])
+        self.assertEqual(router['nexthop'], '172.24.4.1')
+
+    def test_get_router_interfaces_stream(self):
+        ports = list(self.retriever().get_router_interfaces_stream())
+        self.assertEqual(len(ports), 1)
+        port = ports[0]
+        self.assertEqual(port['id'], base.ROUTER_PORT_ID)
+        self.assertEqual(port['router_id'], base.ROUTER_ID)
+        self.assertEqual(port['ip_addresses'], ['10.0.0.1/24'])
+        self.assertEqual(port['cidrs'], ['10.0.0.0/24'])
+        self.assertEqual(port['snat_ip'], '172.24.4.2')
+
+    def test_get_floatingips_stream(self):
+        fips = list(self.retriever().get_floatingips_stream())
+        self.assertEqual(fips, [{'id': base.FIP_ID,
+                                 'tenant_id': base.TENANT_ID,
+                                 'floating_ip_address': base.FLOATING_IP,
+                                 'floating_network_id': base.EXT_NETWORK_ID,
+                                 'router_id': base.ROUTER_ID,
+                                 'port_id': base.VM_PORT_ID,
+                                 'fixed_ip_address': '10.0.0.3',
+                                 'ip_addresses': ['172.24.4.3/24']}])
+
+    def test_get_ids(self):
+        self.assertEqual(self.retriever().get_ids(models_v2.Network),
+                         set([base.NETWORK_ID, base.EXT_NETWORK_ID]))
@@ -10,23 +10,105 @@ back to a network controller and or newly integrated controller
 @email  wallnerryan@gmail.com
 
 Usage:
-  migrate <cntlr> [--migrate=<cmpnt> --connected=<is_conn>]
+  migrate <cntlr> [--migrate=<cmpnt> --connected=<is_conn>] [--config-file=<file>] [--workers=<n>] [--batch-size=<n>] [--mode=<mode>] [--dry-run] [--journal=<file>] [--resume]
   migrate -h | --help
   migrate --version
 
 Options:
   -h --help             Show this screen.
   --version             Show version.
-  --migrate=<cmpnt>     Logical component you want to migrate. [default: all].
+  --migrate=<cmpnt>     Logical component you want to migrate, a comma separated list of networks, ports, routers, interfaces, floatingips. [default: all].
   --connected=<is_conn> Is the controller connected to Openstack (Quantum/Nuetron)? [default: True].
+  --config-file=<file>  Plugin configuration file with the [DATABASE] and controller sections. [default: /etc/quantum/plugins/nicira/nvp.ini].
+  --workers=<n>         Number of concurrent requests to the controller. [default: 10].
+  --batch-size=<n>      Number of rows read from the Quantum database at a time. [default: 500].
+  --mode=<mode>         full replays every object, diff only creates, updates and deletes what differs on the controller. [default: full].
+  --dry-run             With --mode=diff, print the plan without executing it.
+  --journal=<file>      Where the progress of the migration is recorded. [default: migrate.journal].
+  --resume              Skip the objects the journal of an interrupted run has as done.
 
 """
+import eventlet
+eventlet.monkey_patch()
+
+import sys
 
 from docopt import docopt
+from oslo.config import cfg
+
+from common import drivers
+from common import journal
+from common import migrator
+from common import resync
+from common import retvals
+from quantum.common import config
+
+MODES = ('full', 'diff')
+
+
+def parse_components(value):
+    if value == 'all':
+        return migrator.STAGES
+    components = [c.strip() for c in value.split(',')]
+    unknown = set(components) - set(migrator.STAGES)
+    if unknown:
+        sys.exit("Unknown component(s) %s, expected one of: all, %s" %
+                 (', '.join(sorted(unknown)), ', '.join(migrator.STAGES)))
+    return components
+
+
+def get_driver(cntlr, config_file, workers):
+    try:
+        driver_class = drivers.get_driver_class(cntlr)
+        config.parse(['--config-file', config_file])
+        config.setup_logging(cfg.CONF)
+        return driver_class.from_config(cfg.CONF, workers)
+    except drivers.DriverError as e:
+        sys.exit(str(e))
+
+
+def main(args):
+    mode = args['--mode']
+    if mode not in MODES:
+        sys.exit("Unknown mode '%s', expected one of: %s" %
+                 (mode, ', '.join(MODES)))
+    if args['--dry-run'] and mode != 'diff':
+        sys.exit("--dry-run is only supported with --mode=diff")
+    stages = parse_components(args['--migrate'])
+    workers = int(args['--workers'])
+    connected = args['--connected'].lower() in ('true', 'yes', '1')
+
+    driver = get_driver(args['<cntlr>'], args['--config-file'], workers)
+    retriever = retvals.RetrieveValues(
+        set(stages), batch_size=int(args['--batch-size']))
+    if mode == 'diff':
+        runner = resync.DiffMigrator(driver, retriever, workers=workers,
+                                     connected=connected)
+        plan = runner.build_plan(stages)
+        print resync.format_plan(plan)
+        if args['--dry-run']:
+            return 0
+    else:
+        runner = migrator.Migrator(driver, retriever, workers=workers,
+                                   connected=connected)
+    runner.journal = journal.Journal(args['--journal'],
+                                     resume=args['--resume'])
+    try:
+        stats = runner.run(stages)
+    finally:
+        runner.journal.close()
+
+    failed = False
+    for stage in migrator.STAGES:
+        if stage in stats:
+            counts = ' '.join('%s: %-8d' % (status, stats[stage][status])
+                              for status in runner.STATUSES)
+            print "%-12s %s(%.1fs)" % (stage, counts,
+                                       stats[stage]['seconds'])
+            failed = failed or stats[stage][migrator.FAILED]
+    return failed and 1 or 0
+
+
 if __name__ == '__main__':
     args = docopt(__doc__, version='Quantum Migrate 1.0')
-    
-    #Testing
-    print args['<cntlr>']
-    print args['--migrate']
-    print args['--connected']
+    sys.exit(main(args))
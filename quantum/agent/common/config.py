@@ -29,6 +29,10 @@ LOG = logging.getLogger(__name__)
 ROOT_HELPER_OPTS = [
     cfg.StrOpt('root_helper', default='sudo',
                help=_('Root helper application.')),
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Unix socket of a quantum-rootwrap-daemon to run '
+                      'privileged commands through, rather than starting '
+                      'root_helper for each of them.')),
 ]
 
 AGENT_STATE_OPTS = [
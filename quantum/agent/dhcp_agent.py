@@ -31,6 +31,7 @@ from quantum.agent.linux import ip_lib
 from quantum.agent import rpc as agent_rpc
 from quantum.common import constants
 from quantum.common import exceptions
+from quantum.common import rpc as q_rpc
 from quantum.common import topics
 from quantum import context
 from quantum import manager
@@ -39,6 +40,7 @@ from quantum.openstack.common import jsonutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import lockutils
 from quantum.openstack.common import loopingcall
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.openstack.common import service
 from quantum.openstack.common import uuidutils
@@ -51,7 +53,12 @@ METADATA_DEFAULT_IP = '169.254.169.254/%d' % METADATA_DEFAULT_PREFIX
 METADATA_PORT = 80
 
 
-class DhcpAgent(manager.Manager):
+class DhcpAgent(manager.Manager, q_rpc.NotificationsBatchMixin):
+    # history
+    #   1.0 Initial version
+    #   1.1 Added notifications_batch
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
                    help=_("Interval to resync.")),
@@ -66,6 +73,12 @@ class DhcpAgent(manager.Manager):
                     help=_("Allows for serving metadata requests from a "
                            "dedicated network. Requires "
                            "enable_isolated_metadata = True")),
+        cfg.IntOpt('num_sync_threads', default=4,
+                   help=_("Number of networks synchronized concurrently.")),
+        cfg.FloatOpt('port_events_window', default=0.5,
+                     help=_("Seconds the port changes of a network are "
+                            "gathered before the DHCP server is reloaded, "
+                            "0 to reload on every change.")),
     ]
 
     def __init__(self, host=None):
@@ -79,6 +92,8 @@ class DhcpAgent(manager.Manager):
         self.plugin_rpc = DhcpPluginApi(topics.PLUGIN, ctx)
         self.device_manager = DeviceManager(self.conf, self.plugin_rpc)
         self.lease_relay = DhcpLeaseRelay(self.update_lease)
+        # networks waiting for their allocations to be reloaded
+        self._pending_reloads = set()
 
         self.dhcp_version = self.dhcp_driver_cls.check_version()
         self._populate_networks_cache()
@@ -153,12 +168,29 @@ class DhcpAgent(manager.Manager):
             for deleted_id in known_networks - active_networks:
                 self.disable_dhcp_helper(deleted_id)
 
+            # The state of every network is fetched at once, then the
+            # networks are brought up concurrently. A network missing from
+            # the reply was deleted meanwhile, or the plugin failed to
+            # report it; it is looked up on its own.
+            networks = dict(
+                (network.id, network) for network in
+                self.plugin_rpc.get_networks_info(list(active_networks)))
+            pool = eventlet.GreenPool(max(self.conf.num_sync_threads, 1))
             for network_id in active_networks:
-                self.refresh_dhcp_helper(network_id)
+                pool.spawn_n(self._safe_refresh_dhcp_helper, network_id,
+                             networks.get(network_id))
+            pool.waitall()
         except:
             self.needs_resync = True
             LOG.exception(_('Unable to sync network state.'))
 
+    def _safe_refresh_dhcp_helper(self, network_id, network=None):
+        try:
+            self.refresh_dhcp_helper(network_id, network)
+        except Exception:
+            self.needs_resync = True
+            LOG.exception(_('Unable to sync network %s state.'), network_id)
+
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
         while True:
@@ -171,14 +203,16 @@ class DhcpAgent(manager.Manager):
         """Spawn a thread to periodically resync the dhcp state."""
         eventlet.spawn(self._periodic_resync_helper)
 
-    def enable_dhcp_helper(self, network_id):
+    def enable_dhcp_helper(self, network_id, network=None):
         """Enable DHCP for a network that meets enabling criteria."""
-        try:
-            network = self.plugin_rpc.get_network_info(network_id)
-        except:
-            self.needs_resync = True
-            LOG.exception(_('Network %s RPC info call failed.'), network_id)
-            return
+        if network is None:
+            try:
+                network = self.plugin_rpc.get_network_info(network_id)
+            except:
+                self.needs_resync = True
+                LOG.exception(_('Network %s RPC info call failed.'),
+                              network_id)
+                return
 
         if not network.admin_state_up:
             return
@@ -202,22 +236,25 @@ class DhcpAgent(manager.Manager):
             if self.call_driver('disable', network):
                 self.cache.remove(network)
 
-    def refresh_dhcp_helper(self, network_id):
+    def refresh_dhcp_helper(self, network_id, network=None):
         """Refresh or disable DHCP for a network depending on the current state
         of the network.
 
+        The state is fetched from the plugin unless given as network.
         """
         old_network = self.cache.get_network_by_id(network_id)
         if not old_network:
             # DHCP current not running for network.
-            return self.enable_dhcp_helper(network_id)
+            return self.enable_dhcp_helper(network_id, network)
 
-        try:
-            network = self.plugin_rpc.get_network_info(network_id)
-        except:
-            self.needs_resync = True
-            LOG.exception(_('Network %s RPC info call failed.'), network_id)
-            return
+        if network is None:
+            try:
+                network = self.plugin_rpc.get_network_info(network_id)
+            except:
+                self.needs_resync = True
+                LOG.exception(_('Network %s RPC info call failed.'),
+                              network_id)
+                return
 
         old_cidrs = set(s.cidr for s in old_network.subnets if s.enable_dhcp)
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
@@ -268,6 +305,27 @@ class DhcpAgent(manager.Manager):
         if network:
             self.refresh_dhcp_helper(network.id)
 
+    def _reload_allocations_soon(self, network):
+        """Reload the allocations of a network once its port events settle.
+
+        The events notified within port_events_window seconds of the first
+        one are served by a single reload.
+        """
+        if not self.conf.port_events_window:
+            self.call_driver('reload_allocations', network)
+        elif network.id not in self._pending_reloads:
+            self._pending_reloads.add(network.id)
+            eventlet.spawn_after(self.conf.port_events_window,
+                                 self._reload_allocations, network.id)
+
+    @lockutils.synchronized('agent', 'dhcp-')
+    def _reload_allocations(self, network_id):
+        # Changes notified from now on need another reload
+        self._pending_reloads.discard(network_id)
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
     @lockutils.synchronized('agent', 'dhcp-')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
@@ -275,7 +333,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(port.network_id)
         if network:
             self.cache.put_port(port)
-            self.call_driver('reload_allocations', network)
+            self._reload_allocations_soon(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -287,7 +345,7 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self._reload_allocations_soon(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -346,16 +404,21 @@ class DhcpPluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.1 - get_networks_info.
 
     """
 
     BASE_RPC_API_VERSION = '1.0'
+    BULK_RPC_API_VERSION = '1.1'
 
     def __init__(self, topic, context):
         super(DhcpPluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
         self.context = context
         self.host = cfg.CONF.host
+        # Cleared once the plugin turned down get_networks_info, networks
+        # are then fetched one call at a time
+        self.bulk_supported = True
 
     def get_active_networks(self):
         """Make a remote process call to retrieve the active networks."""
@@ -371,6 +434,37 @@ class DhcpPluginApi(proxy.RpcProxy):
                                                  host=self.host),
                                    topic=self.topic))
 
+    def get_networks_info(self, network_ids):
+        """Make a remote process call to retrieve several networks info.
+
+        Networks the plugin does not know of are left out of the result.
+        """
+        if self.bulk_supported:
+            try:
+                networks = self.call(
+                    self.context,
+                    self.make_msg('get_networks_info',
+                                  network_ids=network_ids,
+                                  host=self.host),
+                    topic=self.topic,
+                    version=self.BULK_RPC_API_VERSION)
+                return [DictModel(network) for network in networks]
+            except rpc_common.RemoteError as e:
+                if e.exc_type not in ('UnsupportedRpcVersion',
+                                      'AttributeError'):
+                    raise
+                LOG.info(_("Plugin does not support get_networks_info, "
+                           "falling back to one call per network"))
+                self.bulk_supported = False
+        networks = []
+        for network_id in network_ids:
+            try:
+                networks.append(self.get_network_info(network_id))
+            except rpc_common.RemoteError as e:
+                if e.exc_type != 'NetworkNotFound':
+                    raise
+        return networks
+
     def get_dhcp_port(self, network_id, device_id):
         """Make a remote process call to create the dhcp port."""
         return DictModel(self.call(self.context,
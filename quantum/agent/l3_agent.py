@@ -19,8 +19,12 @@
 #
 """
 
+import heapq
+import itertools
+import time
+
 import eventlet
-from eventlet import semaphore
+from eventlet import event
 import netaddr
 from oslo.config import cfg
 
@@ -32,6 +36,7 @@ from quantum.agent.linux import iptables_manager
 from quantum.agent.linux import utils
 from quantum.agent import rpc as agent_rpc
 from quantum.common import constants as l3_constants
+from quantum.common import rpc as q_rpc
 from quantum.common import topics
 from quantum.common import utils as common_utils
 from quantum import context
@@ -51,6 +56,10 @@ NS_PREFIX = 'qrouter-'
 INTERNAL_DEV_PREFIX = 'qr-'
 EXTERNAL_DEV_PREFIX = 'qg-'
 
+# Updates notified by the server go before the ones of a full sync
+PRIORITY_RPC = 0
+PRIORITY_SYNC = 1
+
 
 class L3PluginApi(proxy.RpcProxy):
     """Agent side of the l3 agent RPC API.
@@ -90,12 +99,20 @@ class L3PluginApi(proxy.RpcProxy):
 
 
 class RouterInfo(object):
+    """A router together with the state last applied for it.
+
+    process_router() compares the router with this state and only applies
+    the difference.
+    """
 
     def __init__(self, router_id, root_helper, use_namespaces, router):
         self.router_id = router_id
         self.ex_gw_port = None
         self.internal_ports = []
-        self.floating_ips = []
+        # floating ip id -> floating ip, for the associated ones
+        self.floating_ips = {}
+        # addresses of the gateway device, None until they are read
+        self.gw_ip_cidrs = None
         self.root_helper = root_helper
         self.use_namespaces = use_namespaces
         self.router = router
@@ -111,7 +128,106 @@ class RouterInfo(object):
             return NS_PREFIX + self.router_id
 
 
-class L3NATAgent(manager.Manager):
+class RouterUpdate(object):
+    """A pending change of a router.
+
+    @router_id  id of the router
+    @priority  PRIORITY_RPC or PRIORITY_SYNC
+    @router  router as returned by the plugin, None when deleted
+    @deleted  whether the router has to be removed
+    @timestamp  when the router data was read
+    """
+
+    def __init__(self, router_id, priority, router=None, deleted=False,
+                 timestamp=None):
+        self.router_id = router_id
+        self.priority = priority
+        self.router = router
+        self.deleted = deleted
+        if timestamp is None:
+            timestamp = time.time()
+        self.timestamp = timestamp
+
+
+class RouterUpdateQueue(object):
+    """Router updates waiting for a worker, served by priority.
+
+    Only the most recent update of a router is kept, at the highest
+    priority it was queued with. A router is processed by a single worker
+    at a time: its updates are not handed out until task_done() is called
+    for the previous one.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # router id -> latest update
+        self._pending = {}
+        self._in_progress = set()
+        self._counter = itertools.count()
+        self._changed = event.Event()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, router_id):
+        return router_id in self._pending
+
+    def add(self, update):
+        existing = self._pending.get(update.router_id)
+        if existing:
+            priority = min(existing.priority, update.priority)
+            if existing.timestamp > update.timestamp:
+                update = existing
+            update.priority = priority
+        update.seq = self._counter.next()
+        self._pending[update.router_id] = update
+        heapq.heappush(self._heap,
+                       (update.priority, update.seq, update.router_id))
+        self._notify()
+
+    def _notify(self):
+        if not self._changed.ready():
+            self._changed.send()
+
+    def _pop(self):
+        busy = []
+        update = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            priority, seq, router_id = entry
+            pending = self._pending.get(router_id)
+            if not pending or pending.seq != seq:
+                # Superseded by a later update
+                continue
+            if router_id in self._in_progress:
+                busy.append(entry)
+                continue
+            update = self._pending.pop(router_id)
+            self._in_progress.add(router_id)
+            break
+        for entry in busy:
+            heapq.heappush(self._heap, entry)
+        return update
+
+    def get(self):
+        """Wait for and return the next update ready to be processed."""
+        while True:
+            update = self._pop()
+            if update:
+                return update
+            self._changed.wait()
+            self._changed = event.Event()
+
+    def task_done(self, router_id):
+        self._in_progress.discard(router_id)
+        self._notify()
+
+
+class L3NATAgent(manager.Manager, q_rpc.NotificationsBatchMixin):
+    # history
+    #   1.0 Initial version
+    #   1.1 Added notifications_batch
+    RPC_API_VERSION = '1.1'
 
     OPTS = [
         cfg.StrOpt('external_network_bridge', default='br-ex',
@@ -141,6 +257,8 @@ class L3NATAgent(manager.Manager):
         cfg.StrOpt('gateway_external_network_id', default='',
                    help=_("UUID of external network for routers implemented "
                           "by the agents.")),
+        cfg.IntOpt('router_workers', default=8,
+                   help=_("Number of routers processed concurrently.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -164,7 +282,13 @@ class L3NATAgent(manager.Manager):
         self.context = context.get_admin_context_without_session()
         self.plugin_rpc = L3PluginApi(topics.PLUGIN, host)
         self.fullsync = True
-        self.sync_sem = semaphore.Semaphore(1)
+        self.target_ex_net_id = None
+        self._queue = RouterUpdateQueue()
+        self._pool = eventlet.GreenPool(max(self.conf.router_workers, 1))
+        # router id -> timestamp of the last update processed
+        self._last_processed = {}
+        # router id -> seconds taken by the last processing
+        self.router_process_times = {}
         if self.conf.use_namespaces:
             self._destroy_router_namespaces(self.conf.router_id)
         super(L3NATAgent, self).__init__(host=self.conf.host)
@@ -211,8 +335,13 @@ class L3NATAgent(manager.Manager):
         """Find UUID of single external network for this agent"""
         if self.conf.gateway_external_network_id:
             return self.conf.gateway_external_network_id
+        # Looked up again on every full sync
+        if self.target_ex_net_id:
+            return self.target_ex_net_id
         try:
-            return self.plugin_rpc.get_external_network_id(self.context)
+            self.target_ex_net_id = self.plugin_rpc.get_external_network_id(
+                self.context)
+            return self.target_ex_net_id
         except rpc_common.RemoteError as e:
             if e.exc_type == 'TooManyExternalNetworks':
                 msg = _(
@@ -288,8 +417,30 @@ class L3NATAgent(manager.Manager):
         port['ip_cidr'] = "%s/%s" % (ips[0]['ip_address'], prefixlen)
 
     def process_router(self, ri):
+        # Every change below is applied to iptables at once
+        ri.iptables_manager.defer_apply_on()
+        try:
+            self._process_router(ri)
+        finally:
+            ri.iptables_manager.defer_apply_off()
 
+    def _process_router(self, ri):
         ex_gw_port = self._get_ex_gw_port(ri)
+        if ex_gw_port:
+            self._set_subnet_info(ex_gw_port)
+        internal_cidrs = [p['ip_cidr'] for p in ri.internal_ports]
+
+        if ri.ex_gw_port and (not ex_gw_port or
+                              ex_gw_port['id'] != ri.ex_gw_port['id'] or
+                              ex_gw_port['ip_cidr'] !=
+                              ri.ex_gw_port['ip_cidr']):
+            # Floating IPs go away with the gateway
+            self.process_router_floating_ips(ri, None)
+            self.external_gateway_removed(ri, ri.ex_gw_port,
+                                          internal_cidrs)
+            ri.ex_gw_port = None
+            ri.gw_ip_cidrs = None
+
         internal_ports = ri.router.get(l3_constants.INTERFACE_KEY, [])
         existing_port_ids = set([p['id'] for p in ri.internal_ports])
         current_port_ids = set([p['id'] for p in internal_ports
@@ -303,71 +454,59 @@ class L3NATAgent(manager.Manager):
         for p in new_ports:
             self._set_subnet_info(p)
             ri.internal_ports.append(p)
-            self.internal_network_added(ri, ex_gw_port,
+            self.internal_network_added(ri, ri.ex_gw_port,
                                         p['network_id'], p['id'],
                                         p['ip_cidr'], p['mac_address'])
 
         for p in old_ports:
             ri.internal_ports.remove(p)
-            self.internal_network_removed(ri, ex_gw_port, p['id'],
+            self.internal_network_removed(ri, ri.ex_gw_port, p['id'],
                                           p['ip_cidr'])
 
-        internal_cidrs = [p['ip_cidr'] for p in ri.internal_ports]
-
         if ex_gw_port and not ri.ex_gw_port:
-            self._set_subnet_info(ex_gw_port)
+            internal_cidrs = [p['ip_cidr'] for p in ri.internal_ports]
             self.external_gateway_added(ri, ex_gw_port, internal_cidrs)
-        elif not ex_gw_port and ri.ex_gw_port:
-            self.external_gateway_removed(ri, ri.ex_gw_port,
-                                          internal_cidrs)
-
-        if ri.ex_gw_port or ex_gw_port:
-            self.process_router_floating_ips(ri, ex_gw_port)
+            ri.ex_gw_port = ex_gw_port
 
-        ri.ex_gw_port = ex_gw_port
+        self.process_router_floating_ips(ri, ri.ex_gw_port)
 
         self.routes_updated(ri)
 
     def process_router_floating_ips(self, ri, ex_gw_port):
-        floating_ips = ri.router.get(l3_constants.FLOATINGIP_KEY, [])
-        existing_floating_ip_ids = set([fip['id'] for fip in ri.floating_ips])
-        cur_floating_ip_ids = set([fip['id'] for fip in floating_ips])
-
-        id_to_fip_map = {}
-
-        for fip in floating_ips:
-            if fip['port_id']:
-                if fip['id'] not in existing_floating_ip_ids:
-                    ri.floating_ips.append(fip)
-                    self.floating_ip_added(ri, ex_gw_port,
-                                           fip['floating_ip_address'],
-                                           fip['fixed_ip_address'])
-
-                # store to see if floatingip was remapped
-                id_to_fip_map[fip['id']] = fip
-
-        floating_ip_ids_to_remove = (existing_floating_ip_ids -
-                                     cur_floating_ip_ids)
-        for fip in ri.floating_ips:
-            if fip['id'] in floating_ip_ids_to_remove:
-                ri.floating_ips.remove(fip)
+        """Apply the floating IP changes of a router.
+
+        Only the floating IPs which were added, removed or associated to
+        another fixed IP since the last call are touched. Without
+        ex_gw_port every floating IP is removed.
+        """
+        floating_ips = {}
+        if ex_gw_port:
+            floating_ips = dict(
+                (fip['id'], fip)
+                for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, [])
+                if fip['port_id'])
+
+        for fip_id, fip in ri.floating_ips.items():
+            new_fip = floating_ips.get(fip_id)
+            if (not new_fip or new_fip['floating_ip_address'] !=
+                    fip['floating_ip_address']):
+                del ri.floating_ips[fip_id]
                 self.floating_ip_removed(ri, ri.ex_gw_port,
                                          fip['floating_ip_address'],
                                          fip['fixed_ip_address'])
-            else:
-                # handle remapping of a floating IP
-                new_fip = id_to_fip_map[fip['id']]
-                new_fixed_ip = new_fip['fixed_ip_address']
-                existing_fixed_ip = fip['fixed_ip_address']
-                if (new_fixed_ip and existing_fixed_ip and
-                        new_fixed_ip != existing_fixed_ip):
-                    floating_ip = fip['floating_ip_address']
-                    self.floating_ip_removed(ri, ri.ex_gw_port,
-                                             floating_ip, existing_fixed_ip)
-                    self.floating_ip_added(ri, ri.ex_gw_port,
-                                           floating_ip, new_fixed_ip)
-                    ri.floating_ips.remove(fip)
-                    ri.floating_ips.append(new_fip)
+            elif new_fip['fixed_ip_address'] != fip['fixed_ip_address']:
+                # The address stays on the gateway, only NAT changes
+                ri.floating_ips[fip_id] = new_fip
+                self.floating_ip_remapped(ri, fip['floating_ip_address'],
+                                          fip['fixed_ip_address'],
+                                          new_fip['fixed_ip_address'])
+
+        for fip_id, fip in floating_ips.iteritems():
+            if fip_id not in ri.floating_ips:
+                ri.floating_ips[fip_id] = fip
+                self.floating_ip_added(ri, ex_gw_port,
+                                       fip['floating_ip_address'],
+                                       fip['fixed_ip_address'])
 
     def _get_ex_gw_port(self, ri):
         return ri.router.get('gw_port')
@@ -512,15 +651,23 @@ class L3NATAgent(manager.Manager):
                  (internal_cidr, ex_gw_ip))]
         return rules
 
+    def _get_gw_ip_cidrs(self, ri, device):
+        # The gateway addresses are read once, then kept up to date
+        if ri.gw_ip_cidrs is None:
+            ri.gw_ip_cidrs = set(addr['cidr'] for addr in device.addr.list())
+        return ri.gw_ip_cidrs
+
     def floating_ip_added(self, ri, ex_gw_port, floating_ip, fixed_ip):
         ip_cidr = str(floating_ip) + '/32'
         interface_name = self.get_external_device_name(ex_gw_port['id'])
         device = ip_lib.IPDevice(interface_name, self.root_helper,
                                  namespace=ri.ns_name())
 
-        if ip_cidr not in [addr['cidr'] for addr in device.addr.list()]:
+        gw_ip_cidrs = self._get_gw_ip_cidrs(ri, device)
+        if ip_cidr not in gw_ip_cidrs:
             net = netaddr.IPNetwork(ip_cidr)
             device.addr.add(net.version, ip_cidr, str(net.broadcast))
+            gw_ip_cidrs.add(ip_cidr)
             self._send_gratuitous_arp_packet(ri, interface_name, floating_ip)
 
         for chain, rule in self.floating_forward_rules(floating_ip, fixed_ip):
@@ -535,11 +682,24 @@ class L3NATAgent(manager.Manager):
         device = ip_lib.IPDevice(interface_name, self.root_helper,
                                  namespace=ri.ns_name())
         device.addr.delete(net.version, ip_cidr)
+        if ri.gw_ip_cidrs is not None:
+            ri.gw_ip_cidrs.discard(ip_cidr)
 
         for chain, rule in self.floating_forward_rules(floating_ip, fixed_ip):
             ri.iptables_manager.ipv4['nat'].remove_rule(chain, rule)
         ri.iptables_manager.apply()
 
+    def floating_ip_remapped(self, ri, floating_ip, old_fixed_ip,
+                             new_fixed_ip):
+        nat = ri.iptables_manager.ipv4['nat']
+        for chain, rule in self.floating_forward_rules(floating_ip,
+                                                       old_fixed_ip):
+            nat.remove_rule(chain, rule)
+        for chain, rule in self.floating_forward_rules(floating_ip,
+                                                       new_fixed_ip):
+            nat.add_rule(chain, rule)
+        ri.iptables_manager.apply()
+
     def floating_forward_rules(self, floating_ip, fixed_ip):
         return [('PREROUTING', '-d %s -j DNAT --to %s' %
                  (floating_ip, fixed_ip)),
@@ -550,27 +710,13 @@ class L3NATAgent(manager.Manager):
 
     def router_deleted(self, context, router_id):
         """Deal with router deletion RPC message."""
-        with self.sync_sem:
-            if router_id in self.router_info:
-                try:
-                    self._router_removed(router_id)
-                except Exception:
-                    msg = _("Failed dealing with router "
-                            "'%s' deletion RPC message")
-                    LOG.debug(msg, router_id)
-                    self.fullsync = True
+        self._queue.add(RouterUpdate(router_id, PRIORITY_RPC, deleted=True))
 
     def routers_updated(self, context, routers):
         """Deal with routers modification and creation RPC message."""
-        if not routers:
-            return
-        with self.sync_sem:
-            try:
-                self._process_routers(routers)
-            except Exception:
-                msg = _("Failed dealing with routers update RPC message")
-                LOG.debug(msg)
-                self.fullsync = True
+        for router in routers or []:
+            self._queue.add(RouterUpdate(router['id'], PRIORITY_RPC,
+                                         router=router))
 
     def router_removed_from_agent(self, context, payload):
         self.router_deleted(context, payload['router_id'])
@@ -623,25 +769,77 @@ class L3NATAgent(manager.Manager):
         for router_id in prev_router_ids - cur_router_ids:
             self._router_removed(router_id)
 
+    def _process_router_update(self, update):
+        router_id = update.router_id
+        start = time.time()
+        try:
+            if update.timestamp < self._last_processed.get(router_id, 0):
+                LOG.debug(_("Skipping outdated update of router %s"),
+                          router_id)
+                return
+            if update.deleted:
+                if router_id in self.router_info:
+                    self._router_removed(router_id)
+            else:
+                self._process_routers([update.router])
+            if (router_id in self.router_info or
+                    router_id in self._queue):
+                self._last_processed[router_id] = update.timestamp
+            else:
+                # Gone, and no later update to compare to this one
+                self._last_processed.pop(router_id, None)
+        except Exception:
+            LOG.exception(_("Failed processing router '%s'"), router_id)
+            self.fullsync = True
+        finally:
+            self._queue.task_done(router_id)
+        elapsed = time.time() - start
+        if router_id in self.router_info:
+            self.router_process_times[router_id] = elapsed
+        else:
+            self.router_process_times.pop(router_id, None)
+        LOG.debug(_("Router %(router_id)s processed in %(elapsed).3f "
+                    "seconds, %(depth)d updates pending"),
+                  {'router_id': router_id, 'elapsed': elapsed,
+                   'depth': len(self._queue)})
+
+    def _process_router_updates(self):
+        """Hand the queued router updates to the workers, forever."""
+        while True:
+            update = self._queue.get()
+            # Blocks while every worker is busy
+            self._pool.spawn_n(self._process_router_update, update)
+
     @periodic_task.periodic_task
     def _sync_routers_task(self, context):
-        # we need to sync with router deletion RPC message
-        with self.sync_sem:
-            if self.fullsync:
-                try:
-                    if not self.conf.use_namespaces:
-                        router_id = self.conf.router_id
-                    else:
-                        router_id = None
-                    routers = self.plugin_rpc.get_routers(
-                        context, router_id)
-                    self._process_routers(routers, all_routers=True)
-                    self.fullsync = False
-                except Exception:
-                    LOG.exception(_("Failed synchronizing routers"))
-                    self.fullsync = True
+        if self.fullsync:
+            try:
+                if not self.conf.use_namespaces:
+                    router_id = self.conf.router_id
+                else:
+                    router_id = None
+                self.target_ex_net_id = None
+                timestamp = time.time()
+                routers = self.plugin_rpc.get_routers(
+                    context, router_id)
+                for r in routers:
+                    self._queue.add(RouterUpdate(r['id'], PRIORITY_SYNC,
+                                                 router=r,
+                                                 timestamp=timestamp))
+                # Remove the routers the plugin no longer knows about
+                stale_router_ids = (set(self.router_info) -
+                                    set(r['id'] for r in routers))
+                for stale_router_id in stale_router_ids:
+                    self._queue.add(RouterUpdate(stale_router_id,
+                                                 PRIORITY_SYNC, deleted=True,
+                                                 timestamp=timestamp))
+                self.fullsync = False
+            except Exception:
+                LOG.exception(_("Failed synchronizing routers"))
+                self.fullsync = True
 
     def after_start(self):
+        eventlet.spawn_n(self._process_router_updates)
         LOG.info(_("L3 agent started"))
 
     def _update_routing_table(self, ri, operation, route):
@@ -718,6 +916,9 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        configurations['router_queue_depth'] = len(self._queue)
+        configurations['max_router_process_time'] = round(
+            max(self.router_process_times.values() or [0]), 3)
         try:
             self.state_rpc.report_state(self.context,
                                         self.agent_state)
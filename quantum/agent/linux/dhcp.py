@@ -210,6 +210,21 @@ class DhcpLocalProcess(DhcpBase):
                                                       ensure_conf_dir=True)
         utils.replace_file(interface_file_path, value)
 
+    def _replace_conf_file(self, name, data):
+        """Write a config file, unless it already holds data.
+
+        : returns: whether the file was written
+        """
+        try:
+            with open(name, 'r') as f:
+                if f.read() == data:
+                    return False
+        except IOError:
+            pass
+        utils.replace_file(name, data)
+        self.conf_files_changed = True
+        return True
+
     @abc.abstractmethod
     def spawn_process(self):
         pass
@@ -335,8 +350,14 @@ class Dnsmasq(DhcpLocalProcess):
                         'turned off DHCP: %s'), self.network.id)
             return
 
+        self.conf_files_changed = False
         self._output_hosts_file()
         self._output_opts_file()
+        if not self.conf_files_changed:
+            # dnsmasq already serves these allocations
+            LOG.debug(_('Allocations of network %s did not change'),
+                      self.network.id)
+            return
 
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
@@ -363,7 +384,7 @@ class Dnsmasq(DhcpLocalProcess):
                           (port.mac_address, name, alloc.ip_address))
 
         name = self.get_conf_file_name('host')
-        utils.replace_file(name, buf.getvalue())
+        self._replace_conf_file(name, buf.getvalue())
         return name
 
     def _output_opts_file(self):
@@ -409,7 +430,7 @@ class Dnsmasq(DhcpLocalProcess):
                     options.append(self._format_option(i, 'router'))
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_conf_file(name, '\n'.join(options))
         return name
 
     def _make_subnet_interface_ip_map(self):
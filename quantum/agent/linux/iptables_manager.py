@@ -21,6 +21,7 @@
 
 """Implements iptables rules using linux utilities."""
 
+import hashlib
 import inspect
 import os
 
@@ -236,6 +237,8 @@ class IptablesManager(object):
         self.root_helper = root_helper
         self.namespace = namespace
         self.iptables_apply_deferred = False
+        # (command, table) -> state last applied, see _get_table_state
+        self._applied_state = {}
 
         self.ipv4 = {'filter': IptablesTable()}
         self.ipv6 = {'filter': IptablesTable()}
@@ -317,6 +320,9 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        Tables are only touched when they changed since the last apply. If
+        only the rules of wrapped chains did, just those chains are
+        rewritten, without saving the table first.
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
@@ -324,22 +330,107 @@ class IptablesManager(object):
 
         for cmd, tables in s:
             for table in tables:
-                args = ['%s-save' % cmd, '-t', table]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                current_table = (self.execute(args,
-                                 root_helper=self.root_helper))
-                current_lines = current_table.split('\n')
-                new_filter = self._modify_rules(current_lines,
-                                                tables[table])
-                args = ['%s-restore' % (cmd)]
-                if self.namespace:
-                    args = ['ip', 'netns', 'exec', self.namespace] + args
-                self.execute(args,
-                             process_input='\n'.join(new_filter),
-                             root_helper=self.root_helper)
+                key = (cmd, table)
+                state = self._get_table_state(tables[table])
+                applied = self._applied_state.pop(key, None)
+                if state == applied:
+                    LOG.debug(_("No change to %(cmd)s table %(table)s"),
+                              {'cmd': cmd, 'table': table})
+                elif self._can_apply_incrementally(applied, state):
+                    self._apply_chains(cmd, table, tables[table],
+                                       self._changed_chains(applied, state))
+                else:
+                    self._apply_table(cmd, table, tables[table])
+                # The state is only recorded once applied, a failure forces
+                # a full restore next time
+                self._applied_state[key] = state
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _execute_in_namespace(self, args, **kwargs):
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        return self.execute(args, root_helper=self.root_helper, **kwargs)
+
+    def _apply_table(self, cmd, table_name, table):
+        current_table = self._execute_in_namespace(
+            ['%s-save' % cmd, '-t', table_name])
+        current_lines = current_table.split('\n')
+        new_filter = self._modify_rules(current_lines, table)
+        self._execute_in_namespace(['%s-restore' % cmd],
+                                   process_input='\n'.join(new_filter))
+
+    def _apply_chains(self, cmd, table_name, table, chains):
+        """Rewrite the given wrapped chains only.
+
+        With --noflush, iptables-restore leaves the other chains alone and
+        flushes the user defined chains it is given before filling them.
+        """
+        chain_rules = self._get_wrapped_chain_rules(table)
+        lines = ['*%s' % table_name]
+        lines += [':%s-%s - [0:0]' % (binary_name, chain)
+                  for chain in chains]
+        for chain in chains:
+            lines += chain_rules[chain]
+        lines += ['COMMIT', '']
+        self._execute_in_namespace(['%s-restore' % cmd, '--noflush'],
+                                   process_input='\n'.join(lines))
+
+    @staticmethod
+    def _get_wrapped_chain_rules(table):
+        """Return the rules of each wrapped chain, as iptables-restore lines.
+
+        Duplicated rules are dropped, the last occurrence taking precedence
+        as in _modify_rules.
+        """
+        chain_rules = dict((chain, []) for chain in table.chains)
+        for rule in table.rules:
+            if rule.wrap:
+                chain_rules[rule.chain].append(str(rule))
+        for chain, rules in chain_rules.iteritems():
+            if len(set(rules)) != len(rules):
+                seen = set()
+                unique = []
+                for rule in reversed(rules):
+                    if rule not in seen:
+                        seen.add(rule)
+                        unique.append(rule)
+                unique.reverse()
+                chain_rules[chain] = unique
+        return chain_rules
+
+    @staticmethod
+    def _hash_lines(lines):
+        return hashlib.sha1('\n'.join(lines)).hexdigest()
+
+    def _get_table_state(self, table):
+        """Return a digest of what an apply writes for a table.
+
+        The state is a (unwrapped, chains) tuple: a hash of the unwrapped
+        chains and rules, and a dict mapping each wrapped chain to a hash of
+        its rules.
+        """
+        unwrapped = sorted(table.unwrapped_chains)
+        unwrapped += ['%s %s' % (rule.top, rule) for rule in table.rules
+                      if not rule.wrap]
+        chains = dict((chain, self._hash_lines(rules)) for chain, rules in
+                      self._get_wrapped_chain_rules(table).iteritems())
+        return (self._hash_lines(unwrapped), chains)
+
+    @staticmethod
+    def _can_apply_incrementally(applied, state):
+        """Tell whether only wrapped chains were changed or added.
+
+        Unwrapped chains may hold rules from other components, and removed
+        chains must be deleted, both need the full save and restore.
+        """
+        return (applied is not None and applied[0] == state[0] and
+                set(applied[1]).issubset(state[1]))
+
+    @staticmethod
+    def _changed_chains(applied, state):
+        return sorted(chain for chain, digest in state[1].iteritems()
+                      if applied[1].get(chain) != digest)
+
     def _modify_rules(self, current_lines, table, binary=None):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -360,15 +451,18 @@ class IptablesManager(object):
                     break
 
         our_rules = []
+        top_rules = set()
         for rule in rules:
             rule_str = str(rule)
             if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
+                top_rules.add(rule_str.strip())
             our_rules += [rule_str]
+        if top_rules:
+            # rule.top == True means we want this rule to be at the top.
+            # Further down, we weed out duplicates from the bottom of the
+            # list, so here we remove the dupes ahead of time, in one pass.
+            new_filter = [line for line in new_filter
+                          if line.strip() not in top_rules]
 
         new_filter[rules_index:rules_index] = our_rules
 
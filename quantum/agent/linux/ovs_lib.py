@@ -18,6 +18,7 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import json
 import re
 
 from quantum.agent.linux import utils
@@ -26,6 +27,20 @@ from quantum.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 
 
+def decode_ovsdb_value(value):
+    """Turn an ovsdb json value into a python one.
+
+    Maps become dicts and sets their list of elements, an empty set being
+    None for scalar columns such as an unassigned ofport.
+    """
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == 'map':
+            return dict(value[1])
+        if value[0] == 'set':
+            return value[1] or None
+    return value
+
+
 class VifPort:
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
         self.port_name = port_name
@@ -216,42 +231,58 @@ class OVSBridge:
             LOG.error(_("Unable to execute %(cmd)s. Exception: %(exception)s"),
                       {'cmd': args, 'exception': e})
 
+    def get_interfaces(self):
+        """Return (name, ofport, external_ids) of the bridge interfaces.
+
+        Whatever the number of interfaces, this runs ovs-vsctl twice: once
+        for the names of the ports of the bridge and once for the columns of
+        every interface. An unassigned ofport is reported as -1.
+        """
+        port_names = set(self.get_port_name_list())
+        if not port_names:
+            return []
+        args = ['--format=json', '--', '--columns=name,ofport,external_ids',
+                'list', 'Interface']
+        result = self.run_vsctl(args)
+        if not result:
+            return []
+        try:
+            rows = json.loads(result)['data']
+        except (ValueError, KeyError), e:
+            LOG.error(_("Unable to parse ovs-vsctl output %(result)r. "
+                        "Exception: %(exception)s"),
+                      {'result': result, 'exception': e})
+            return []
+        interfaces = []
+        for name, ofport, external_ids in rows:
+            if name in port_names:
+                ofport = decode_ovsdb_value(ofport)
+                interfaces.append((name, -1 if ofport is None else ofport,
+                                   decode_ovsdb_value(external_ids)))
+        return interfaces
+
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
         edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-
+        for name, ofport, external_ids in self.get_interfaces():
+            vif_id = self.get_vif_id(external_ids)
+            if vif_id is not None:
+                edge_ports.append(VifPort(name, ofport, vif_id,
+                                          external_ids["attached-mac"], self))
         return edge_ports
 
+    def get_vif_id(self, external_ids):
+        """Return the iface-id of a VIF out of its external_ids, or None."""
+        if "iface-id" in external_ids and "attached-mac" in external_ids:
+            return external_ids['iface-id']
+        elif ("xs-vif-uuid" in external_ids and
+              "attached-mac" in external_ids):
+            # if this is a xenserver and iface-id is not automatically
+            # synced to OVS from XAPI, we grab it from XAPI directly
+            return self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+
     def get_vif_port_set(self):
-        edge_ports = set()
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                edge_ports.add(external_ids['iface-id'])
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                edge_ports.add(iface_id)
-        return edge_ports
+        return set(port.vif_id for port in self.get_vif_ports())
 
     def get_vif_port_by_id(self, port_id):
         args = ['--', '--columns=external_ids,name,ofport',
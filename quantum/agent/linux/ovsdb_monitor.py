@@ -0,0 +1,176 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import shlex
+import time
+
+import eventlet
+from eventlet import event
+from eventlet.green import subprocess
+
+from quantum.agent.linux import ovs_lib
+from quantum.common import utils
+from quantum.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+MONITOR_CMD = ['ovsdb-client', 'monitor', 'Interface',
+               'name,ofport,external_ids', '--format=json']
+
+
+class InterfaceMonitor(object):
+    """Keep track of the VIF ports of a bridge through ovsdb-client monitor.
+
+    A single ovsdb-client process reports every change of the Interface
+    table, so that the set of VIF ports is known without running
+    ovs-vsctl for each port. The table holds the interfaces of every
+    bridge: when the interfaces of VIFs change, the ones of the bridge are
+    listed once with ovs-vsctl list-ifaces. Only interfaces with an ofport
+    are reported, the agent can wire them as soon as they show up.
+
+    The monitor is not active until ovsdb-client sent the initial content
+    of the table, nor after it exited. Callers are expected to poll the
+    bridge meanwhile; ensure_started() starts ovsdb-client again, at most
+    once every respawn_interval seconds.
+    """
+
+    def __init__(self, bridge, root_helper=None, respawn_interval=30):
+        self.bridge = bridge
+        self.root_helper = root_helper
+        self.respawn_interval = respawn_interval
+        self._last_start = None
+        self._process = None
+        self._reader = None
+        self._initialized = False
+        # ovsdb row uuid -> (interface name, iface-id of the VIF port)
+        self._vif_ports = {}
+        # Names of the interfaces of the bridge, None when they could not
+        # be listed
+        self._bridge_ifaces = None
+        self._changed = event.Event()
+
+    @property
+    def is_active(self):
+        return (self._reader is not None and self._initialized and
+                self._bridge_ifaces is not None)
+
+    def start(self):
+        cmd = MONITOR_CMD
+        if self.root_helper:
+            cmd = shlex.split(self.root_helper) + cmd
+        LOG.debug(_("Running command: %s"), cmd)
+        self._initialized = False
+        self._vif_ports = {}
+        self._bridge_ifaces = None
+        self._last_start = time.time()
+        self._process = utils.subprocess_popen(cmd, stdout=subprocess.PIPE)
+        self._reader = eventlet.spawn(self._read_updates, self._process)
+
+    def ensure_started(self):
+        if self._reader is not None:
+            return
+        if (self._last_start is not None and
+                time.time() - self._last_start < self.respawn_interval):
+            return
+        try:
+            self.start()
+        except OSError:
+            LOG.exception(_("Unable to start the ovsdb monitor"))
+
+    def stop(self):
+        if self._process:
+            try:
+                self._process.kill()
+                self._process.wait()
+            except OSError:
+                # Already gone
+                pass
+        self._process = None
+        self._reader = None
+
+    def _read_updates(self, process):
+        try:
+            for line in iter(process.stdout.readline, ''):
+                line = line.strip()
+                if line:
+                    self.process_update(json.loads(line))
+        except Exception:
+            LOG.exception(_("Unable to process ovsdb monitor output"))
+            process.kill()
+        process.wait()
+        if process is self._process:
+            LOG.warn(_("ovsdb monitor exited with code %s, falling back to "
+                       "polling"), process.returncode)
+            self._process = None
+            self._reader = None
+            self._notify()
+
+    def process_update(self, update):
+        """Apply an update of the Interface table.
+
+        Every update is a table of (row, action, name, ofport, external_ids)
+        rows. A modified row shows up twice, as 'old' with the columns that
+        changed and as 'new' with its full content.
+        """
+        headings = update['headings']
+        old_vif_ports = self.get_vif_port_set()
+        changed = False
+        for values in update['data']:
+            row = dict(zip(headings, values))
+            action = row['action']
+            if action == 'old':
+                continue
+            old_vif = self._vif_ports.pop(row['row'], None)
+            vif = None
+            ofport = ovs_lib.decode_ovsdb_value(row['ofport'])
+            if action != 'delete' and ofport is not None:
+                vif_id = self.bridge.get_vif_id(
+                    ovs_lib.decode_ovsdb_value(row['external_ids']))
+                if vif_id:
+                    vif = (row['name'], vif_id)
+                    self._vif_ports[row['row']] = vif
+            changed = changed or vif != old_vif
+        self._initialized = True
+        if changed or self._bridge_ifaces is None:
+            self._list_bridge_ifaces()
+        if self.get_vif_port_set() != old_vif_ports:
+            self._notify()
+
+    def _list_bridge_ifaces(self):
+        # Interfaces are added to a bridge in the transaction creating them
+        res = self.bridge.run_vsctl(['list-ifaces', self.bridge.br_name])
+        if res is None:
+            LOG.warn(_("Unable to list the interfaces of %s, falling back "
+                       "to polling"), self.bridge.br_name)
+            self._bridge_ifaces = None
+        else:
+            self._bridge_ifaces = set(res.split())
+
+    def _notify(self):
+        if not self._changed.ready():
+            self._changed.send()
+
+    def get_vif_port_set(self):
+        return set(vif_id for name, vif_id in self._vif_ports.itervalues()
+                   if name in (self._bridge_ifaces or ()))
+
+    def wait_for_changes(self, timeout):
+        """Sleep until the VIF ports change, at most for timeout seconds."""
+        with eventlet.Timeout(timeout, False):
+            self._changed.wait()
+        if self._changed.ready():
+            self._changed = event.Event()
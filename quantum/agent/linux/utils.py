@@ -25,21 +25,43 @@ import struct
 import tempfile
 
 from eventlet.green import subprocess
+from oslo.config import cfg
 
 from quantum.common import utils
 from quantum.openstack.common import log as logging
+from quantum.rootwrap import daemon
 
 
 LOG = logging.getLogger(__name__)
 
 
-def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
-    if root_helper:
-        cmd = shlex.split(root_helper) + cmd
-    cmd = map(str, cmd)
+_rootwrap_clients = {}
+
+
+def _get_rootwrap_client():
+    """Return the client of the configured rootwrap daemon, if any."""
+    try:
+        socket_path = cfg.CONF.AGENT.root_helper_daemon
+    except cfg.NoSuchOptError:
+        return None
+    if not socket_path:
+        return None
+    if socket_path not in _rootwrap_clients:
+        _rootwrap_clients[socket_path] = daemon.RootwrapClient(socket_path)
+    return _rootwrap_clients[socket_path]
+
+
+def _execute_with_daemon(client, cmd, process_input):
+    try:
+        return client.execute(cmd, process_input)
+    except daemon.RootwrapDaemonError as e:
+        LOG.warn(_("Unable to run %(cmd)s through the rootwrap daemon, "
+                   "falling back to the root helper: %(e)s"),
+                 {'cmd': cmd, 'e': e})
+        return None
 
-    LOG.debug(_("Running command: %s"), cmd)
+
+def _execute_subprocess(cmd, process_input, addl_env):
     env = os.environ.copy()
     if addl_env:
         env.update(addl_env)
@@ -53,11 +75,33 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
                         obj.communicate(process_input) or
                         obj.communicate())
     obj.stdin.close()
+    return obj.returncode, _stdout, _stderr
+
+
+def execute(cmd, root_helper=None, process_input=None, addl_env=None,
+            check_exit_code=True, return_stderr=False):
+    cmd = map(str, cmd)
+    result = None
+    if root_helper:
+        # The daemon runs commands in its own environment, so commands
+        # that need additional variables go through the root helper.
+        client = not addl_env and _get_rootwrap_client()
+        if client:
+            LOG.debug(_("Running command through the rootwrap daemon: %s"),
+                      cmd)
+            result = _execute_with_daemon(client, cmd, process_input)
+        if result is None:
+            cmd = shlex.split(root_helper) + cmd
+
+    if result is None:
+        LOG.debug(_("Running command: %s"), cmd)
+        result = _execute_subprocess(cmd, process_input, addl_env)
+    returncode, _stdout, _stderr = result
     m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+          "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                    'stdout': _stdout, 'stderr': _stderr}
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
@@ -23,6 +23,7 @@ from quantum.openstack.common import log as logging
 from quantum.openstack.common.notifier import api
 from quantum.openstack.common.notifier import rpc_notifier
 from quantum.openstack.common import rpc
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.openstack.common.rpc import proxy
 from quantum.openstack.common import timeutils
 from quantum.openstack.common import uuidutils
@@ -71,14 +72,35 @@ class PluginApi(proxy.RpcProxy):
 
     API version history:
         1.0 - Initial version.
+        1.2 - get_devices_details_list and update_devices_down.
 
     '''
 
     BASE_RPC_API_VERSION = '1.0'
+    BULK_RPC_API_VERSION = '1.2'
 
     def __init__(self, topic):
         super(PluginApi, self).__init__(
             topic=topic, default_version=self.BASE_RPC_API_VERSION)
+        # Cleared once the plugin turned down a bulk call, the devices are
+        # then handled one call at a time
+        self.bulk_supported = True
+
+    def _call_bulk(self, context, method, single_call, devices, agent_id):
+        if self.bulk_supported:
+            try:
+                return self.call(context,
+                                 self.make_msg(method, devices=devices,
+                                               agent_id=agent_id),
+                                 topic=self.topic,
+                                 version=self.BULK_RPC_API_VERSION)
+            except rpc_common.RemoteError as e:
+                if e.exc_type != 'UnsupportedRpcVersion':
+                    raise
+                LOG.info(_("Plugin does not support %s, falling back to one "
+                           "call per device"), method)
+                self.bulk_supported = False
+        return [single_call(context, device, agent_id) for device in devices]
 
     def get_device_details(self, context, device, agent_id):
         return self.call(context,
@@ -86,12 +108,22 @@ class PluginApi(proxy.RpcProxy):
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def get_devices_details_list(self, context, devices, agent_id):
+        """Return the get_device_details() of each device, in order."""
+        return self._call_bulk(context, 'get_devices_details_list',
+                               self.get_device_details, devices, agent_id)
+
     def update_device_down(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_down', device=device,
                                        agent_id=agent_id),
                          topic=self.topic)
 
+    def update_devices_down(self, context, devices, agent_id):
+        """Return the update_device_down() of each device, in order."""
+        return self._call_bulk(context, 'update_devices_down',
+                               self.update_device_down, devices, agent_id)
+
     def update_device_up(self, context, device, agent_id):
         return self.call(context,
                          self.make_msg('update_device_up', device=device,
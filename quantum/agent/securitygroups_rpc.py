@@ -18,6 +18,7 @@
 
 from oslo.config import cfg
 
+from quantum.common import rpc as q_rpc
 from quantum.common import topics
 from quantum.openstack.common import importutils
 from quantum.openstack.common import log as logging
@@ -175,25 +176,30 @@ class SecurityGroupAgentRpcApiMixin(object):
         """ notify rule updated security groups """
         if not security_groups:
             return
-        self.fanout_cast(context,
-                         self.make_msg('security_groups_rule_updated',
-                                       security_groups=security_groups),
-                         version=SG_RPC_VERSION,
-                         topic=self._get_security_group_topic())
+        q_rpc.batched_fanout_cast(
+            self, context,
+            self.make_msg('security_groups_rule_updated',
+                          security_groups=security_groups),
+            merge='security_groups',
+            version=SG_RPC_VERSION,
+            topic=self._get_security_group_topic())
 
     def security_groups_member_updated(self, context, security_groups):
         """ notify member updated security groups """
         if not security_groups:
             return
-        self.fanout_cast(context,
-                         self.make_msg('security_groups_member_updated',
-                                       security_groups=security_groups),
-                         version=SG_RPC_VERSION,
-                         topic=self._get_security_group_topic())
+        q_rpc.batched_fanout_cast(
+            self, context,
+            self.make_msg('security_groups_member_updated',
+                          security_groups=security_groups),
+            merge='security_groups',
+            version=SG_RPC_VERSION,
+            topic=self._get_security_group_topic())
 
     def security_groups_provider_updated(self, context):
         """ notify provider updated security groups """
-        self.fanout_cast(context,
-                         self.make_msg('security_groups_provider_updated'),
-                         version=SG_RPC_VERSION,
-                         topic=self._get_security_group_topic())
+        q_rpc.batched_fanout_cast(
+            self, context,
+            self.make_msg('security_groups_provider_updated'),
+            version=SG_RPC_VERSION,
+            topic=self._get_security_group_topic())
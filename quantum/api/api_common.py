@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import operator
 import urllib
 
 from oslo.config import cfg
@@ -269,13 +270,12 @@ class SortingEmulatedHelper(SortingHelper):
                 fields_to_add.append(key)
 
     def sort(self, items):
-        def cmp_func(obj1, obj2):
-            for key, direction in self.sort_dict:
-                ret = cmp(obj1[key], obj2[key])
-                if ret:
-                    return ret * (1 if direction else -1)
-            return 0
-        return sorted(items, cmp=cmp_func)
+        # Sorts are stable: sorting on each key, from the last one to the
+        # first one, orders items like a comparison of all the keys would
+        items = list(items)
+        for key, direction in reversed(self.sort_dict):
+            items.sort(key=operator.itemgetter(key), reverse=not direction)
+        return items
 
 
 class SortingNativeHelper(SortingHelper):
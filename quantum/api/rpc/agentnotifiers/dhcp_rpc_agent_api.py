@@ -13,7 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+
 from quantum.common import constants
+from quantum.common import rpc as q_rpc
 from quantum.common import topics
 from quantum.common import utils
 from quantum import manager
@@ -27,7 +30,8 @@ LOG = logging.getLogger(__name__)
 class DhcpAgentNotifyAPI(proxy.RpcProxy):
     """API for plugin to notify DHCP agent."""
     BASE_RPC_API_VERSION = '1.0'
-    # It seems dhcp agent does not support bulk operation
+    # notifications_batch was added in 1.1
+    BATCH_RPC_API_VERSION = '1.1'
     VALID_RESOURCES = ['network', 'subnet', 'port']
     VALID_METHOD_NAMES = ['network.create.end',
                           'network.update.end',
@@ -52,13 +56,17 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
 
     def _notification_host(self, context, method, payload, host):
         """Notify the agent on host"""
-        self.cast(
-            context, self.make_msg(method,
-                                   payload=payload),
+        q_rpc.batched_cast(
+            self, context, self.make_msg(method,
+                                         payload=payload),
             topic='%s.%s' % (topics.DHCP_AGENT, host))
 
     def _notification(self, context, method, payload, network_id):
         """Notify all the agents that are hosting the network"""
+        self._notifications(context, method, [payload], network_id)
+
+    def _notifications(self, context, method, payloads, network_id):
+        """Notify the payloads of a network to the agents hosting it"""
         plugin = manager.QuantumManager.get_plugin()
         if (method != 'network_delete_end' and utils.is_extension_supported(
                 plugin, constants.AGENT_SCHEDULER_EXT_ALIAS)):
@@ -76,21 +84,23 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                         {'network': {'id': network_id}},
                         chosen_agent['host'])
             for (host, topic) in self._get_dhcp_agents(context, network_id):
-                self.cast(
-                    context, self.make_msg(method,
-                                           payload=payload),
-                    topic='%s.%s' % (topic, host))
+                for payload in payloads:
+                    q_rpc.batched_cast(
+                        self, context, self.make_msg(method,
+                                                     payload=payload),
+                        topic='%s.%s' % (topic, host))
         else:
             # besides the non-agentscheduler plugin,
             # There is no way to query who is hosting the network
             # when the network is deleted, so we need to fanout
-            self._notification_fanout(context, method, payload)
+            for payload in payloads:
+                self._notification_fanout(context, method, payload)
 
     def _notification_fanout(self, context, method, payload):
         """Fanout the payload to all dhcp agents"""
-        self.fanout_cast(
-            context, self.make_msg(method,
-                                   payload=payload),
+        q_rpc.batched_fanout_cast(
+            self, context, self.make_msg(method,
+                                         payload=payload),
             topic=topics.DHCP_AGENT)
 
     def network_removed_from_agent(self, context, network_id, host):
@@ -107,25 +117,37 @@ class DhcpAgentNotifyAPI(proxy.RpcProxy):
                                 host)
 
     def notify(self, context, data, methodname):
-        # data is {'key' : 'value'} with only one key
+        # data is {'key' : 'value'} with only one key, the value is a list
+        # of objects for bulk operations
         if methodname not in self.VALID_METHOD_NAMES:
             return
         obj_type = data.keys()[0]
-        if obj_type not in self.VALID_RESOURCES:
-            return
-        obj_value = data[obj_type]
-        network_id = None
-        if obj_type == 'network' and 'id' in obj_value:
-            network_id = obj_value['id']
-        elif obj_type in ['port', 'subnet'] and 'network_id' in obj_value:
-            network_id = obj_value['network_id']
-        if not network_id:
+        obj_values = data[obj_type]
+        if obj_type in ['%ss' % resource for resource in self.VALID_RESOURCES]:
+            obj_type = obj_type[:-1]
+        elif obj_type in self.VALID_RESOURCES:
+            obj_values = [obj_values]
+        else:
             return
         methodname = methodname.replace(".", "_")
-        if methodname.endswith("_delete_end"):
-            if 'id' in obj_value:
-                self._notification(context, methodname,
-                                   {obj_type + '_id': obj_value['id']},
-                                   network_id)
-        else:
-            self._notification(context, methodname, data, network_id)
+        # The objects of a network are notified together, so that its
+        # agents are looked up, and scheduled, once
+        payloads = collections.OrderedDict()
+        for obj_value in obj_values:
+            network_id = None
+            if obj_type == 'network' and 'id' in obj_value:
+                network_id = obj_value['id']
+            elif obj_type in ['port', 'subnet'] and 'network_id' in obj_value:
+                network_id = obj_value['network_id']
+            if not network_id:
+                continue
+            if methodname.endswith("_delete_end"):
+                if 'id' not in obj_value:
+                    continue
+                payload = {obj_type + '_id': obj_value['id']}
+            else:
+                payload = {obj_type: obj_value}
+            payloads.setdefault(network_id, []).append(payload)
+        for network_id, network_payloads in payloads.iteritems():
+            self._notifications(context, methodname, network_payloads,
+                                network_id)
@@ -14,6 +14,7 @@
 # limitations under the License.
 
 from quantum.common import constants
+from quantum.common import rpc as q_rpc
 from quantum.common import topics
 from quantum.common import utils
 from quantum import manager
@@ -27,6 +28,8 @@ LOG = logging.getLogger(__name__)
 class L3AgentNotifyAPI(proxy.RpcProxy):
     """API for plugin to notify L3 agent."""
     BASE_RPC_API_VERSION = '1.0'
+    # notifications_batch was added in 1.1
+    BATCH_RPC_API_VERSION = '1.1'
 
     def __init__(self, topic=topics.L3_AGENT):
         super(L3AgentNotifyAPI, self).__init__(
@@ -37,9 +40,9 @@ class L3AgentNotifyAPI(proxy.RpcProxy):
         LOG.debug(_('Nofity agent at %(host)s the message '
                     '%(method)s'), {'host': host,
                                     'method': method})
-        self.cast(
-            context, self.make_msg(method,
-                                   payload=payload),
+        q_rpc.batched_cast(
+            self, context, self.make_msg(method,
+                                         payload=payload),
             topic='%s.%s' % (topics.L3_AGENT, host))
 
     def _agent_notification(self, context, method, routers,
@@ -63,9 +66,10 @@ class L3AgentNotifyAPI(proxy.RpcProxy):
                           {'topic': l3_agent.topic,
                            'host': l3_agent.host,
                            'method': method})
-                self.cast(
-                    context, self.make_msg(method,
-                                           routers=[router]),
+                q_rpc.batched_cast(
+                    self, context, self.make_msg(method,
+                                                 routers=[router]),
+                    merge='routers',
                     topic='%s.%s' % (l3_agent.topic, l3_agent.host))
 
     def _notification(self, context, method, routers, operation, data):
@@ -79,10 +83,10 @@ class L3AgentNotifyAPI(proxy.RpcProxy):
             self._agent_notification(
                 context, method, routers, operation, data)
         else:
-            self.fanout_cast(
-                context, self.make_msg(method,
-                                       routers=routers),
-                topic=topics.L3_AGENT)
+            q_rpc.batched_fanout_cast(
+                self, context, self.make_msg(method,
+                                             routers=routers),
+                merge='routers', topic=topics.L3_AGENT)
 
     def _notification_fanout(self, context, method, router_id):
         """Fanout the deleted router to all L3 agents"""
@@ -91,9 +95,9 @@ class L3AgentNotifyAPI(proxy.RpcProxy):
                   {'topic': topics.DHCP_AGENT,
                    'method': method,
                    'router_id': router_id})
-        self.fanout_cast(
-            context, self.make_msg(method,
-                                   router_id=router_id),
+        q_rpc.batched_fanout_cast(
+            self, context, self.make_msg(method,
+                                         router_id=router_id),
             topic=topics.L3_AGENT)
 
     def agent_updated(self, context, admin_state_up, host):
@@ -198,11 +198,12 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
+            allowed = policy.check_list(request.context,
                                         self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+                                        obj_list,
+                                        plugin=self._plugin)
+            obj_list = [obj for obj, visible in zip(obj_list, allowed)
+                        if visible]
         collection = {self._collection:
                       [self._view(obj,
                                   fields_to_strip=fields_to_add)
@@ -323,7 +324,7 @@ class Controller(object):
                 tenant_id = item[self._resource]['tenant_id']
                 count = quota.QUOTAS.count(request.context, self._resource,
                                            self._plugin, self._collection,
-                                           tenant_id)
+                                           tenant_id=tenant_id)
                 if bulk:
                     delta = deltas.get(tenant_id, 0) + 1
                     deltas[tenant_id] = delta
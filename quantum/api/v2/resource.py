@@ -23,6 +23,7 @@ import webob.exc
 
 from quantum.api.v2 import attributes
 from quantum.common import exceptions
+from quantum.common import rpc as q_rpc
 from quantum.openstack.common import log as logging
 from quantum import wsgi
 
@@ -79,7 +80,9 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
 
             method = getattr(controller, action)
 
-            result = method(request=request, **args)
+            # The agents are notified once the request is handled
+            with q_rpc.batch_notifications(request.context):
+                result = method(request=request, **args)
         except (exceptions.QuantumException,
                 netaddr.AddrFormatError) as e:
             LOG.exception(_('%s failed'), action)
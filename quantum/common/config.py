@@ -73,6 +73,9 @@ core_opts = [
                help=_("Maximum number of fixed ips per port")),
     cfg.IntOpt('dhcp_lease_duration', default=120,
                help=_("DHCP lease duration")),
+    cfg.StrOpt('ipam_driver', default='quantum.db.ipam_db.RangeIpamDriver',
+               help=_("Driver keeping track of the free addresses of the "
+                      "subnet allocation pools")),
     cfg.BoolOpt('dhcp_agent_notification', default=True,
                 help=_("Allow sending resource operation"
                        " notification to DHCP agent")),
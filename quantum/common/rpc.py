@@ -15,6 +15,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import contextlib
+
+from oslo.config import cfg
+
 from quantum import context
 from quantum.openstack.common import log as logging
 from quantum.openstack.common.rpc import dispatcher
@@ -22,6 +27,14 @@ from quantum.openstack.common.rpc import dispatcher
 
 LOG = logging.getLogger(__name__)
 
+notification_opts = [
+    cfg.BoolOpt('agent_notifications_batch', default=False,
+                help=_("Send the notifications left for a DHCP or L3 agent "
+                       "at the end of an API request as a single message. "
+                       "Every agent must support RPC API version 1.1")),
+]
+cfg.CONF.register_opts(notification_opts)
+
 
 class PluginRpcDispatcher(dispatcher.RpcDispatcher):
     """This class is used to convert RPC common context into
@@ -41,3 +54,137 @@ class PluginRpcDispatcher(dispatcher.RpcDispatcher):
         quantum_ctxt = context.Context(user_id, tenant_id, **rpc_ctxt_dict)
         return super(PluginRpcDispatcher, self).dispatch(
             quantum_ctxt, version, method, **kwargs)
+
+
+def _item_key(item):
+    return item['id'] if isinstance(item, dict) else item
+
+
+class _PendingNotification(object):
+
+    def __init__(self, context, msg, merge, kwargs):
+        self.context = context
+        self.msg = msg
+        self.merge = merge
+        self.kwargs = kwargs
+        if merge:
+            # Merged items by id, the last notified version of an item wins
+            self.items = collections.OrderedDict(
+                (_item_key(item), item) for item in msg['args'][merge])
+
+    def _unmerged(self, msg):
+        return dict(msg, args=dict((k, v) for k, v in msg['args'].iteritems()
+                                   if k != self.merge))
+
+    def absorb(self, msg, merge, kwargs):
+        """Fold msg into this notification if it does not tell more."""
+        if merge != self.merge or kwargs != self.kwargs:
+            return False
+        if not merge:
+            return msg == self.msg
+        if self._unmerged(msg) != self._unmerged(self.msg):
+            return False
+        self.items.update((_item_key(item), item)
+                          for item in msg['args'][merge])
+        return True
+
+    def get_msg(self):
+        if not self.merge:
+            return self.msg
+        args = dict(self.msg['args'])
+        args[self.merge] = self.items.values()
+        return dict(self.msg, args=args)
+
+
+class NotificationBatch(object):
+    """Agent notifications held until the end of an API request.
+
+    Notifications are grouped by proxy, cast method and topic. Identical
+    notifications are sent once, and notifications of the same method
+    which only differ by the list argument named by merge are sent as one
+    notification listing all the items. When several notifications are
+    left for a topic and the proxy has a BATCH_RPC_API_VERSION, they are
+    sent in a single notifications_batch message if agent_notifications_batch
+    is set, see NotificationsBatchMixin. Otherwise they are sent one by one,
+    as agents older than that version expect.
+    """
+
+    def __init__(self):
+        self._queues = collections.OrderedDict()
+        self.closed = False
+
+    def add(self, proxy, cast, context, msg, merge, kwargs):
+        key = (proxy, cast, kwargs.get('topic'))
+        queue = self._queues.setdefault(key, [])
+        if not any(pending.absorb(msg, merge, kwargs) for pending in queue):
+            queue.append(_PendingNotification(context, msg, merge, kwargs))
+
+    def flush(self):
+        self.closed = True
+        queues, self._queues = self._queues, collections.OrderedDict()
+        for (proxy, cast, topic), queue in queues.iteritems():
+            send = getattr(proxy, cast)
+            version = getattr(proxy, 'BATCH_RPC_API_VERSION', None)
+            if (len(queue) > 1 and version and
+                    cfg.CONF.agent_notifications_batch):
+                msg = proxy.make_msg('notifications_batch',
+                                     notifications=[pending.get_msg()
+                                                    for pending in queue])
+                send(queue[0].context, msg,
+                     **dict(queue[0].kwargs, version=version))
+                continue
+            for pending in queue:
+                send(pending.context, pending.get_msg(), **pending.kwargs)
+
+
+@contextlib.contextmanager
+def batch_notifications(context):
+    """Hold the notifications cast with context until the block exits."""
+    batch = getattr(context, 'notification_batch', None)
+    if batch is not None and not batch.closed:
+        yield batch
+        return
+    batch = NotificationBatch()
+    context.notification_batch = batch
+    try:
+        yield batch
+    finally:
+        context.notification_batch = None
+        batch.flush()
+
+
+def _batched(proxy, cast, context, msg, merge, kwargs):
+    batch = getattr(context, 'notification_batch', None)
+    # Copies of the context, made by elevated(), may outlive the batch
+    if batch is None or batch.closed:
+        getattr(proxy, cast)(context, msg, **kwargs)
+    else:
+        batch.add(proxy, cast, context, msg, merge, kwargs)
+
+
+def batched_cast(proxy, context, msg, merge=None, **kwargs):
+    """Cast msg through proxy, as part of the batch of context if any.
+
+    :param merge: name of the list argument of msg that can be merged
+                  with the one of other notifications of the batch. The
+                  items are lists of ids or of dicts with an id.
+    """
+    _batched(proxy, 'cast', context, msg, merge, kwargs)
+
+
+def batched_fanout_cast(proxy, context, msg, merge=None, **kwargs):
+    """Fanout cast msg through proxy, see batched_cast()."""
+    _batched(proxy, 'fanout_cast', context, msg, merge, kwargs)
+
+
+class NotificationsBatchMixin(object):
+    """A mix-in handling the notifications_batch messages of agents."""
+
+    def notifications_batch(self, context, notifications):
+        for notification in notifications:
+            try:
+                getattr(self, notification['method'])(
+                    context, **notification['args'])
+            except Exception:
+                LOG.exception(_("Failed to handle the batched notification "
+                                "%s"), notification['method'])
@@ -20,6 +20,7 @@ import random
 
 import netaddr
 from oslo.config import cfg
+import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
@@ -27,12 +28,14 @@ from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import exceptions as q_exc
 from quantum.db import api as db
+from quantum.db import ipam_db
 from quantum.db import models_v2
 from quantum.db import sqlalchemyutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import timeutils
 from quantum.openstack.common import uuidutils
 from quantum import quantum_plugin_base_v2
+from quantum import quota
 
 
 LOG = logging.getLogger(__name__)
@@ -64,12 +67,31 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    # The networks, subnets and ports of the plugin are the ones built from
+    # the models, the DHCP agent callbacks can read them from the database
+    # in one pass. Plugins adding to what the DHCP agents get through
+    # get_networks, get_subnets or get_ports turn it off.
+    networks_info_from_db = True
     # Plugins, mixin classes implementing extension will register
     # hooks into the dict below for "augmenting" the "core way" of
     # building a query for retrieving objects from a model class.
     # To this aim, the register_model_query_hook and unregister_query_hook
     # from this class should be invoked
     _model_query_hooks = {}
+    # Attributes which the _make_*_dict methods copy as they are from a
+    # column of the model. Lists restricted to such fields only select
+    # their columns, without loading objects.
+    _column_fields = {
+        models_v2.Network: ('_make_network_dict', frozenset(
+            ['id', 'name', 'tenant_id', 'admin_state_up', 'status',
+             'shared'])),
+        models_v2.Subnet: ('_make_subnet_dict', frozenset(
+            ['id', 'name', 'tenant_id', 'network_id', 'ip_version', 'cidr',
+             'gateway_ip', 'enable_dhcp', 'shared'])),
+        models_v2.Port: ('_make_port_dict', frozenset(
+            ['id', 'name', 'network_id', 'tenant_id', 'mac_address',
+             'admin_state_up', 'status', 'device_id', 'device_owner'])),
+    }
 
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
@@ -229,6 +251,35 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _get_projection(self, model, dict_func, fields):
+        """Return the columns to select for fields.
+
+        None is returned unless every field is a column dict_func copies
+        as it is, in which case objects have to be loaded.
+        """
+        if not fields or model not in self._column_fields:
+            return None
+        func_name, column_fields = self._column_fields[model]
+        # dict_func may be overridden by a plugin
+        if (getattr(dict_func, 'im_func', None) is not
+                getattr(QuantumDbPluginV2, func_name).im_func):
+            return None
+        if not column_fields.issuperset(fields):
+            return None
+        columns = []
+        for field in fields:
+            if field not in columns:
+                columns.append(field)
+        return columns
+
+    def _get_collection_items(self, query, model, dict_func, fields):
+        columns = self._get_projection(model, dict_func, fields)
+        if columns:
+            query = query.with_entities(*[getattr(model, column)
+                                          for column in columns])
+            return [dict(zip(columns, row)) for row in query]
+        return [dict_func(c, fields) for c in query.all()]
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
                         page_reverse=False):
@@ -237,7 +288,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query.all()]
+        items = self._get_collection_items(query, model, dict_func, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -246,18 +297,34 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         return self._get_collection_query(context, model, filters).count()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id, used_macs=None):
+        """Generate a MAC address unique on the network.
+
+        When the set of MAC addresses in use on the network is given as
+        used_macs, it is checked instead of the database, and the new
+        address is added to it.
+        """
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
-            if QuantumDbPluginV2._check_unique_mac(context, network_id,
-                                                   mac_address):
+            mac_address = QuantumDbPluginV2._random_mac()
+            if used_macs is not None:
+                unique = mac_address not in used_macs
+            else:
+                unique = QuantumDbPluginV2._check_unique_mac(
+                    context, network_id, mac_address)
+            if unique:
+                if used_macs is not None:
+                    used_macs.add(mac_address)
                 LOG.debug(_("Generated mac for network %(network_id)s "
                             "is %(mac_address)s"), locals())
                 return mac_address
@@ -335,76 +402,19 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             models_v2.IPAllocationPool).with_lockmode('update')
         allocation_pools = pool_qry.filter_by(subnet_id=subnet_id).all()
         # Find the allocation pool for the IP to recycle
-        pool_id = None
         for allocation_pool in allocation_pools:
             allocation_pool_range = netaddr.IPRange(
                 allocation_pool['first_ip'],
                 allocation_pool['last_ip'])
             if netaddr.IPAddress(ip_address) in allocation_pool_range:
-                pool_id = allocation_pool['id']
                 break
-        if not pool_id:
+        else:
             error_message = _("No allocation pool found for "
                               "ip address:%s") % ip_address
             raise q_exc.InvalidInput(error_message=error_message)
-        # Two requests will be done on the database. The first will be to
-        # search if an entry starts with ip_address + 1 (r1). The second
-        # will be to see if an entry ends with ip_address -1 (r2).
-        # If 1 of the above holds true then the specific entry will be
-        # modified. If both hold true then the two ranges will be merged.
-        # If there are no entries then a single entry will be added.
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).with_lockmode('update')
-        ip_first = str(netaddr.IPAddress(ip_address) + 1)
-        ip_last = str(netaddr.IPAddress(ip_address) - 1)
         LOG.debug(_("Recycle %s"), ip_address)
-        try:
-            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     first_ip=ip_first).one()
-            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        except exc.NoResultFound:
-            r1 = []
-        try:
-            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
-                                     last_ip=ip_last).one()
-            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        except exc.NoResultFound:
-            r2 = []
-
-        if r1 and r2:
-            # Merge the two ranges
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=r2['first_ip'],
-                last_ip=r1['last_ip'])
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
-                        "%(first_ip2)s-%(last_ip2)s"),
-                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
-                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
-            context.session.delete(r1)
-            context.session.delete(r2)
-        elif r1:
-            # Update the range with matched first IP
-            r1['first_ip'] = ip_address
-            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
-        elif r2:
-            # Update the range with matched last IP
-            r2['last_ip'] = ip_address
-            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
-        else:
-            # Create a new range
-            ip_range = models_v2.IPAvailabilityRange(
-                allocation_pool_id=pool_id,
-                first_ip=ip_address,
-                last_ip=ip_address)
-            context.session.add(ip_range)
-            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
-                      {'first_ip': ip_address, 'last_ip': ip_address})
+        ipam_db.get_ipam_driver().release_ip(context, allocation_pool,
+                                             ip_address)
         QuantumDbPluginV2._delete_ip_allocation(context, network_id, subnet_id,
                                                 ip_address)
 
@@ -450,66 +460,34 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         The IP address will be generated from one of the subnets defined on
         the network.
         """
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
+        return QuantumDbPluginV2._generate_ips(context, subnets, 1)[0]
+
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses in a single pass.
+
+        Addresses are taken from the first subnets, in order, which still
+        have free addresses.
+        """
+        ips = []
+        driver = ipam_db.get_ipam_driver()
         for subnet in subnets:
-            range = range_qry.filter_by(subnet_id=subnet['id']).first()
-            if not range:
-                LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
-                            "allocated"),
-                          {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
-                continue
-            ip_address = range['first_ip']
-            LOG.debug(_("Allocated IP - %(ip_address)s from %(first_ip)s "
-                        "to %(last_ip)s"),
-                      {'ip_address': ip_address,
-                       'first_ip': range['first_ip'],
-                       'last_ip': range['last_ip']})
-            if range['first_ip'] == range['last_ip']:
-                # No more free indices on subnet => delete
-                LOG.debug(_("No more free IP's in slice. Deleting allocation "
-                            "pool."))
-                context.session.delete(range)
-            else:
-                # increment the first free
-                range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-            return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+            for ip_address in driver.allocate_ips(context, subnet['id'],
+                                                  count - len(ips)):
+                ips.append({'ip_address': ip_address,
+                            'subnet_id': subnet['id']})
+            if len(ips) == count:
+                return ips
+            LOG.debug(_("All IP's from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
         raise q_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
-        ip = int(netaddr.IPAddress(ip_address))
-        range_qry = context.session.query(
-            models_v2.IPAvailabilityRange,
-            models_v2.IPAllocationPool).join(
-                models_v2.IPAllocationPool).with_lockmode('update')
-        results = range_qry.filter_by(subnet_id=subnet_id).all()
-        for (range, pool) in results:
-            first = int(netaddr.IPAddress(range['first_ip']))
-            last = int(netaddr.IPAddress(range['last_ip']))
-            if first <= ip <= last:
-                if first == last:
-                    context.session.delete(range)
-                    return
-                elif first == ip:
-                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
-                    return
-                elif last == ip:
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    return
-                else:
-                    # Split into two ranges
-                    new_first = str(netaddr.IPAddress(ip_address) + 1)
-                    new_last = range['last_ip']
-                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
-                    ip_range = models_v2.IPAvailabilityRange(
-                        allocation_pool_id=pool['id'],
-                        first_ip=new_first,
-                        last_ip=new_last)
-                    context.session.add(ip_range)
-                    return
+        ipam_db.get_ipam_driver().allocate_specific_ip(context, subnet_id,
+                                                       ip_address)
 
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
@@ -963,6 +941,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                     'status': constants.NET_STATUS_ACTIVE}
             network = models_v2.Network(**args)
             context.session.add(network)
+            quota.QUOTAS.update_usage(context, tenant_id, 'network', 1)
         return self._make_network_dict(network)
 
     def update_network(self, context, id, network):
@@ -998,9 +977,19 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 self._delete_port(context, port['id'])
 
             # clean up subnets
-            subnets_qry = context.session.query(models_v2.Subnet)
-            subnets_qry.filter_by(network_id=id).delete()
+            subnets_qry = context.session.query(
+                models_v2.Subnet).filter_by(network_id=id)
+            subnet_counts = subnets_qry.with_entities(
+                models_v2.Subnet.tenant_id,
+                sa.func.count(models_v2.Subnet.id)).group_by(
+                    models_v2.Subnet.tenant_id)
+            for tenant_id, count in subnet_counts:
+                quota.QUOTAS.update_usage(context, tenant_id, 'subnet',
+                                          -count)
+            subnets_qry.delete()
             context.session.delete(network)
+            quota.QUOTAS.update_usage(context, network.tenant_id, 'network',
+                                      -1)
 
     def get_network(self, context, id, fields=None):
         network = self._get_network(context, id)
@@ -1125,6 +1114,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             subnet = models_v2.Subnet(**args)
 
             context.session.add(subnet)
+            quota.QUOTAS.update_usage(context, tenant_id, 'subnet', 1)
             if s['dns_nameservers'] is not attributes.ATTR_NOT_SPECIFIED:
                 for addr in s['dns_nameservers']:
                     ns = models_v2.DNSNameServer(address=addr,
@@ -1144,11 +1134,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                                      first_ip=pool['start'],
                                                      last_ip=pool['end'])
                 context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+                ipam_db.get_ipam_driver().create_pool(context, ip_pool)
 
         return self._make_subnet_dict(subnet)
 
@@ -1236,6 +1222,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                 context.session.delete(allocation)
 
             context.session.delete(subnet)
+            quota.QUOTAS.update_usage(context, subnet.tenant_id, 'subnet',
+                                      -1)
 
     def get_subnet(self, context, id, fields=None):
         subnet = self._get_subnet(context, id)
@@ -1258,7 +1246,131 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                           filters=filters)
 
     def create_port_bulk(self, context, ports):
-        return self._create_bulk('port', context, ports)
+        # Plugins extending create_port need it to run for every port,
+        # unless they extend create_port_bulk too
+        if (getattr(self.create_port, 'im_func', None) is not
+                QuantumDbPluginV2.create_port.im_func):
+            return self._create_bulk('port', context, ports)
+        items = ports['ports']
+        try:
+            return self._create_ports_in_bulk(context, items)
+        except Exception:
+            LOG.exception(_("An exception occured while creating "
+                            "the ports:%s"), items)
+            raise
+
+    def _create_ports_in_bulk(self, context, items):
+        """Create ports in a single pass per network.
+
+        The MAC addresses in use on a network are read once and new ones are
+        generated against that set, addresses are handed out by one call to
+        the IPAM driver per IP version, and ports and IP allocations are
+        written with one insert statement each.
+
+        Plugins extending create_port call this from their own
+        create_port_bulk, within their transaction, and then run their per
+        port processing on the returned port dicts.
+        """
+        port_rows = []
+        allocation_rows = []
+        expiration = self._default_allocation_expiration()
+        # Ports are returned in the order they were requested in
+        results = [None] * len(items)
+        by_network = {}
+        for index, item in enumerate(items):
+            p = item['port']
+            by_network.setdefault(p['network_id'], []).append((index, item))
+
+        with context.session.begin(subtransactions=True):
+            for network_id, net_items in by_network.iteritems():
+                self._recycle_expired_ip_allocations(context, network_id)
+                network = self._get_network(context, network_id)
+                mac_qry = context.session.query(models_v2.Port.mac_address)
+                used_macs = set(row.mac_address for row in
+                                mac_qry.filter_by(network_id=network_id))
+
+                rows = []
+                auto_ips = []
+                requested_ips = set()
+                for index, item in net_items:
+                    p = item['port']
+                    mac_address = p['mac_address']
+                    if mac_address is attributes.ATTR_NOT_SPECIFIED:
+                        mac_address = self._generate_mac(context, network_id,
+                                                         used_macs)
+                    elif mac_address in used_macs:
+                        raise q_exc.MacAddressInUse(net_id=network_id,
+                                                    mac=mac_address)
+                    else:
+                        used_macs.add(mac_address)
+                    row = {'id': p.get('id') or uuidutils.generate_uuid(),
+                           'tenant_id': self._get_tenant_id_for_create(
+                               context, p),
+                           'name': p['name'],
+                           'network_id': network_id,
+                           'mac_address': mac_address,
+                           'admin_state_up': p['admin_state_up'],
+                           'status': p.get('status',
+                                           constants.PORT_STATUS_ACTIVE),
+                           'device_id': p['device_id'],
+                           'device_owner': p['device_owner'],
+                           'fixed_ips': []}
+                    rows.append(row)
+                    results[index] = row
+                    if p['fixed_ips'] is attributes.ATTR_NOT_SPECIFIED:
+                        auto_ips.append(row)
+                        continue
+                    row['fixed_ips'] = self._allocate_ips_for_port(
+                        context, network, item)
+                    # Allocations of the previous ports are not in the
+                    # database yet
+                    for ip in row['fixed_ips']:
+                        key = (ip['subnet_id'], ip['ip_address'])
+                        if key in requested_ips:
+                            raise q_exc.IpAddressInUse(
+                                net_id=network_id,
+                                ip_address=ip['ip_address'])
+                        requested_ips.add(key)
+
+                if auto_ips:
+                    subnets = self.get_subnets(
+                        context, filters={'network_id': [network_id]})
+                    for version in (4, 6):
+                        version_subnets = [subnet for subnet in subnets
+                                           if subnet['ip_version'] == version]
+                        if not version_subnets:
+                            continue
+                        ips = self._generate_ips(context, version_subnets,
+                                                 len(auto_ips))
+                        for row, ip in zip(auto_ips, ips):
+                            row['fixed_ips'].append(ip)
+
+                for row in rows:
+                    for ip in row['fixed_ips']:
+                        allocation_rows.append(
+                            {'network_id': network_id,
+                             'port_id': row['id'],
+                             'ip_address': ip['ip_address'],
+                             'subnet_id': ip['subnet_id'],
+                             'expiration': expiration})
+                port_rows.extend(dict((k, v) for k, v in row.iteritems()
+                                      if k != 'fixed_ips') for row in rows)
+
+            # Pending changes, such as IPAM updates, go first
+            context.session.flush()
+            context.session.execute(models_v2.Port.__table__.insert(),
+                                    port_rows)
+            port_counts = {}
+            for row in port_rows:
+                port_counts[row['tenant_id']] = (
+                    port_counts.get(row['tenant_id'], 0) + 1)
+            for tenant_id, count in port_counts.iteritems():
+                quota.QUOTAS.update_usage(context, tenant_id, 'port', count)
+            if allocation_rows:
+                context.session.execute(
+                    models_v2.IPAllocation.__table__.insert(),
+                    allocation_rows)
+        return results
 
     def create_port(self, context, port):
         p = port['port']
@@ -1304,6 +1416,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                   device_id=p['device_id'],
                                   device_owner=p['device_owner'])
             context.session.add(port)
+            quota.QUOTAS.update_usage(context, tenant_id, 'port', 1)
 
             # Update the allocated IP's
             if ips:
@@ -1390,6 +1503,7 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                     LOG.debug(msg)
 
         context.session.delete(port)
+        quota.QUOTAS.update_usage(context, port.tenant_id, 'port', -1)
 
     def get_port(self, context, id, fields=None):
         port = self._get_port(context, id)
@@ -1430,7 +1544,8 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query.all()]
+        items = self._get_collection_items(query, models_v2.Port,
+                                           self._make_port_dict, fields)
         if limit and page_reverse:
             items.reverse()
         return items
@@ -14,11 +14,13 @@
 # limitations under the License.
 
 from oslo.config import cfg
+from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
 from quantum.api.v2 import attributes
 from quantum.common import constants
 from quantum.common import utils
+from quantum.db import models_v2
 from quantum import manager
 from quantum.openstack.common import log as logging
 
@@ -60,6 +62,86 @@ class DhcpRpcCallbackMixin(object):
         network['ports'] = plugin.get_ports(context, filters=filters)
         return network
 
+    def get_networks_info(self, context, **kwargs):
+        """Retrieve and return extended information about several networks.
+
+        Networks unknown to the plugin are left out of the result.
+        """
+        network_ids = kwargs.get('network_ids') or []
+        host = kwargs.get('host')
+        LOG.debug(_('Networks %(network_ids)s requested from '
+                    '%(host)s'), {'network_ids': network_ids,
+                                  'host': host})
+        plugin = manager.QuantumManager.get_plugin()
+        if not network_ids:
+            return []
+        if getattr(plugin, 'networks_info_from_db', False):
+            return self._get_networks_info_from_db(context, plugin,
+                                                   network_ids)
+        networks = plugin.get_networks(context,
+                                       filters=dict(id=network_ids))
+        for network in networks:
+            filters = dict(network_id=[network['id']])
+            network['subnets'] = plugin.get_subnets(context, filters=filters)
+            network['ports'] = plugin.get_ports(context, filters=filters)
+        return networks
+
+    def _get_networks_info_from_db(self, context, plugin, network_ids):
+        # A handful of queries whatever the number of networks and ports:
+        # allocation pools and fixed IPs are dynamic relationships which
+        # would otherwise be queried once per subnet and once per port.
+        Subnet = models_v2.Subnet
+        Port = models_v2.Port
+        IPAllocation = models_v2.IPAllocation
+        IPAllocationPool = models_v2.IPAllocationPool
+
+        networks = plugin._model_query(context, models_v2.Network).filter(
+            models_v2.Network.id.in_(network_ids)).all()
+        subnets = plugin._model_query(context, Subnet).options(
+            orm.joinedload(Subnet.dns_nameservers),
+            orm.joinedload(Subnet.routes)).filter(
+                Subnet.network_id.in_(network_ids)).all()
+        ports = plugin._model_query(context, Port).filter(
+            Port.network_id.in_(network_ids)).all()
+
+        pools = {}
+        if subnets:
+            query = context.session.query(IPAllocationPool).filter(
+                IPAllocationPool.subnet_id.in_([s['id'] for s in subnets]))
+            for pool in query:
+                pools.setdefault(pool['subnet_id'], []).append(pool)
+        fixed_ips = {}
+        query = context.session.query(IPAllocation).filter(
+            IPAllocation.network_id.in_(network_ids))
+        for allocation in query:
+            fixed_ips.setdefault(allocation['port_id'], []).append(allocation)
+
+        subnet_dicts = {}
+        for subnet in subnets:
+            subnet_data = dict(subnet)
+            subnet_data.update(
+                allocation_pools=pools.get(subnet['id'], []),
+                dns_nameservers=subnet['dns_nameservers'],
+                routes=subnet['routes'])
+            subnet_dicts.setdefault(subnet['network_id'], []).append(
+                plugin._make_subnet_dict(subnet_data))
+        port_dicts = {}
+        for port in ports:
+            port_data = dict(port)
+            port_data['fixed_ips'] = fixed_ips.get(port['id'], [])
+            port_dicts.setdefault(port['network_id'], []).append(
+                plugin._make_port_dict(port_data))
+
+        result = []
+        for network in networks:
+            network_data = dict(network)
+            network_data['subnets'] = subnet_dicts.get(network['id'], [])
+            network_dict = plugin._make_network_dict(network_data)
+            network_dict['subnets'] = network_data['subnets']
+            network_dict['ports'] = port_dicts.get(network['id'], [])
+            result.append(network_dict)
+        return result
+
     def get_dhcp_port(self, context, **kwargs):
         """Allocate a DHCP port for the host and return port information.
 
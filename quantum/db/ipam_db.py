@@ -0,0 +1,343 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import binascii
+
+import netaddr
+from oslo.config import cfg
+import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import orm
+from sqlalchemy.orm import exc
+
+from quantum.db import model_base
+from quantum.db import models_v2
+from quantum.openstack.common import importutils
+from quantum.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_drivers = {}
+
+
+def get_ipam_driver():
+    """Return an instance of the driver set with the ipam_driver option."""
+    driver_class = cfg.CONF.ipam_driver
+    if driver_class not in _drivers:
+        _drivers[driver_class] = importutils.import_object(driver_class)
+    return _drivers[driver_class]
+
+
+class IpamDriverBase(object):
+    """Keep track of the free addresses of subnet allocation pools.
+
+    The plugin records the allocated addresses themselves as IPAllocation
+    rows; drivers only maintain the free address index and run within the
+    transaction of the plugin operation.
+    """
+
+    def create_pool(self, context, pool):
+        """Mark every address of a new IPAllocationPool as free."""
+        raise NotImplementedError()
+
+    def allocate_ips(self, context, subnet_id, count):
+        """Take up to count free addresses of the subnet.
+
+        Fewer addresses are returned when the subnet runs out of them.
+        """
+        raise NotImplementedError()
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        """Take ip_address if it belongs to an allocation pool."""
+        raise NotImplementedError()
+
+    def release_ip(self, context, pool, ip_address):
+        """Give ip_address back to the IPAllocationPool it belongs to."""
+        raise NotImplementedError()
+
+
+class RangeIpamDriver(IpamDriverBase):
+    """Free addresses are stored as IPAvailabilityRange rows.
+
+    This is the historical behavior: ranges are split when a specific
+    address is taken and merged back when addresses are recycled.
+    """
+
+    def create_pool(self, context, pool):
+        ip_range = models_v2.IPAvailabilityRange(ipallocationpool=pool,
+                                                 first_ip=pool['first_ip'],
+                                                 last_ip=pool['last_ip'])
+        context.session.add(ip_range)
+
+    def allocate_ips(self, context, subnet_id, count):
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        # Every range holds at least one address
+        ranges = range_qry.filter_by(subnet_id=subnet_id).limit(count).all()
+        ips = []
+        for ip_range in ranges:
+            first = netaddr.IPAddress(ip_range['first_ip'])
+            last = netaddr.IPAddress(ip_range['last_ip'])
+            taken = min(count - len(ips), int(last) - int(first) + 1)
+            ips.extend(str(first + i) for i in xrange(taken))
+            LOG.debug(_("Allocated IPs %(first)s to %(last)s from "
+                        "%(first_ip)s to %(last_ip)s"),
+                      {'first': ips[-taken], 'last': ips[-1],
+                       'first_ip': ip_range['first_ip'],
+                       'last_ip': ip_range['last_ip']})
+            if first + taken > last:
+                # No more free indices on subnet => delete
+                LOG.debug(_("No more free IP's in slice. Deleting allocation "
+                            "pool."))
+                context.session.delete(ip_range)
+            else:
+                # increment the first free
+                ip_range['first_ip'] = str(first + taken)
+            if len(ips) == count:
+                break
+        return ips
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange,
+            models_v2.IPAllocationPool).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        results = range_qry.filter_by(subnet_id=subnet_id).all()
+        for (range, pool) in results:
+            first = int(netaddr.IPAddress(range['first_ip']))
+            last = int(netaddr.IPAddress(range['last_ip']))
+            if first <= ip <= last:
+                if first == last:
+                    context.session.delete(range)
+                    return
+                elif first == ip:
+                    range['first_ip'] = str(netaddr.IPAddress(ip_address) + 1)
+                    return
+                elif last == ip:
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    return
+                else:
+                    # Split into two ranges
+                    new_first = str(netaddr.IPAddress(ip_address) + 1)
+                    new_last = range['last_ip']
+                    range['last_ip'] = str(netaddr.IPAddress(ip_address) - 1)
+                    ip_range = models_v2.IPAvailabilityRange(
+                        allocation_pool_id=pool['id'],
+                        first_ip=new_first,
+                        last_ip=new_last)
+                    context.session.add(ip_range)
+                    return
+
+    def release_ip(self, context, pool, ip_address):
+        # Two requests will be done on the database. The first will be to
+        # search if an entry starts with ip_address + 1 (r1). The second
+        # will be to see if an entry ends with ip_address -1 (r2).
+        # If 1 of the above holds true then the specific entry will be
+        # modified. If both hold true then the two ranges will be merged.
+        # If there are no entries then a single entry will be added.
+        pool_id = pool['id']
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).with_lockmode('update')
+        ip_first = str(netaddr.IPAddress(ip_address) + 1)
+        ip_last = str(netaddr.IPAddress(ip_address) - 1)
+        try:
+            r1 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     first_ip=ip_first).one()
+            LOG.debug(_("Recycle: first match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        except exc.NoResultFound:
+            r1 = []
+        try:
+            r2 = range_qry.filter_by(allocation_pool_id=pool_id,
+                                     last_ip=ip_last).one()
+            LOG.debug(_("Recycle: last match for %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        except exc.NoResultFound:
+            r2 = []
+
+        if r1 and r2:
+            # Merge the two ranges
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=r2['first_ip'],
+                last_ip=r1['last_ip'])
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: merged %(first_ip1)s-%(last_ip1)s and "
+                        "%(first_ip2)s-%(last_ip2)s"),
+                      {'first_ip1': r2['first_ip'], 'last_ip1': r2['last_ip'],
+                       'first_ip2': r1['first_ip'], 'last_ip2': r1['last_ip']})
+            context.session.delete(r1)
+            context.session.delete(r2)
+        elif r1:
+            # Update the range with matched first IP
+            r1['first_ip'] = ip_address
+            LOG.debug(_("Recycle: updated first %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r1['first_ip'], 'last_ip': r1['last_ip']})
+        elif r2:
+            # Update the range with matched last IP
+            r2['last_ip'] = ip_address
+            LOG.debug(_("Recycle: updated last %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': r2['first_ip'], 'last_ip': r2['last_ip']})
+        else:
+            # Create a new range
+            ip_range = models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool_id,
+                first_ip=ip_address,
+                last_ip=ip_address)
+            context.session.add(ip_range)
+            LOG.debug(_("Recycle: created new %(first_ip)s-%(last_ip)s"),
+                      {'first_ip': ip_address, 'last_ip': ip_address})
+
+
+class IPAvailabilityBitmap(model_base.BASEV2):
+    """Addresses in use in an allocation pool.
+
+    Bit i, counting from the least significant one, is set when the i-th
+    address of the pool is in use. Only the bytes up to the highest bit set
+    are stored, so sparsely used IPv6 pools stay small.
+    """
+    allocation_pool_id = sa.Column(sa.String(36),
+                                   sa.ForeignKey('ipallocationpools.id',
+                                                 ondelete="CASCADE"),
+                                   primary_key=True)
+    bitmap = sa.Column(sa.LargeBinary, nullable=False)
+    ipallocationpool = orm.relationship(
+        models_v2.IPAllocationPool,
+        backref=orm.backref('availability_bitmap', uselist=False,
+                            cascade='delete'))
+
+
+def _decode_bitmap(data):
+    return long(binascii.hexlify(data) or '0', 16)
+
+
+def _encode_bitmap(bits):
+    hex_bits = bits and '%x' % bits or ''
+    return binascii.unhexlify('0' * (len(hex_bits) % 2) + hex_bits)
+
+
+def _lowest_free(bits):
+    """Return the index of the lowest bit not set."""
+    return ((bits + 1) & ~bits).bit_length() - 1
+
+
+class BitmapIpamDriver(IpamDriverBase):
+    """Free addresses are stored as one bitmap per allocation pool.
+
+    Allocating or releasing addresses locks and rewrites a single row per
+    pool, whatever the fragmentation of the pool, and a batch of addresses
+    is taken in one pass over the bitmap.
+
+    Pools created with the range driver get their bitmap built from the
+    allocation table on first use, and their ranges are removed. Going back
+    to the range driver is not supported.
+    """
+
+    def create_pool(self, context, pool):
+        context.session.add(IPAvailabilityBitmap(ipallocationpool=pool,
+                                                 bitmap=''))
+
+    def _lock_bitmap(self, context, pool_id):
+        try:
+            return context.session.query(IPAvailabilityBitmap).filter_by(
+                allocation_pool_id=pool_id).with_lockmode('update').one()
+        except exc.NoResultFound:
+            return None
+
+    def _get_bitmap(self, context, pool):
+        bitmap = self._lock_bitmap(context, pool['id'])
+        if bitmap:
+            return bitmap
+        # There is no bitmap row to lock yet, concurrent allocations on
+        # the pool serialize on the pool row and the first one builds it
+        context.session.query(models_v2.IPAllocationPool).filter_by(
+            id=pool['id']).with_lockmode('update').one()
+        bitmap = self._lock_bitmap(context, pool['id'])
+        if bitmap:
+            return bitmap
+        LOG.debug(_("Building IP availability bitmap of pool %s"), pool['id'])
+        first = int(netaddr.IPAddress(pool['first_ip']))
+        last = int(netaddr.IPAddress(pool['last_ip']))
+        bits = 0
+        alloc_qry = context.session.query(models_v2.IPAllocation.ip_address)
+        for (ip_address,) in alloc_qry.filter_by(subnet_id=pool['subnet_id']):
+            ip = int(netaddr.IPAddress(ip_address))
+            if first <= ip <= last:
+                bits |= 1 << (ip - first)
+        context.session.query(models_v2.IPAvailabilityRange).filter_by(
+            allocation_pool_id=pool['id']).delete()
+        bitmap = IPAvailabilityBitmap(allocation_pool_id=pool['id'],
+                                      bitmap=_encode_bitmap(bits))
+        if context.session.bind.dialect.name == 'sqlite':
+            # pysqlite cannot do savepoints. sqlite locks the whole database
+            # for writing, a concurrent build fails before inserting.
+            context.session.add(bitmap)
+            return bitmap
+        try:
+            with context.session.begin_nested():
+                context.session.add(bitmap)
+        except sa_exc.IntegrityError:
+            # Built concurrently on a database which did not lock the pool
+            # row; only the insert was rolled back
+            LOG.debug(_("IP availability bitmap of pool %s built "
+                        "concurrently"), pool['id'])
+            return self._lock_bitmap(context, pool['id'])
+        return bitmap
+
+    def _get_pools(self, context, subnet_id):
+        pool_qry = context.session.query(models_v2.IPAllocationPool)
+        return pool_qry.filter_by(subnet_id=subnet_id).all()
+
+    def allocate_ips(self, context, subnet_id, count):
+        ips = []
+        for pool in self._get_pools(context, subnet_id):
+            bitmap = self._get_bitmap(context, pool)
+            bits = _decode_bitmap(bitmap.bitmap)
+            first = netaddr.IPAddress(pool['first_ip'])
+            size = int(netaddr.IPAddress(pool['last_ip'])) - int(first) + 1
+            while len(ips) < count:
+                index = _lowest_free(bits)
+                if index >= size:
+                    break
+                bits |= 1 << index
+                ips.append(str(first + index))
+            bitmap.bitmap = _encode_bitmap(bits)
+            if len(ips) == count:
+                break
+        return ips
+
+    def allocate_specific_ip(self, context, subnet_id, ip_address):
+        ip = int(netaddr.IPAddress(ip_address))
+        for pool in self._get_pools(context, subnet_id):
+            first = int(netaddr.IPAddress(pool['first_ip']))
+            last = int(netaddr.IPAddress(pool['last_ip']))
+            if first <= ip <= last:
+                bitmap = self._get_bitmap(context, pool)
+                bitmap.bitmap = _encode_bitmap(
+                    _decode_bitmap(bitmap.bitmap) | 1 << (ip - first))
+                return
+
+    def release_ip(self, context, pool, ip_address):
+        index = (int(netaddr.IPAddress(ip_address)) -
+                 int(netaddr.IPAddress(pool['first_ip'])))
+        bitmap = self._get_bitmap(context, pool)
+        bitmap.bitmap = _encode_bitmap(
+            _decode_bitmap(bitmap.bitmap) & ~(1 << index))
+        LOG.debug(_("Recycle: released %s"), ip_address)
@@ -35,6 +35,7 @@ from quantum.openstack.common import log as logging
 from quantum.openstack.common.notifier import api as notifier_api
 from quantum.openstack.common import uuidutils
 from quantum import policy
+from quantum import quota
 
 
 LOG = logging.getLogger(__name__)
@@ -154,6 +155,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                                admin_state_up=r['admin_state_up'],
                                status="ACTIVE")
             context.session.add(router_db)
+            quota.QUOTAS.update_usage(context, tenant_id, 'router', 1)
             if has_gw_info:
                 self._update_router_gw_info(context, router_db['id'], gw_info)
         return self._make_router_dict(router_db)
@@ -263,6 +265,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 self._delete_port(context.elevated(), ports[0]['id'])
 
             context.session.delete(router)
+            quota.QUOTAS.update_usage(context, router.tenant_id, 'router', -1)
         l3_rpc_agent_api.L3AgentNotify.router_deleted(context, id)
 
     def get_router(self, context, id, fields=None):
@@ -665,6 +668,7 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
                 self._update_fip_assoc(context, fip,
                                        floatingip_db, external_port)
                 context.session.add(floatingip_db)
+                quota.QUOTAS.update_usage(context, tenant_id, 'floatingip', 1)
         # TODO(salvatore-orlando): Avoid broad catch
         # Maybe by introducing base class for L3 exceptions
         except q_exc.BadRequest:
@@ -709,6 +713,8 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
         router_id = floatingip['router_id']
         with context.session.begin(subtransactions=True):
             context.session.delete(floatingip)
+            quota.QUOTAS.update_usage(context, floatingip.tenant_id,
+                                      'floatingip', -1)
             self.delete_port(context.elevated(),
                              floatingip['floating_port_id'],
                              l3_port_check=False)
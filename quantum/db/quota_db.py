@@ -15,11 +15,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
 
 from quantum.common import exceptions
 from quantum.db import model_base
 from quantum.db import models_v2
+from quantum.openstack.common import log as logging
+from quantum.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -33,6 +39,19 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2, models_v2.HasId):
+    """Represent the number of objects of a resource owned by a tenant.
+
+    in_use is updated in the transactions creating and deleting the
+    objects, synced_at is the last time it was counted from the objects.
+    """
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255))
+    in_use = sa.Column(sa.Integer, nullable=False)
+    synced_at = sa.Column(sa.DateTime, nullable=False)
+    __table_args__ = (sa.UniqueConstraint(tenant_id, resource),)
+
+
 class DbQuotaDriver(object):
     """
     Driver to perform necessary checks to enforce quotas and obtain
@@ -40,6 +59,10 @@ class DbQuotaDriver(object):
     database.
     """
 
+    # Resources whose create and delete operations call update_usage()
+    tracked_resources = frozenset(['network', 'subnet', 'port',
+                                   'router', 'floatingip'])
+
     @staticmethod
     def get_tenant_quotas(context, resources, tenant_id):
         """
@@ -119,6 +142,69 @@ class DbQuotaDriver(object):
                                      limit=limit)
                 context.session.add(tenant_quota)
 
+    def get_usage(self, context, tenant_id, resource, count):
+        """Return the number of objects of a resource owned by a tenant.
+
+        The usage of tracked resources is read from their counter. count,
+        which counts the objects themselves, sets the counter the first
+        time and then every quota_usage_sync_interval seconds, so that
+        objects created or deleted without going through update_usage()
+        are eventually accounted for.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The ID of the tenant owning the objects.
+        :param resource: The name of the resource.
+        :param count: A callable returning the number of objects.
+        """
+        if resource not in self.tracked_resources:
+            return count()
+
+        query = context.session.query(QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource)
+        # Only the columns are read, a QuotaUsage object from the session
+        # would miss the updates done by update_usage()
+        usage = query.with_entities(QuotaUsage.in_use,
+                                    QuotaUsage.synced_at).first()
+        interval = cfg.CONF.QUOTAS.quota_usage_sync_interval
+        if usage and (interval <= 0 or
+                      not timeutils.is_older_than(usage.synced_at, interval)):
+            return usage.in_use
+
+        in_use = count()
+        try:
+            with context.session.begin(subtransactions=True):
+                if usage:
+                    query.update({'in_use': in_use,
+                                  'synced_at': timeutils.utcnow()},
+                                 synchronize_session=False)
+                else:
+                    context.session.add(
+                        QuotaUsage(tenant_id=tenant_id, resource=resource,
+                                   in_use=in_use,
+                                   synced_at=timeutils.utcnow()))
+        except sa_exc.IntegrityError:
+            # Created by a concurrent request, from a count as recent as
+            # this one
+            LOG.debug(_("Usage of %(resource)s by tenant %(tenant_id)s "
+                        "counted concurrently"),
+                      {'resource': resource, 'tenant_id': tenant_id})
+        return in_use
+
+    @classmethod
+    def update_usage(cls, context, tenant_id, resource, delta):
+        """Add delta to the usage counter of a resource.
+
+        The counter is updated with a single UPDATE statement, in the
+        transaction of the caller. Counters which do not exist yet are left
+        alone, get_usage() counts the objects when it creates them.
+        """
+        if resource not in cls.tracked_resources:
+            return
+        query = context.session.query(QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource)
+        query.update({'in_use': QuotaUsage.in_use + delta},
+                     synchronize_session=False)
+
     def _get_quotas(self, context, tenant_id, resources, keys):
         """
         A helper method which retrieves the quotas for the specific
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import functools
 import itertools
 import socket
@@ -90,6 +91,10 @@ kombu_opts = [
                 help='use H/A queues in RabbitMQ (x-ha-policy: all).'
                      'You need to wipe RabbitMQ database when '
                      'changing this option.'),
+    cfg.IntOpt('rabbit_publisher_cache_size',
+               default=64,
+               help='number of publishers, and so of exchange declarations, '
+                    'each connection keeps for reuse'),
 
 ]
 
@@ -396,6 +401,9 @@ class Connection(object):
 
     def __init__(self, conf, server_params=None):
         self.consumers = []
+        # (publisher class, topic, options) -> Publisher, least recently
+        # used first. Publishers are bound to the current channel.
+        self.publishers = collections.OrderedDict()
         self.consumer_thread = None
         self.proxy_callbacks = []
         self.conf = conf
@@ -494,6 +502,7 @@ class Connection(object):
         self.consumer_num = itertools.count(1)
         self.connection.connect()
         self.channel = self.connection.channel()
+        self.publishers.clear()
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
@@ -592,8 +601,13 @@ class Connection(object):
         """Reset a connection so it can be used again"""
         self.cancel_consumer_thread()
         self.wait_on_proxy_callbacks()
+        if not self.consumers:
+            # Only published on, the channel and its publishers are kept
+            # for the next user of the connection
+            return
         self.channel.close()
         self.channel = self.connection.channel()
+        self.publishers.clear()
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
@@ -671,8 +685,20 @@ class Connection(object):
                           "'%(topic)s': %(err_str)s") % log_info)
 
         def _publish():
-            publisher = cls(self.conf, self.channel, topic, **kwargs)
+            if cls is DirectPublisher:
+                # Replies are published to the msg_id of each call, such
+                # publishers would not be used again
+                publisher = cls(self.conf, self.channel, topic, **kwargs)
+                publisher.send(msg, timeout)
+                return
+            key = (cls, topic, frozenset(kwargs.items()))
+            publisher = self.publishers.pop(key, None)
+            if publisher is None:
+                publisher = cls(self.conf, self.channel, topic, **kwargs)
             publisher.send(msg, timeout)
+            self.publishers[key] = publisher
+            if len(self.publishers) > self.conf.rabbit_publisher_cache_size:
+                self.publishers.popitem(last=False)
 
         self.ensure(_error_callback, _publish)
 
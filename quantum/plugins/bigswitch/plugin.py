@@ -49,7 +49,9 @@ import copy
 import httplib
 import json
 import socket
+import time
 
+from eventlet import semaphore
 from oslo.config import cfg
 
 from quantum.api.rpc.agentnotifiers import dhcp_rpc_agent_api
@@ -65,7 +67,6 @@ from quantum.db import dhcp_rpc_base
 from quantum.db import l3_db
 from quantum.extensions import l3
 from quantum.extensions import portbindings
-from quantum.openstack.common import lockutils
 from quantum.openstack.common import log as logging
 from quantum.openstack.common import rpc
 from quantum.plugins.bigswitch.version import version_string_with_vcs
@@ -88,6 +89,9 @@ restproxy_opts = [
     cfg.IntOpt('server_timeout', default=10,
                help=_("Maximum number of seconds to wait for proxy request "
                       "to connect and complete.")),
+    cfg.IntOpt('server_max_connections', default=8,
+               help=_("Maximum number of concurrent requests, and of "
+                      "persistent connections, to each server.")),
     cfg.StrOpt('quantum_id', default='Quantum-' + utils.get_hostname(),
                help=_("User defined identifier for this Quantum deployment")),
     cfg.BoolOpt('add_meta_server_route', default=True,
@@ -112,6 +116,8 @@ ROUTER_INTF_PATH = "/tenants/%s/routers/%s/interfaces/%s"
 SUCCESS_CODES = range(200, 207)
 FAILURE_CODES = [0, 301, 302, 303, 400, 401, 403, 404, 500, 501, 502, 503,
                  504, 505]
+# Methods whose requests can be sent twice without harm
+IDEMPOTENT_METHODS = ('GET', 'DELETE')
 SYNTAX_ERROR_MESSAGE = 'Syntax error in server config file, aborting plugin'
 BASE_URI = '/networkService/v1.1'
 ORCHESTRATION_SERVICE_ID = 'Quantum v2.0'
@@ -128,10 +134,15 @@ class RemoteRestError(exceptions.QuantumException):
 
 
 class ServerProxy(object):
-    """REST server proxy to a network controller."""
+    """REST server proxy to a network controller.
+
+    Requests are sent over persistent HTTP/1.1 connections, at most
+    max_connections of them at once. Connections are kept open between
+    requests unless the controller asked to close them.
+    """
 
     def __init__(self, server, port, ssl, auth, quantum_id, timeout,
-                 base_uri, name):
+                 base_uri, name, max_connections=8):
         self.server = server
         self.port = port
         self.ssl = ssl
@@ -143,8 +154,60 @@ class ServerProxy(object):
         self.quantum_id = quantum_id
         if auth:
             self.auth = 'Basic ' + base64.encodestring(auth).strip()
+        self.max_connections = max_connections
+        self._semaphore = semaphore.Semaphore(max_connections)
+        # Idle connections, the most recently used one last
+        self._idle_connections = []
+        self.metrics = {'requests': 0, 'failures': 0,
+                        'total_time': 0.0, 'max_time': 0.0}
+
+    def _new_connection(self):
+        if self.ssl:
+            return httplib.HTTPSConnection(
+                self.server, self.port, timeout=self.timeout)
+        return httplib.HTTPConnection(
+            self.server, self.port, timeout=self.timeout)
+
+    def _request(self, action, uri, body, headers):
+        if self._idle_connections:
+            conn, reused = self._idle_connections.pop(), True
+        else:
+            conn, reused = self._new_connection(), False
+        while True:
+            sent = False
+            try:
+                conn.request(action, uri, body, headers)
+                sent = True
+                response = conn.getresponse()
+                respstr = response.read()
+                break
+            except (socket.timeout, socket.error,
+                    httplib.HTTPException) as e:
+                conn.close()
+                if (reused and not isinstance(e, socket.timeout) and
+                        (not sent or action in IDEMPOTENT_METHODS)):
+                    # The controller closed the idle connection meanwhile,
+                    # the request is sent again on a new one. Once sent,
+                    # it may have been applied already.
+                    conn, reused = self._new_connection(), False
+                    continue
+                LOG.error(_('ServerProxy: %(action)s failure, %(e)r'),
+                          locals())
+                return 0, None, None, None
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle_connections.append(conn)
+
+        respdata = respstr
+        if response.status in self.success_codes:
+            try:
+                respdata = json.loads(respstr)
+            except ValueError:
+                # response was not JSON, ignore the exception
+                pass
+        return response.status, response.reason, respstr, respdata
 
-    @lockutils.synchronized('rest_call', 'bsn-', external=True)
     def rest_call(self, action, resource, data, headers):
         uri = self.base_uri + resource
         body = json.dumps(data)
@@ -165,62 +228,41 @@ class ServerProxy(object):
         LOG.debug(_("ServerProxy: resource=%(resource)s, data=%(data)r, "
                     "headers=%(headers)r"), locals())
 
-        conn = None
-        if self.ssl:
-            conn = httplib.HTTPSConnection(
-                self.server, self.port, timeout=self.timeout)
-            if conn is None:
-                LOG.error(_('ServerProxy: Could not establish HTTPS '
-                            'connection'))
-                return 0, None, None, None
-        else:
-            conn = httplib.HTTPConnection(
-                self.server, self.port, timeout=self.timeout)
-            if conn is None:
-                LOG.error(_('ServerProxy: Could not establish HTTP '
-                            'connection'))
-                return 0, None, None, None
-
-        try:
-            conn.request(action, uri, body, headers)
-            response = conn.getresponse()
-            respstr = response.read()
-            respdata = respstr
-            if response.status in self.success_codes:
-                try:
-                    respdata = json.loads(respstr)
-                except ValueError:
-                    # response was not JSON, ignore the exception
-                    pass
-            ret = (response.status, response.reason, respstr, respdata)
-        except (socket.timeout, socket.error) as e:
-            LOG.error(_('ServerProxy: %(action)s failure, %(e)r'), locals())
-            ret = 0, None, None, None
-        conn.close()
+        with self._semaphore:
+            start = time.time()
+            ret = self._request(action, uri, body, headers)
+            elapsed = time.time() - start
+        self.metrics['requests'] += 1
+        if ret[0] in FAILURE_CODES:
+            self.metrics['failures'] += 1
+        self.metrics['total_time'] += elapsed
+        self.metrics['max_time'] = max(self.metrics['max_time'], elapsed)
         LOG.debug(_("ServerProxy: status=%(status)d, reason=%(reason)r, "
-                    "ret=%(ret)s, data=%(data)r"), {'status': ret[0],
-                                                    'reason': ret[1],
-                                                    'ret': ret[2],
-                                                    'data': ret[3]})
+                    "ret=%(ret)s, data=%(data)r, time=%(time).3fs"),
+                  {'status': ret[0], 'reason': ret[1], 'ret': ret[2],
+                   'data': ret[3], 'time': elapsed})
         return ret
 
 
 class ServerPool(object):
     def __init__(self, servers, ssl, auth, quantum_id, timeout=10,
-                 base_uri='/quantum/v1.0', name='QuantumRestProxy'):
+                 base_uri='/quantum/v1.0', name='QuantumRestProxy',
+                 max_connections=8):
         self.base_uri = base_uri
         self.timeout = timeout
         self.name = name
         self.auth = auth
         self.ssl = ssl
         self.quantum_id = quantum_id
+        self.max_connections = max_connections
         self.servers = []
         for server_port in servers:
             self.servers.append(self.server_proxy_for(*server_port))
 
     def server_proxy_for(self, server, port):
         return ServerProxy(server, port, self.ssl, self.auth, self.quantum_id,
-                           self.timeout, self.base_uri, self.name)
+                           self.timeout, self.base_uri, self.name,
+                           self.max_connections)
 
     def server_failure(self, resp):
         """Define failure codes as required.
@@ -235,30 +277,48 @@ class ServerPool(object):
         """
         return resp[0] in SUCCESS_CODES
 
+    def get_metrics(self):
+        """Return the request counts and latencies of each server.
+
+        The result is keyed by 'server:port', times are in seconds.
+        """
+        metrics = {}
+        for server in self.servers:
+            server_metrics = dict(server.metrics)
+            requests = server_metrics['requests']
+            server_metrics['average_time'] = (
+                requests and server_metrics['total_time'] / requests or 0.0)
+            metrics['%s:%d' % (server.server, server.port)] = server_metrics
+        return metrics
+
     def rest_call(self, action, resource, data, headers):
+        # Concurrent calls share the server list, it is only reordered
+        # once the call is over
         failed_servers = []
-        while self.servers:
-            active_server = self.servers[0]
+        for active_server in list(self.servers):
             ret = active_server.rest_call(action, resource, data, headers)
             if not self.server_failure(ret):
-                self.servers.extend(failed_servers)
-                return ret
-            else:
-                LOG.error(_('ServerProxy: %(action)s failure for servers: '
-                            '%(server)r'),
-                          {'action': action,
-                           'server': (active_server.server,
-                                      active_server.port)})
-                failed_servers.append(self.servers.pop(0))
-
-        # All servers failed, reset server list and try again next time
-        LOG.error(_('ServerProxy: %(action)s failure for all servers: '
-                    '%(server)r'),
-                  {'action': action,
-                   'server': tuple((s.server,
-                                    s.port) for s in failed_servers)})
-        self.servers.extend(failed_servers)
-        return (0, None, None, None)
+                break
+            LOG.error(_('ServerProxy: %(action)s failure for servers: '
+                        '%(server)r'),
+                      {'action': action,
+                       'server': (active_server.server,
+                                  active_server.port)})
+            failed_servers.append(active_server)
+        else:
+            # All servers failed, keep their order and try again next time
+            LOG.error(_('ServerProxy: %(action)s failure for all servers: '
+                        '%(server)r'),
+                      {'action': action,
+                       'server': tuple((s.server,
+                                        s.port) for s in failed_servers)})
+            ret = (0, None, None, None)
+
+        # The servers which failed are tried last by the next calls
+        if failed_servers:
+            self.servers = ([s for s in self.servers
+                             if s not in failed_servers] + failed_servers)
+        return ret
 
     def get(self, resource, data='', headers=None):
         return self.rest_call('GET', resource, data, headers)
@@ -275,7 +335,7 @@ class ServerPool(object):
 
 class RpcProxy(dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.0'
+    RPC_API_VERSION = '1.1'
 
     def create_rpc_dispatcher(self):
         return q_rpc.PluginRpcDispatcher([self])
@@ -284,6 +344,12 @@ class RpcProxy(dhcp_rpc_base.DhcpRpcCallbackMixin):
 class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
                          l3_db.L3_NAT_db_mixin):
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     supported_extension_aliases = ["router", "binding"]
 
     binding_view = "extension:port_binding:view"
@@ -304,6 +370,7 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
         server_ssl = cfg.CONF.RESTPROXY.server_ssl
         sync_data = cfg.CONF.RESTPROXY.sync_data
         timeout = cfg.CONF.RESTPROXY.server_timeout
+        max_connections = cfg.CONF.RESTPROXY.server_max_connections
         quantum_id = cfg.CONF.RESTPROXY.quantum_id
         self.add_meta_server_route = cfg.CONF.RESTPROXY.add_meta_server_route
 
@@ -315,7 +382,8 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
 
         # init network ctrl connections
         self.servers = ServerPool(servers, server_ssl, server_auth, quantum_id,
-                                  timeout, BASE_URI)
+                                  timeout, BASE_URI,
+                                  max_connections=max_connections)
 
         # init dhcp support
         self.topic = topics.PLUGIN
@@ -580,10 +648,11 @@ class QuantumRestProxyV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_port_dict_binding(context, port)
         return self._fields(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         with context.session.begin(subtransactions=True):
-            ports = super(QuantumRestProxyV2, self).get_ports(context, filters,
-                                                              fields)
+            ports = super(QuantumRestProxyV2, self).get_ports(
+                context, filters, fields, sorts, limit, marker, page_reverse)
             for port in ports:
                 self._extend_port_dict_binding(context, port)
         return [self._fields(port, fields) for port in ports]
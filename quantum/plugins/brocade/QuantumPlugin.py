@@ -207,6 +207,12 @@ class BrocadePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
     """
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         """Initialize Brocade Plugin, specify switch address
         and db configuration.
@@ -414,12 +420,12 @@ class BrocadePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
         return self._fields(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         res_ports = []
         with context.session.begin(subtransactions=True):
-            ports = super(BrocadePluginV2, self).get_ports(context,
-                                                           filters,
-                                                           fields)
+            ports = super(BrocadePluginV2, self).get_ports(
+                context, filters, fields, sorts, limit, marker, page_reverse)
             for port in ports:
                 self._extend_port_dict_security_group(context, port)
                 self._extend_port_dict_binding(context, port)
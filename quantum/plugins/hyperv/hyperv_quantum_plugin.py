@@ -145,9 +145,11 @@ class HyperVQuantumPlugin(db_base_plugin_v2.QuantumDbPluginV2,
                           l3_db.L3_NAT_db_mixin):
 
     # This attribute specifies whether the plugin supports or not
-    # bulk operations. Name mangling is used in order to ensure it
-    # is qualified by class
+    # bulk/pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
     __native_bulk_support = True
+    __native_pagination_support = True
+    __native_sorting_support = True
     supported_extension_aliases = ["provider", "router", "binding", "quotas"]
 
     network_view = "extension:provider_network:view"
@@ -340,9 +342,10 @@ class HyperVQuantumPlugin(db_base_plugin_v2.QuantumDbPluginV2,
         self._extend_network_dict_l3(context, net)
         return self._fields(net, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None, page_reverse=False):
         nets = super(HyperVQuantumPlugin, self).get_networks(
-            context, filters, None)
+            context, filters, None, sorts, limit, marker, page_reverse)
         for net in nets:
             self._extend_network_dict_provider(context, net)
             self._extend_network_dict_l3(context, net)
@@ -363,9 +366,10 @@ class HyperVQuantumPlugin(db_base_plugin_v2.QuantumDbPluginV2,
         return self._fields(self._extend_port_dict_binding(context, port),
                             fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         ports = super(HyperVQuantumPlugin, self).get_ports(
-            context, filters, fields)
+            context, filters, fields, sorts, limit, marker, page_reverse)
         return [self._fields(self._extend_port_dict_binding(context, port),
                              fields) for port in ports]
 
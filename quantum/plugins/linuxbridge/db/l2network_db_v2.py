@@ -14,6 +14,7 @@
 # limitations under the License.
 
 
+import sqlalchemy as sa
 from sqlalchemy.orm import exc
 
 from quantum.common import exceptions as q_exc
@@ -193,6 +194,35 @@ def get_network_binding(session, network_id):
         return
 
 
+def get_network_bindings(session, network_ids):
+    """Return the bindings of the given networks, keyed by network id."""
+    if not network_ids:
+        return {}
+    query = session.query(l2network_models_v2.NetworkBinding).filter(
+        l2network_models_v2.NetworkBinding.network_id.in_(network_ids))
+    return dict((binding.network_id, binding) for binding in query)
+
+
+def get_ports_from_id_prefixes(prefixes):
+    """Return the ports whose id starts with one of prefixes.
+
+    :returns: a dict mapping each prefix a port was found for to the port
+    """
+    if not prefixes:
+        return {}
+    session = db.get_session()
+    query = session.query(models_v2.Port).filter(
+        sa.or_(*[models_v2.Port.id.startswith(prefix)
+                 for prefix in prefixes]))
+    ports = {}
+    lengths = set(len(prefix) for prefix in prefixes)
+    for port in query:
+        for length in lengths:
+            ports[port.id[:length]] = port
+    return dict((prefix, ports[prefix]) for prefix in prefixes
+                if prefix in ports)
+
+
 def get_port_from_device(device):
     """Get port from database"""
     LOG.debug(_("get_port_from_device() called"))
@@ -221,6 +251,17 @@ def get_port_from_device(device):
     return port_dict
 
 
+def set_ports_status(port_ids, status):
+    """Set the status of several ports in a single statement."""
+    if not port_ids:
+        return
+    session = db.get_session()
+    with session.begin(subtransactions=True):
+        (session.query(models_v2.Port).
+         filter(models_v2.Port.id.in_(port_ids)).
+         update({'status': status}, synchronize_session=False))
+
+
 def set_port_status(port_id, status):
     """Set the port status"""
     LOG.debug(_("set_port_status as %s called"), status)
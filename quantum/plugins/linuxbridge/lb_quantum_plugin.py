@@ -58,7 +58,8 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     # history
     #   1.1 Support Security Group RPC
-    RPC_API_VERSION = '1.1'
+    #   1.2 Support get_devices_details_list and update_devices_down
+    RPC_API_VERSION = '1.2'
     # Device names start with "tap"
     TAP_PREFIX_LEN = 3
 
@@ -80,48 +81,80 @@ class LinuxBridgeRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin,
 
     def get_device_details(self, rpc_context, **kwargs):
         """Agent requests device details"""
+        return self.get_devices_details_list(
+            rpc_context, devices=[kwargs.get('device')],
+            agent_id=kwargs.get('agent_id'))[0]
+
+    @classmethod
+    def get_ports_from_devices(cls, devices):
+        """Return the ports of the given devices, keyed by device."""
+        ports = db.get_ports_from_id_prefixes(
+            [device[cls.TAP_PREFIX_LEN:] for device in devices])
+        return dict((device, ports[device[cls.TAP_PREFIX_LEN:]])
+                    for device in devices
+                    if device[cls.TAP_PREFIX_LEN:] in ports)
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of several devices at once"""
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s details requested from %(agent_id)s"),
-                  locals())
-        port = self.get_port_from_device(device)
-        if port:
-            binding = db.get_network_binding(db_api.get_session(),
-                                             port['network_id'])
-            entry = {'device': device,
-                     'physical_network': binding.physical_network,
-                     'vlan_id': binding.vlan_id,
-                     'network_id': port['network_id'],
-                     'port_id': port['id'],
-                     'admin_state_up': port['admin_state_up']}
-            new_status = (q_const.PORT_STATUS_ACTIVE if port['admin_state_up']
-                          else q_const.PORT_STATUS_DOWN)
-            if port['status'] != new_status:
-                db.set_port_status(port['id'], new_status)
-        else:
-            entry = {'device': device}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        devices = kwargs.get('devices')
+        LOG.debug(_("Devices %(devices)s details requested from "
+                    "%(agent_id)s"), locals())
+        ports = self.get_ports_from_devices(devices)
+        bindings = db.get_network_bindings(
+            db_api.get_session(),
+            set(port['network_id'] for port in ports.itervalues()))
+        entries = []
+        new_statuses = {}
+        for device in devices:
+            port = ports.get(device)
+            if port:
+                binding = bindings[port['network_id']]
+                entry = {'device': device,
+                         'physical_network': binding.physical_network,
+                         'vlan_id': binding.vlan_id,
+                         'network_id': port['network_id'],
+                         'port_id': port['id'],
+                         'admin_state_up': port['admin_state_up']}
+                new_status = (q_const.PORT_STATUS_ACTIVE
+                              if port['admin_state_up']
+                              else q_const.PORT_STATUS_DOWN)
+                if port['status'] != new_status:
+                    new_statuses.setdefault(new_status, []).append(port['id'])
+            else:
+                entry = {'device': device}
+                LOG.debug(_("%s can not be found in database"), device)
+            entries.append(entry)
+        for status, port_ids in new_statuses.iteritems():
+            db.set_ports_status(port_ids, status)
+        return entries
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent"""
+        return self.update_devices_down(
+            rpc_context, devices=[kwargs.get('device')],
+            agent_id=kwargs.get('agent_id'))[0]
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent"""
         # (TODO) garyk - live migration and port status
         agent_id = kwargs.get('agent_id')
-        device = kwargs.get('device')
-        LOG.debug(_("Device %(device)s no longer exists on %(agent_id)s"),
+        devices = kwargs.get('devices')
+        LOG.debug(_("Devices %(devices)s no longer exist on %(agent_id)s"),
                   locals())
-        port = self.get_port_from_device(device)
-        if port:
-            entry = {'device': device,
-                     'exists': True}
-            if port['status'] != q_const.PORT_STATUS_DOWN:
-                # Set port status to DOWN
-                db.set_port_status(port['id'], q_const.PORT_STATUS_DOWN)
-        else:
-            entry = {'device': device,
-                     'exists': False}
-            LOG.debug(_("%s can not be found in database"), device)
-        return entry
+        ports = self.get_ports_from_devices(devices)
+        entries = []
+        for device in devices:
+            exists = device in ports
+            entries.append({'device': device, 'exists': exists})
+            if not exists:
+                LOG.debug(_("%s can not be found in database"), device)
+        # Set port status to DOWN
+        db.set_ports_status(
+            [port['id'] for port in ports.itervalues()
+             if port['status'] != q_const.PORT_STATUS_DOWN],
+            q_const.PORT_STATUS_DOWN)
+        return entries
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent"""
@@ -517,6 +550,27 @@ class LinuxBridgePluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         self.notify_security_groups_member_updated(context, port)
         return self._extend_port_dict_binding(context, port)
 
+    def create_port_bulk(self, context, ports):
+        items = ports['ports']
+        sgids = []
+        with context.session.begin(subtransactions=True):
+            for item in items:
+                # Set port status as 'DOWN'. This will be updated by agent
+                item['port']['status'] = q_const.PORT_STATUS_DOWN
+                self._ensure_default_security_group_on_port(context, item)
+                sgids.append(self._get_security_groups_on_port(context,
+                                                               item))
+            new_ports = self._create_ports_in_bulk(context, items)
+            for port, port_sgids in zip(new_ports, sgids):
+                self._process_port_create_security_group(
+                    context, port['id'], port_sgids)
+                # The bindings were just created, no need to read them back
+                port[ext_sg.SECURITYGROUPS] = list(port_sgids or [])
+        for port in new_ports:
+            self.notify_security_groups_member_updated(context, port)
+        return [self._extend_port_dict_binding(context, port)
+                for port in new_ports]
+
     def update_port(self, context, id, port):
         original_port = self.get_port(context, id)
         session = context.session
@@ -79,6 +79,12 @@ class NECPluginV2(nec_plugin_base.NECPluginV2Base,
     The port binding extension enables an external application relay
     information to and from the plugin.
     """
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     _supported_extension_aliases = ["router", "quotas", "binding",
                                     "security-group", "extraroute",
                                     "agent", "agent_scheduler",
@@ -366,8 +372,10 @@ class NECPluginV2(nec_plugin_base.NECPluginV2Base,
         self._extend_network_dict_l3(context, net)
         return self._fields(net, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
-        nets = super(NECPluginV2, self).get_networks(context, filters, None)
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None, page_reverse=False):
+        nets = super(NECPluginV2, self).get_networks(
+            context, filters, None, sorts, limit, marker, page_reverse)
         for net in nets:
             self._extend_network_dict_l3(context, net)
         return [self._fields(net, fields) for net in nets]
@@ -464,10 +472,11 @@ class NECPluginV2(nec_plugin_base.NECPluginV2Base,
             self._extend_port_dict_binding(context, port)
         return self._fields(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         with context.session.begin(subtransactions=True):
-            ports = super(NECPluginV2, self).get_ports(context, filters,
-                                                       fields)
+            ports = super(NECPluginV2, self).get_ports(
+                context, filters, fields, sorts, limit, marker, page_reverse)
             # TODO(amotoki) filter by security group
             for port in ports:
                 self._extend_port_dict_security_group(context, port)
@@ -618,8 +627,8 @@ class NECPluginV2AgentNotifierApi(proxy.RpcProxy,
 
 
 class DhcpRpcCallback(dhcp_rpc_base.DhcpRpcCallbackMixin):
-    # DhcpPluginApi BASE_RPC_API_VERSION
-    RPC_API_VERSION = '1.0'
+    # DhcpPluginApi BULK_RPC_API_VERSION
+    RPC_API_VERSION = '1.1'
 
 
 class L3RpcCallback(l3_rpc_base.L3RpcCallbackMixin):
@@ -69,6 +69,7 @@ from quantum.plugins.nicira.nicira_nvp_plugin import (nicira_networkgw_db
                                                       as networkgw_db)
 from quantum.plugins.nicira.nicira_nvp_plugin import nicira_qos_db as qos_db
 from quantum.plugins.nicira.nicira_nvp_plugin import nvp_cluster
+from quantum.plugins.nicira.nicira_nvp_plugin import nvp_sync
 from quantum.plugins.nicira.nicira_nvp_plugin.nvp_plugin_version import (
     PLUGIN_VERSION)
 from quantum.plugins.nicira.nicira_nvp_plugin import NvpApiClient
@@ -201,8 +202,8 @@ def parse_clusters_opts(clusters_opts, concurrent_connections,
 
 class NVPRpcCallbacks(dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    # Set RPC API version to 1.0 by default.
-    RPC_API_VERSION = '1.0'
+    # Set RPC API version to 1.1 by default, for get_networks_info.
+    RPC_API_VERSION = '1.1'
 
     def create_rpc_dispatcher(self):
         '''Get the rpc dispatcher for this manager.
@@ -289,6 +290,17 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self.clusters_opts, self.nvp_opts.concurrent_connections,
             self.nvp_opts.nvp_gen_timeout, self.nvp_opts.default_cluster_name)
 
+        # Lists take the operational status from a cache synchronized in
+        # bulk, instead of querying every cluster on each call
+        self._status_cache = None
+        if self.nvp_opts.state_sync_interval:
+            self._status_cache = nvp_sync.NvpStatusCache(
+                self.nvp_opts.state_cache_ttl)
+            self._status_synchronizer = nvp_sync.NvpStatusSynchronizer(
+                self.clusters, self._status_cache,
+                self.nvp_opts.state_sync_interval)
+            self._status_synchronizer.start()
+
         db.configure_db()
         # Extend the fault map
         self._extend_fault_map()
@@ -1053,6 +1065,19 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         LOG.debug(_("Returning pairs for network: %s"), pairs)
         return pairs
 
+    def _use_status_cache(self, filters):
+        """Tell whether a list can be served from the status cache.
+
+        The 'fresh' filter is removed from filters; fresh=true forces
+        a query to NVP.
+        """
+        fresh = filters.pop('fresh', None)
+        if self._status_cache is None:
+            return False
+        if fresh and attr.convert_to_boolean(fresh[0]):
+            return False
+        return self._status_cache.is_fresh()
+
     def get_network(self, context, id, fields=None):
         with context.session.begin(subtransactions=True):
             # goto to the plugin DB and fetch the network
@@ -1105,6 +1130,7 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
     def get_networks(self, context, filters=None, fields=None):
         nvp_lswitches = {}
         filters = filters or {}
+        use_status_cache = self._use_status_cache(filters)
         with context.session.begin(subtransactions=True):
             quantum_lswitches = (
                 super(NvpPluginV2, self).get_networks(context, filters))
@@ -1115,6 +1141,21 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                 self._extend_network_qos_queue(context, net)
 
             tenant_ids = filters and filters.get('tenant_id') or None
+        if use_status_cache:
+            for quantum_lswitch in quantum_lswitches:
+                # Skip external networks as they do not exist in NVP
+                if quantum_lswitch[l3.EXTERNAL]:
+                    continue
+                # Networks created since the last synchronization keep
+                # the status in the database
+                fabric_status = self._status_cache.get_network_status(
+                    quantum_lswitch['id'])
+                if fabric_status is not None:
+                    quantum_lswitch["status"] = (
+                        fabric_status and constants.NET_STATUS_ACTIVE or
+                        constants.NET_STATUS_DOWN)
+            return [self._fields(quantum_lswitch, fields)
+                    for quantum_lswitch in quantum_lswitches]
         filter_fmt = "&tag=%s&tag_scope=os_tid"
         if context.is_admin and not tenant_ids:
             tenant_filter = ""
@@ -1130,19 +1171,20 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             fields=lswitch_filters,
             relations='LogicalSwitchStatus',
             filters={'tag': 'true', 'tag_scope': 'shared'})
+
+        def _get_cluster_lswitches(c):
+            res = nvplib.get_all_query_pages(lswitch_url_path_1, c)
+            # Issue a second query for fetching shared networks.
+            # We cannot unfortunately use just a single query because tags
+            # cannot be or-ed
+            return res + nvplib.get_all_query_pages(lswitch_url_path_2, c)
+
         try:
-            for c in self.clusters.itervalues():
-                res = nvplib.get_all_query_pages(
-                    lswitch_url_path_1, c)
+            # Clusters are queried concurrently
+            for res in nvplib.for_each_cluster(_get_cluster_lswitches,
+                                               self.clusters.itervalues()):
                 nvp_lswitches.update(dict(
                     (ls['uuid'], ls) for ls in res))
-                # Issue a second query for fetching shared networks.
-                # We cannot unfortunately use just a single query because tags
-                # cannot be or-ed
-                res_shared = nvplib.get_all_query_pages(
-                    lswitch_url_path_2, c)
-                nvp_lswitches.update(dict(
-                    (ls['uuid'], ls) for ls in res_shared))
         except Exception:
             err_msg = _("Unable to get logical switches")
             LOG.exception(err_msg)
@@ -1214,6 +1256,8 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         return net
 
     def get_ports(self, context, filters=None, fields=None):
+        filters = filters or {}
+        use_status_cache = self._use_status_cache(filters)
         with context.session.begin(subtransactions=True):
             quantum_lports = super(NvpPluginV2, self).get_ports(
                 context, filters)
@@ -1224,6 +1268,21 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._network_is_external(context, filters['network_id'][0])):
             # Do not perform check on NVP platform
             return quantum_lports
+        if use_status_cache:
+            for quantum_lport in quantum_lports:
+                # Ports created since the last synchronization, and ports
+                # not mapped to a logical switch port (ie: floating ip),
+                # keep the status in the database
+                port_status = self._status_cache.get_port_status(
+                    quantum_lport['id'])
+                if port_status is not None:
+                    admin_status_enabled, fabric_status_up = port_status
+                    quantum_lport["admin_state_up"] = admin_status_enabled
+                    quantum_lport["status"] = (
+                        fabric_status_up and constants.PORT_STATUS_ACTIVE or
+                        constants.PORT_STATUS_DOWN)
+            return [self._fields(quantum_lport, fields)
+                    for quantum_lport in quantum_lports]
 
         vm_filter = ""
         tenant_filter = ""
@@ -1251,25 +1310,29 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
 
         lport_fields_str = ("tags,admin_status_enabled,display_name,"
                             "fabric_status_up")
-        try:
-            for c in self.clusters.itervalues():
-                lport_query_path = (
-                    "/ws.v1/lswitch/%s/lport?fields=%s&%s%stag_scope=q_port_id"
-                    "&relations=LogicalPortStatus" %
-                    (lswitch, lport_fields_str, vm_filter, tenant_filter))
-
-                try:
-                    ports = nvplib.get_all_query_pages(lport_query_path, c)
-                except q_exc.NotFound:
-                    LOG.warn(_("Lswitch %s not found in NVP"), lswitch)
-                    ports = None
+        lport_query_path = (
+            "/ws.v1/lswitch/%s/lport?fields=%s&%s%stag_scope=q_port_id"
+            "&relations=LogicalPortStatus" %
+            (lswitch, lport_fields_str, vm_filter, tenant_filter))
 
-                if ports:
-                    for port in ports:
-                        for tag in port["tags"]:
-                            if tag["scope"] == "q_port_id":
-                                nvp_lports[tag["tag"]] = port
+        def _get_cluster_lports(c):
+            lports = {}
+            try:
+                # Ports are indexed as pages arrive, the whole result set
+                # is never held in memory at once
+                for port in nvplib.iter_query_pages(lport_query_path, c):
+                    for tag in port["tags"]:
+                        if tag["scope"] == "q_port_id":
+                            lports[tag["tag"]] = port
+            except q_exc.NotFound:
+                LOG.warn(_("Lswitch %s not found in NVP"), lswitch)
+            return lports
 
+        try:
+            # Clusters are queried concurrently
+            for lports in nvplib.for_each_cluster(_get_cluster_lports,
+                                                  self.clusters.itervalues()):
+                nvp_lports.update(lports)
         except Exception:
             err_msg = _("Unable to get ports")
             LOG.exception(err_msg)
@@ -1693,10 +1756,22 @@ class NvpPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         return self._make_router_dict(router, fields)
 
     def get_routers(self, context, filters=None, fields=None):
+        filters = filters or {}
+        use_status_cache = self._use_status_cache(filters)
         router_query = self._apply_filters_to_query(
             self._model_query(context, l3_db.Router),
             l3_db.Router, filters)
         routers = router_query.all()
+        if use_status_cache:
+            for router in routers:
+                fabric_status = self._status_cache.get_router_status(
+                    router['id'])
+                if fabric_status is not None:
+                    router.status = (fabric_status and
+                                     constants.NET_STATUS_ACTIVE or
+                                     constants.NET_STATUS_DOWN)
+            return [self._make_router_dict(router, fields)
+                    for router in routers]
         # Query routers on NVP for updating operational status
         if context.is_admin and not filters.get("tenant_id"):
             tenant_id = None
@@ -42,6 +42,16 @@ nvp_opts = [
     cfg.StrOpt('default_transport_type', default='stt',
                help=_("The default network tranport type to use (stt, gre, "
                       "bridge, ipsec_gre, or ipsec_stt)")),
+    cfg.IntOpt('state_sync_interval', default=0,
+               help=_("Interval in seconds between bulk synchronizations of "
+                      "the operational status of NVP resources. When set, "
+                      "network, port and router lists take the status from "
+                      "the last synchronization unless fresh=true is "
+                      "passed (default 0, meaning always query NVP)")),
+    cfg.IntOpt('state_cache_ttl', default=300,
+               help=_("Number of seconds the synchronized status is used "
+                      "for; lists query NVP again when the last successful "
+                      "synchronization is older (default 300)")),
 ]
 
 cluster_opts = [
@@ -0,0 +1,148 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Nicira, Inc.
+# All Rights Reserved
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import time
+
+from quantum.openstack.common import loopingcall
+from quantum.plugins.nicira.nicira_nvp_plugin import nvplib
+
+LOG = logging.getLogger(__name__)
+
+# Largest page size NVP accepts, for fewer round trips
+PAGE_LENGTH = 1000
+
+
+def _get_tag(nvp_obj, scope):
+    for tag in nvp_obj.get('tags') or []:
+        if tag['scope'] == scope:
+            return tag['tag']
+
+
+class NvpStatusCache(object):
+    """Operational status of the NVP resources backing quantum objects.
+
+    The cache is filled in bulk by NvpStatusSynchronizer. Lookups return None
+    for objects the last synchronization did not see, and every lookup
+    returns None once the cache is older than ttl seconds, so that callers
+    fall back to querying NVP.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.timestamp = None
+        # quantum network id -> fabric status of its logical switch(es)
+        self._networks = {}
+        # quantum port id -> (admin_status_enabled, fabric_status_up)
+        self._ports = {}
+        # quantum router id -> fabric status of its logical router
+        self._routers = {}
+
+    def is_fresh(self):
+        return (self.timestamp is not None and
+                time.time() - self.timestamp <= self.ttl)
+
+    def update(self, networks, ports, routers):
+        self._networks = networks
+        self._ports = ports
+        self._routers = routers
+        self.timestamp = time.time()
+
+    def get_network_status(self, network_id):
+        if self.is_fresh():
+            return self._networks.get(network_id)
+
+    def get_port_status(self, port_id):
+        if self.is_fresh():
+            return self._ports.get(port_id)
+
+    def get_router_status(self, router_id):
+        if self.is_fresh():
+            return self._routers.get(router_id)
+
+
+class NvpStatusSynchronizer(object):
+    """Periodically pull the status of every NVP resource into a cache.
+
+    Each run issues one paged query per resource type and cluster, whatever
+    the number of quantum objects.
+    """
+
+    LSWITCH_QUERY = nvplib._build_uri_path(
+        nvplib.LSWITCH_RESOURCE, fields="uuid,tags",
+        relations="LogicalSwitchStatus",
+        filters={'_page_length': PAGE_LENGTH})
+    LPORT_QUERY = nvplib._build_uri_path(
+        nvplib.LSWITCHPORT_RESOURCE, parent_resource_id='*',
+        fields="tags,admin_status_enabled", relations="LogicalPortStatus",
+        filters={'tag_scope': 'q_port_id', '_page_length': PAGE_LENGTH})
+    LROUTER_QUERY = nvplib._build_uri_path(
+        nvplib.LROUTER_RESOURCE, fields="uuid",
+        relations="LogicalRouterStatus",
+        filters={'_page_length': PAGE_LENGTH})
+
+    def __init__(self, clusters, cache, interval):
+        self.clusters = clusters
+        self.cache = cache
+        self.interval = interval
+        self._loop = None
+
+    def sync(self):
+        networks = {}
+        ports = {}
+        routers = {}
+        for cluster in self.clusters.itervalues():
+            for lswitch in nvplib.iter_query_pages(self.LSWITCH_QUERY,
+                                                   cluster):
+                # Extended networks are made of several logical switches,
+                # the network is down as soon as one of them is
+                net_id = _get_tag(lswitch, 'quantum_net_id') or lswitch['uuid']
+                status = bool(lswitch['_relations']['LogicalSwitchStatus']
+                              ['fabric_status'])
+                networks[net_id] = networks.get(net_id, True) and status
+            for lport in nvplib.iter_query_pages(self.LPORT_QUERY, cluster):
+                port_id = _get_tag(lport, 'q_port_id')
+                if port_id:
+                    ports[port_id] = (
+                        lport['admin_status_enabled'],
+                        bool(lport['_relations']['LogicalPortStatus']
+                             ['fabric_status_up']))
+            for lrouter in nvplib.iter_query_pages(self.LROUTER_QUERY,
+                                                   cluster):
+                routers[lrouter['uuid']] = bool(
+                    lrouter['_relations']['LogicalRouterStatus']
+                    ['fabric_status'])
+        self.cache.update(networks, ports, routers)
+        LOG.debug(_("Synchronized status of %(networks)d networks, "
+                    "%(ports)d ports and %(routers)d routers from NVP"),
+                  {'networks': len(networks), 'ports': len(ports),
+                   'routers': len(routers)})
+
+    def _sync(self):
+        try:
+            self.sync()
+        except Exception:
+            # Keep going, the cache expires if NVP stays unreachable
+            LOG.exception(_("Unable to synchronize status with NVP"))
+
+    def start(self):
+        self._loop = loopingcall.LoopingCall(self._sync)
+        self._loop.start(self.interval)
+
+    def stop(self):
+        if self._loop:
+            self._loop.stop()
@@ -26,6 +26,7 @@ import inspect
 import json
 import logging
 
+import eventlet
 from oslo.config import cfg
 
 #FIXME(danwent): I'd like this file to get to the point where it has
@@ -66,6 +67,16 @@ SNAT_KEYS = ["to_src_port_min", "to_src_port_max", "to_src_ip_min",
 
 DNAT_KEYS = ["to_dst_port", "to_dst_ip_min", "to_dst_ip_max"]
 
+# Green threads fanning calls out to clusters, and prefetching query pages.
+# They wait on api client requests, which take a green thread of their own
+# from NvpApiRequestEventlet.API_REQUEST_POOL, so they cannot run on that
+# pool: once full of them it would never have room for their requests.
+# Page prefetches only wait on requests, and get a pool of their own since
+# calls fanned out to clusters may go through query pages.
+FANOUT_POOL_SIZE = 100
+CLUSTER_FANOUT_POOL = eventlet.GreenPool(FANOUT_POOL_SIZE)
+PAGE_PREFETCH_POOL = eventlet.GreenPool(FANOUT_POOL_SIZE)
+
 
 LOCAL_LOGGING = False
 if LOCAL_LOGGING:
@@ -107,7 +118,7 @@ def version_dependent(func):
                 del func_kwargs[arg]
         # NOTE(salvatore-orlando): shall we fail here if a required
         # argument is not passed, or let the called function raise?
-        real_func(cluster, *args, **func_kwargs)
+        return real_func(cluster, *args, **func_kwargs)
 
     return dispatch_version_dependent_function
 
@@ -178,23 +189,33 @@ def get_cluster_version(cluster):
     return version
 
 
-def get_all_query_pages(path, c):
-    need_more_results = True
-    result_list = []
-    page_cursor = None
+def iter_query_pages(path, c):
+    """Iterate over the results of every page of a query.
+
+    Results are yielded as pages arrive. The request for the next page is
+    issued as soon as the current one is received, so that it is in flight
+    while the caller goes through the current page.
+    """
+    pool = PAGE_PREFETCH_POOL
     query_marker = "&" if (path.find("?") != -1) else "?"
-    while need_more_results:
-        page_cursor_str = (
-            "_page_cursor=%s" % page_cursor if page_cursor else "")
-        res = do_single_request(HTTP_GET, "%s%s%s" %
-                                (path, query_marker, page_cursor_str),
-                                cluster=c)
-        body = json.loads(res)
+    next_page = pool.spawn(do_single_request, HTTP_GET, path, cluster=c)
+    # Green threads which have not run yet are false
+    while next_page is not None:
+        body = json.loads(next_page.wait())
         page_cursor = body.get('page_cursor')
-        if not page_cursor:
-            need_more_results = False
-        result_list.extend(body['results'])
-    return result_list
+        if page_cursor:
+            next_page = pool.spawn(do_single_request, HTTP_GET,
+                                   "%s%s_page_cursor=%s" %
+                                   (path, query_marker, page_cursor),
+                                   cluster=c)
+        else:
+            next_page = None
+        for result in body['results']:
+            yield result
+
+
+def get_all_query_pages(path, c):
+    return list(iter_query_pages(path, c))
 
 
 def do_single_request(*args, **kwargs):
@@ -208,15 +229,53 @@ def do_single_request(*args, **kwargs):
     return req
 
 
+def for_each_cluster(func, clusters):
+    """Call func(cluster) on every cluster concurrently.
+
+    The time taken is the one of the slowest cluster rather than the sum
+    of all of them. Results are returned in the order of clusters; an
+    exception raised by a call is raised again. func must not fan out to
+    clusters itself.
+    """
+    pool = CLUSTER_FANOUT_POOL
+    threads = [pool.spawn(func, c) for c in clusters]
+    return [thread.wait() for thread in threads]
+
+
+def find_in_clusters(func, clusters):
+    """Call func(cluster) on every cluster concurrently, first hit wins.
+
+    Return (result, cluster) as soon as a call returns something else than
+    None, without waiting for the other clusters, or (None, None) if no
+    call does. Calls raising an exception count as misses. func must not
+    fan out to clusters itself.
+    """
+    pool = CLUSTER_FANOUT_POOL
+    answers = eventlet.queue.LightQueue()
+
+    def _call(cluster):
+        try:
+            answers.put((func(cluster), cluster))
+        except Exception:
+            LOG.exception(_("Lookup failed on cluster: %s"), cluster.name)
+            answers.put((None, cluster))
+
+    clusters = list(clusters)
+    for c in clusters:
+        pool.spawn_n(_call, c)
+    for _i in range(len(clusters)):
+        result, cluster = answers.get()
+        if result is not None:
+            return (result, cluster)
+    return (None, None)
+
+
 def do_multi_request(*args, **kwargs):
     """Issue a request to all clusters"""
-    results = []
-    clusters = kwargs["clusters"]
-    for x in clusters:
-        LOG.debug(_("Issuing request to cluster: %s"), x.name)
-        rv = x.api_client.request(*args)
-        results.append(rv)
-    return results
+    def _request(cluster):
+        LOG.debug(_("Issuing request to cluster: %s"), cluster.name)
+        return cluster.api_client.request(*args)
+    return for_each_cluster(_request, kwargs["clusters"])
 
 
 # -------------------------------------------------------------------
@@ -225,19 +284,21 @@ def do_multi_request(*args, **kwargs):
 def find_port_and_cluster(clusters, port_id):
     """Return (url, cluster_id) of port or (None, None) if port does not exist.
     """
-    for c in clusters:
-        query = "/ws.v1/lswitch/*/lport?uuid=%s&fields=*" % port_id
+    query = "/ws.v1/lswitch/*/lport?uuid=%s&fields=*" % port_id
+
+    def _find(c):
         LOG.debug(_("Looking for lswitch with port id "
-                    "'%(port_id)s' on: %(c)s"), locals())
+                    "'%(port_id)s' on: %(c)s"), {'port_id': port_id, 'c': c})
         try:
             res = do_single_request(HTTP_GET, query, cluster=c)
         except Exception as e:
             LOG.error(_("get_port_cluster_and_url, exception: %s"), str(e))
-            continue
+            return
         res = json.loads(res)
         if len(res["results"]) == 1:
-            return (res["results"][0], c)
-    return (None, None)
+            return res["results"][0]
+
+    return find_in_clusters(_find, clusters)
 
 
 def find_lswitch_by_portid(clusters, port_id):
@@ -379,7 +440,7 @@ def create_l2_gw_service(cluster, tenant_id, display_name, devices):
         raise
 
 
-def create_lrouter(cluster, tenant_id, display_name, nexthop):
+def create_lrouter(cluster, tenant_id, display_name, nexthop, **kwargs):
     """ Create a NVP logical router on the specified cluster.
 
         :param cluster: The target NVP cluster
@@ -387,10 +448,13 @@ def create_lrouter(cluster, tenant_id, display_name, nexthop):
         the logical router is being created
         :param display_name: Descriptive name of this logical router
         :param nexthop: External gateway IP address for the logical router
+        :param tags: Optional list of additional tags for the router
         :raise NvpApiException: if there is a problem while communicating
         with the NVP controller
     """
     tags = [{"tag": tenant_id, "scope": "os_tid"}]
+    if "tags" in kwargs:
+        tags.extend(kwargs["tags"])
     display_name = _check_and_truncate_name(display_name)
     lrouter_obj = {
         "display_name": display_name,
@@ -665,17 +729,24 @@ def get_port_by_display_name(clusters, lswitch, display_name):
              (lswitch, display_name))
     LOG.debug(_("Looking for port with display_name "
                 "'%(display_name)s' on: %(lswitch)s"), locals())
-    for c in clusters:
+
+    def _find(c):
         try:
             res_obj = do_single_request(HTTP_GET, query, cluster=c)
         except Exception as e:
-            continue
+            LOG.debug(_("Port lookup failed on cluster %(name)s: %(e)s"),
+                      {'name': c.name, 'e': str(e)})
+            return
         res = json.loads(res_obj)
         if len(res["results"]) == 1:
-            return (res["results"][0], c)
-
-    LOG.error(_("Port or Network not found, Error: %s"), str(e))
-    raise exception.PortNotFound(port_id=display_name, net_id=lswitch)
+            return res["results"][0]
+
+    port, cluster = find_in_clusters(_find, clusters)
+    if port is None:
+        LOG.error(_("Port %(display_name)s not found on lswitch "
+                    "%(lswitch)s"), locals())
+        raise exception.PortNotFound(port_id=display_name, net_id=lswitch)
+    return (port, cluster)
 
 
 def get_port_by_quantum_tag(cluster, lswitch_uuid, quantum_port_id):
@@ -28,6 +28,7 @@ from oslo.config import cfg
 
 from quantum.agent.linux import ip_lib
 from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
 from quantum.agent.linux import utils
 from quantum.agent import rpc as agent_rpc
 from quantum.agent import securitygroups_rpc as sg_rpc
@@ -152,7 +153,8 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
 
     def __init__(self, integ_br, tun_br, local_ip,
                  bridge_mappings, root_helper,
-                 polling_interval, enable_tunneling):
+                 polling_interval, enable_tunneling, minimize_polling=False,
+                 ovsdb_monitor_respawn_interval=30):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -162,6 +164,10 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         :param root_helper: utility to use when running shell cmds.
         :param polling_interval: interval (secs) to poll DB.
         :param enable_tunneling: if True enable GRE networks.
+        :param minimize_polling: if True monitor ovsdb for port changes
+               rather than polling the integration bridge.
+        :param ovsdb_monitor_respawn_interval: interval (secs) between
+               restarts of the ovsdb monitor.
         '''
         self.root_helper = root_helper
         self.available_local_vlans = set(
@@ -172,6 +178,11 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         self.local_vlan_map = {}
 
         self.polling_interval = polling_interval
+        self.ovsdb_monitor = None
+        if minimize_polling:
+            self.ovsdb_monitor = ovsdb_monitor.InterfaceMonitor(
+                self.int_br, root_helper,
+                respawn_interval=ovsdb_monitor_respawn_interval)
 
         self.enable_tunneling = enable_tunneling
         self.local_ip = local_ip
@@ -195,7 +206,7 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
     def _report_state(self):
         try:
             # How many devices are likely used by a VM
-            ports = self.int_br.get_vif_port_set()
+            ports = self.get_vif_port_set()
             num_devices = len(ports)
             self.agent_state.get('configurations')['devices'] = num_devices
             self.state_rpc.report_state(self.context,
@@ -575,8 +586,13 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             int_veth.link.set_up()
             phys_veth.link.set_up()
 
+    def get_vif_port_set(self):
+        if self.ovsdb_monitor and self.ovsdb_monitor.is_active:
+            return self.ovsdb_monitor.get_vif_port_set()
+        return self.int_br.get_vif_port_set()
+
     def update_ports(self, registered_ports):
-        ports = self.int_br.get_vif_port_set()
+        ports = self.get_vif_port_set()
         if ports == registered_ports:
             return
         added = ports - registered_ports
@@ -597,20 +613,21 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             LOG.debug(_("No VIF port for port %s defined on agent."), port_id)
 
     def treat_devices_added(self, devices):
-        resync = False
         self.sg_agent.prepare_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Port %s added"), device)
-            try:
-                details = self.plugin_rpc.get_device_details(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("Unable to get port details for "
-                            "%(device)s: %(e)s"), locals())
-                resync = True
-                continue
-            port = self.int_br.get_vif_port_by_id(details['device'])
+        LOG.info(_("Ports %s added"), devices)
+        try:
+            devices_details = self.plugin_rpc.get_devices_details_list(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("Unable to get ports details for "
+                        "%(devices)s: %(e)s"), locals())
+            return True
+        # Read every VIF of the bridge at once rather than one per device
+        vif_ports = dict((port.vif_id, port)
+                         for port in self.int_br.get_vif_ports())
+        for details in devices_details:
+            device = details['device']
+            port = vif_ports.get(device)
             if 'port_id' in details:
                 LOG.info(_("Port %(device)s updated. Details: %(details)s"),
                          locals())
@@ -624,29 +641,27 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 if (port and int(port.ofport) != -1):
                     self.port_dead(port)
-        return resync
+        return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          locals())
-                resync = True
-                continue
+        LOG.info(_("Attachments %s removed"), devices)
+        try:
+            devices_details = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id)
+        except Exception as e:
+            LOG.debug(_("port_removed failed for %(devices)s: %(e)s"),
+                      locals())
+            return True
+        for details in devices_details:
+            device = details['device']
             if details['exists']:
                 LOG.info(_("Port %s updated."), device)
                 # Nothing to do regarding local networking
             else:
                 LOG.debug(_("Device %s not defined on plugin"), device)
                 self.port_unbound(device)
-        return resync
+        return False
 
     def process_network_ports(self, port_info):
         resync_a = False
@@ -681,6 +696,8 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
         while True:
             try:
                 start = time.time()
+                if self.ovsdb_monitor:
+                    self.ovsdb_monitor.ensure_started()
                 if sync:
                     LOG.info(_("Agent out of sync with plugin!"))
                     ports.clear()
@@ -708,13 +725,20 @@ class OVSQuantumAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin):
             # sleep till end of polling interval
             elapsed = (time.time() - start)
             if (elapsed < self.polling_interval):
-                time.sleep(self.polling_interval - elapsed)
+                self._wait(self.polling_interval - elapsed)
             else:
                 LOG.debug(_("Loop iteration exceeded interval "
                             "(%(polling_interval)s vs. %(elapsed)s)!"),
                           {'polling_interval': self.polling_interval,
                            'elapsed': elapsed})
 
+    def _wait(self, timeout):
+        if self.ovsdb_monitor and self.ovsdb_monitor.is_active:
+            # Wake up as soon as a port is added or removed
+            self.ovsdb_monitor.wait_for_changes(timeout)
+        else:
+            time.sleep(timeout)
+
     def daemon_loop(self):
         self.rpc_loop()
 
@@ -738,6 +762,9 @@ def create_agent_config_map(config):
         root_helper=config.AGENT.root_helper,
         polling_interval=config.AGENT.polling_interval,
         enable_tunneling=config.OVS.enable_tunneling,
+        minimize_polling=config.AGENT.minimize_polling,
+        ovsdb_monitor_respawn_interval=(
+            config.AGENT.ovsdb_monitor_respawn_interval),
     )
 
     if kwargs['enable_tunneling'] and not kwargs['local_ip']:
@@ -58,6 +58,13 @@ agent_opts = [
     cfg.IntOpt('polling_interval', default=2,
                help=_("The number of seconds the agent will wait between "
                       "polling for local device changes.")),
+    cfg.BoolOpt('minimize_polling', default=False,
+                help=_("Monitor ovsdb for interface changes instead of "
+                       "polling the integration bridge. Polling is used "
+                       "whenever the monitor is not running.")),
+    cfg.IntOpt('ovsdb_monitor_respawn_interval', default=30,
+               help=_("The number of seconds to wait before starting the "
+                      "ovsdb monitor again after it exited.")),
 ]
 
 
@@ -89,6 +89,12 @@ class RyuQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
                          extraroute_db.ExtraRoute_db_mixin,
                          sg_db_rpc.SecurityGroupServerRpcMixin):
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     _supported_extension_aliases = ["router", "extraroute", "security-group"]
 
     @property
@@ -189,9 +195,10 @@ class RyuQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
         self._extend_network_dict_l3(context, net)
         return self._fields(net, fields)
 
-    def get_networks(self, context, filters=None, fields=None):
-        nets = super(RyuQuantumPluginV2, self).get_networks(context, filters,
-                                                            None)
+    def get_networks(self, context, filters=None, fields=None,
+                     sorts=None, limit=None, marker=None, page_reverse=False):
+        nets = super(RyuQuantumPluginV2, self).get_networks(
+            context, filters, None, sorts, limit, marker, page_reverse)
         for net in nets:
             self._extend_network_dict_l3(context, net)
 
@@ -257,10 +264,11 @@ class RyuQuantumPluginV2(db_base_plugin_v2.QuantumDbPluginV2,
             self._extend_port_dict_security_group(context, port)
         return self._fields(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None):
+    def get_ports(self, context, filters=None, fields=None,
+                  sorts=None, limit=None, marker=None, page_reverse=False):
         with context.session.begin(subtransactions=True):
             ports = super(RyuQuantumPluginV2, self).get_ports(
-                context, filters, fields)
+                context, filters, fields, sorts, limit, marker, page_reverse)
             for port in ports:
                 self._extend_port_dict_security_group(context, port)
         return [self._fields(port, fields) for port in ports]
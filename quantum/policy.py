@@ -31,14 +31,18 @@ from quantum.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Rules compiled into closures, thrown away whenever the rules change
+_COMPILED = {'rules': None, 'named': {}, 'match': {}}
 cfg.CONF.import_opt('policy_file', 'quantum.common.config')
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _COMPILED
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _COMPILED = {'rules': None, 'named': {}, 'match': {}}
     policy.reset()
 
 
@@ -96,7 +100,49 @@ def _build_target(action, original_target, plugin, context):
     return target
 
 
-def _build_match_rule(action, target):
+def _build_targets(action, targets, plugin, context):
+    """Augment a list of targets like _build_target does for one.
+
+    Parent resources are retrieved with a single call to the plugin.
+    Targets whose parent could not be retrieved are not augmented.
+    """
+    resource, _a = get_resource_and_action(action)
+    hierarchy_info = attributes.RESOURCE_HIERARCHY_MAP.get(resource, None)
+    if not (hierarchy_info and plugin and targets):
+        return targets
+    parent_resource = hierarchy_info['parent'][:-1]
+    parent_id = hierarchy_info['identified_by']
+    parent_ids = list(set(target[parent_id] for target in targets))
+    f = getattr(plugin, 'get_%s' % hierarchy_info['parent'])
+    parents = f(context, filters={'id': parent_ids},
+                fields=['id', 'tenant_id'])
+    tenant_ids = dict((parent['id'], parent['tenant_id'])
+                      for parent in parents)
+    key = '%s_tenant_id' % parent_resource
+    real_targets = []
+    for target in targets:
+        target = target.copy()
+        if target[parent_id] in tenant_ids:
+            target[key] = tenant_ids[target[parent_id]]
+        real_targets.append(target)
+    return real_targets
+
+
+def _get_enforced_attributes(action, target):
+    """Return the attributes whose value in target is subject to policy."""
+    resource, is_write = get_resource_and_action(action)
+    # assigning to variable with short name for improving readability
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    if not is_write or resource not in res_map:
+        return ()
+    return tuple(attribute_name for attribute_name in res_map[resource]
+                 if (_is_attribute_explicitly_set(attribute_name,
+                                                  res_map[resource],
+                                                  target) and
+                     'enforce_policy' in res_map[resource][attribute_name]))
+
+
+def _build_match_rule(action, target, enforced_attributes=None):
     """Create the rule to match for a given action.
 
     The policy rule to be matched is built in the following way:
@@ -108,24 +154,131 @@ def _build_match_rule(action, target):
     """
 
     match_rule = policy.RuleCheck('rule', action)
-    resource, is_write = get_resource_and_action(action)
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute and is_write:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
+    if enforced_attributes is None:
+        enforced_attributes = _get_enforced_attributes(action, target)
+    for attribute_name in enforced_attributes:
+        attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                     (action, attribute_name))
+        match_rule = policy.AndCheck([match_rule, attr_rule])
 
     return match_rule
 
 
+def _allow(target, creds, roles):
+    return True
+
+
+def _deny(target, creds, roles):
+    return False
+
+
+def _compile_check(check, compiled):
+    """Turn a tree of policy checks into a closure.
+
+    The closure takes the target, the credentials and the lower case
+    roles of the credentials, and gives the result the check would.
+    Rules referenced by name are compiled on first use.
+    """
+    if isinstance(check, policy.TrueCheck):
+        return _allow
+    if isinstance(check, policy.FalseCheck):
+        return _deny
+    if isinstance(check, policy.NotCheck):
+        rule = _compile_check(check.rule, compiled)
+        return lambda target, creds, roles: not rule(target, creds, roles)
+    if isinstance(check, policy.AndCheck):
+        rules = [_compile_check(c, compiled) for c in check.rules]
+
+        def and_check(target, creds, roles):
+            for rule in rules:
+                if not rule(target, creds, roles):
+                    return False
+            return True
+        return and_check
+    if isinstance(check, policy.OrCheck):
+        rules = [_compile_check(c, compiled) for c in check.rules]
+
+        def or_check(target, creds, roles):
+            for rule in rules:
+                if rule(target, creds, roles):
+                    return True
+            return False
+        return or_check
+    # Checks of a derived class may behave differently, they are only
+    # compiled when their class is known exactly
+    if type(check) is policy.RuleCheck:
+        name = check.match
+
+        def rule_check(target, creds, roles):
+            try:
+                return _get_named_rule(compiled, name)(target, creds, roles)
+            except KeyError:
+                # We don't have any matching rule; fail closed
+                return False
+        return rule_check
+    if type(check) is policy.RoleCheck:
+        role = check.match.lower()
+        return lambda target, creds, roles: role in roles
+    if type(check) is policy.GenericCheck:
+        kind = check.kind
+        match = check.match
+
+        def generic_check(target, creds, roles):
+            if kind in creds:
+                return match % target == unicode(creds[kind])
+            return False
+        return generic_check
+    if type(check) is FieldCheck:
+        field = check.field
+        value = check.value
+
+        def field_check(target, creds, roles):
+            target_value = target.get(field)
+            # target_value might be a boolean, explicitly compare with None
+            return target_value is not None and target_value == value
+        return field_check
+    return lambda target, creds, roles: check(target, creds)
+
+
+def _get_compiled():
+    """Return the compiled form of the rules in use."""
+    global _COMPILED
+    if _COMPILED['rules'] is not policy._rules:
+        _COMPILED = {'rules': policy._rules, 'named': {}, 'match': {}}
+    return _COMPILED
+
+
+def _get_named_rule(compiled, name):
+    rule = compiled['named'].get(name)
+    if rule is None:
+        if not compiled['rules']:
+            raise KeyError(name)
+        # Missing rules fall back to the default rule, or raise KeyError
+        rule = _compile_check(compiled['rules'][name], compiled)
+        compiled['named'][name] = rule
+    return rule
+
+
+def _get_match_rule(compiled, action, target):
+    enforced_attributes = _get_enforced_attributes(action, target)
+    key = (action, enforced_attributes)
+    rule = compiled['match'].get(key)
+    if rule is None:
+        rule = _compile_check(
+            _build_match_rule(action, target, enforced_attributes), compiled)
+        compiled['match'][key] = rule
+    return rule
+
+
+def _get_lower_roles(credentials):
+    return frozenset(role.lower() for role in credentials['roles'])
+
+
+def _check(action, target, credentials):
+    rule = _get_match_rule(_get_compiled(), action, target)
+    return rule(target, credentials, _get_lower_roles(credentials))
+
+
 @policy.register('field')
 class FieldCheck(policy.Check):
     def __init__(self, kind, match):
@@ -175,9 +328,33 @@ def check(context, action, target, plugin=None):
     """
     init()
     real_target = _build_target(action, target, plugin, context)
-    match_rule = _build_match_rule(action, real_target)
+    return _check(action, real_target, context.to_dict())
+
+
+def check_list(context, action, targets, plugin=None):
+    """Verifies that the action is valid on each target of a list.
+
+    Same as calling check() on every target, but the policy file, the
+    credentials and the parent resources are only looked up once.
+
+    :param context: quantum context
+    :param action: string representing the action to be checked
+    :param targets: list of dictionaries representing the objects of the
+        action
+    :param plugin: quantum plugin used to retrieve information required
+        for augmenting the targets
+
+    :return: Returns a list telling for each target whether access is
+        permitted.
+    """
+    init()
+    real_targets = _build_targets(action, targets, plugin, context)
     credentials = context.to_dict()
-    return policy.check(match_rule, real_target, credentials)
+    roles = _get_lower_roles(credentials)
+    compiled = _get_compiled()
+    return [_get_match_rule(compiled, action, target)(target, credentials,
+                                                      roles)
+            for target in real_targets]
 
 
 def enforce(context, action, target, plugin=None):
@@ -197,7 +374,7 @@ def enforce(context, action, target, plugin=None):
 
     init()
     real_target = _build_target(action, target, plugin, context)
-    match_rule = _build_match_rule(action, real_target)
-    credentials = context.to_dict()
-    return policy.check(match_rule, real_target, credentials,
-                        exceptions.PolicyNotAuthorized, action=action)
+    result = _check(action, real_target, context.to_dict())
+    if result is False:
+        raise exceptions.PolicyNotAuthorized(action=action)
+    return result
@@ -48,6 +48,11 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='quantum.quota.ConfDriver',
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('quota_usage_sync_interval',
+               default=600,
+               help=_('Number of seconds after which the usage counter of '
+                      'a resource is checked against the actual number of '
+                      'objects, 0 to never check it')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -244,6 +249,11 @@ class QuotaEngine(object):
         resource are passed directly to the count function declared by
         the resource.
 
+        Drivers keeping track of usages, which have a get_usage() method,
+        are asked for the usage instead when the tenant_id is passed as a
+        keyword argument. They only call the count function when they do
+        not know the usage.
+
         :param context: The request context, for access checks.
         :param resource: The name of the resource, as a string.
         """
@@ -253,8 +263,23 @@ class QuotaEngine(object):
         if not res or not hasattr(res, 'count'):
             raise exceptions.QuotaResourceUnknown(unknown=[resource])
 
+        get_usage = getattr(self._driver, 'get_usage', None)
+        if get_usage and 'tenant_id' in kwargs:
+            return get_usage(context, kwargs['tenant_id'], resource,
+                             lambda: res.count(context, *args, **kwargs))
         return res.count(context, *args, **kwargs)
 
+    def update_usage(self, context, tenant_id, resource, delta):
+        """Account for objects of a resource being created or deleted.
+
+        Called within the transaction creating or deleting the objects,
+        delta being the number of objects created, negative when deleting.
+        This is a no-op unless the driver keeps track of usages.
+        """
+        update_usage = getattr(self._driver, 'update_usage', None)
+        if update_usage:
+            update_usage(context, tenant_id, resource, delta)
+
     def limit_check(self, context, tenant_id, **values):
         """Check simple quota limits.
 
@@ -0,0 +1,262 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Long lived rootwrap, serving privileged commands over a Unix socket.
+
+quantum-rootwrap starts a new interpreter and reads every filter file for
+each command run as root. The daemon loads the filters once and then runs
+the commands agents send over a Unix socket, checking each of them against
+the filters exactly as quantum-rootwrap does.
+
+Every request and every reply is one line of JSON. A client may send
+several requests without waiting for the replies, the commands are run
+concurrently and each reply carries the id of its request:
+
+    {"id": 1, "cmd": ["ip", "link", "show"], "stdin": null}
+    {"id": 1, "returncode": 0, "stdout": "...", "stderr": ""}
+
+The environment of the client is not forwarded, as sudo does not forward
+it either; the commands only get the environment set by their filter.
+"""
+
+import ConfigParser
+import errno
+import itertools
+import json
+import os
+import pwd
+import socket as stdlib_socket
+import sys
+
+import eventlet
+from eventlet import event
+from eventlet.green import socket
+from eventlet.green import subprocess
+from eventlet import semaphore
+
+from quantum.rootwrap import wrapper
+
+# Same exit codes as quantum-rootwrap
+RC_UNAUTHORIZED = 99
+RC_NOCOMMAND = 98
+RC_BADCONFIG = 97
+RC_NOEXECFOUND = 96
+
+
+class RootwrapDaemonError(Exception):
+    """Raised when a command could not be sent to the daemon."""
+
+
+def _encode(data):
+    # Command output is not necessarily text, every byte is mapped to the
+    # code point of the same value so that it survives JSON
+    return data is not None and data.decode('latin-1') or data
+
+
+def _decode(data):
+    return data is not None and data.encode('latin-1') or data
+
+
+def load_filters_path(config_file):
+    """Return the filter directories listed in a rootwrap.conf."""
+    config = ConfigParser.RawConfigParser()
+    config.read(config_file)
+    return config.get('DEFAULT', 'filters_path').split(',')
+
+
+class RootwrapServer(object):
+    """Run the commands allowed by the filters on behalf of socket clients.
+
+    @filter_list  filters as returned by wrapper.load_filters()
+    """
+
+    def __init__(self, filter_list):
+        self.filter_list = filter_list
+
+    def run_command(self, userargs, stdin=None):
+        """Run a command if a filter allows it.
+
+        : returns: (returncode, stdout, stderr)
+        """
+        if not userargs:
+            return RC_NOCOMMAND, '', 'No command specified\n'
+        filtermatch = wrapper.match_filter(self.filter_list, userargs)
+        if not filtermatch:
+            return RC_UNAUTHORIZED, '', ('Unauthorized command: %s\n' %
+                                         ' '.join(userargs))
+        if not os.access(filtermatch.exec_path, os.X_OK):
+            return RC_NOEXECFOUND, '', ('Executable not found: %s\n' %
+                                        filtermatch.exec_path)
+        obj = subprocess.Popen(filtermatch.get_command(userargs),
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               env=filtermatch.get_environment(userargs),
+                               close_fds=True)
+        stdout, stderr = obj.communicate(stdin)
+        return obj.returncode, stdout, stderr
+
+    def _handle_request(self, line, conn, write_lock):
+        request = json.loads(line)
+        try:
+            returncode, stdout, stderr = self.run_command(
+                [str(arg) for arg in request['cmd']],
+                _decode(request.get('stdin')))
+        except OSError as e:
+            returncode, stdout, stderr = RC_NOEXECFOUND, '', str(e)
+        reply = json.dumps({'id': request['id'],
+                            'returncode': returncode,
+                            'stdout': _encode(stdout),
+                            'stderr': _encode(stderr)})
+        try:
+            with write_lock:
+                conn.sendall(reply + '\n')
+        except stdlib_socket.error:
+            # Client went away, nobody is left to read the reply
+            pass
+
+    def handle_connection(self, conn):
+        write_lock = semaphore.Semaphore()
+        pool = eventlet.GreenPool()
+        reader = conn.makefile('r')
+        try:
+            for line in iter(reader.readline, ''):
+                pool.spawn_n(self._handle_request, line, conn, write_lock)
+            pool.waitall()
+        except stdlib_socket.error:
+            pass
+        finally:
+            conn.close()
+
+    def serve(self, sock):
+        while True:
+            conn, _addr = sock.accept()
+            eventlet.spawn_n(self.handle_connection, conn)
+
+
+def listen(socket_path, owner=None):
+    """Bind a Unix socket only owner, and root, can connect to."""
+    try:
+        os.unlink(socket_path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0177)
+    try:
+        sock.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    if owner is not None:
+        os.chown(socket_path, owner, -1)
+    sock.listen(128)
+    return sock
+
+
+class RootwrapClient(object):
+    """Send commands to a rootwrap daemon over a single connection.
+
+    Green threads share the connection: requests are written as soon as
+    they are issued and each caller only waits for its own reply.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._sock = None
+        self._reader = None
+        self._pending = {}
+        self._ids = itertools.count()
+        self._write_lock = semaphore.Semaphore()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        self._sock = sock
+        self._reader = eventlet.spawn(self._read_replies, sock)
+
+    def _disconnect(self, sock, error):
+        if sock is self._sock:
+            self._sock = None
+            self._reader = None
+            pending, self._pending = self._pending, {}
+            # The commands may have been run already, they are failed
+            # rather than sent again
+            for waiter in pending.itervalues():
+                waiter.send_exception(RuntimeError(error))
+        sock.close()
+
+    def _read_replies(self, sock):
+        error = 'Connection closed by the rootwrap daemon'
+        try:
+            for line in iter(sock.makefile('r').readline, ''):
+                reply = json.loads(line)
+                waiter = self._pending.pop(reply['id'], None)
+                if waiter:
+                    waiter.send((reply['returncode'],
+                                 _decode(reply['stdout']),
+                                 _decode(reply['stderr'])))
+        except Exception as e:
+            error = str(e)
+        self._disconnect(sock, error)
+
+    def execute(self, cmd, process_input=None):
+        """Run cmd as root through the daemon.
+
+        : returns: (returncode, stdout, stderr)
+        : raises: RootwrapDaemonError if the command could not be sent,
+            RuntimeError if the connection was lost before the reply came
+        """
+        request_id = self._ids.next()
+        waiter = event.Event()
+        with self._write_lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._pending[request_id] = waiter
+                self._sock.sendall(json.dumps(
+                    {'id': request_id, 'cmd': cmd,
+                     'stdin': _encode(process_input)}) + '\n')
+            except stdlib_socket.error as e:
+                self._pending.pop(request_id, None)
+                if self._sock is not None:
+                    self._disconnect(self._sock, str(e))
+                raise RootwrapDaemonError(str(e))
+        return waiter.wait()
+
+
+def main():
+    """quantum-rootwrap-daemon <config file> <socket path> [<owner>]"""
+    if len(sys.argv) not in (3, 4):
+        sys.stderr.write(main.__doc__ + '\n')
+        sys.exit(RC_NOCOMMAND)
+    config_file, socket_path = sys.argv[1:3]
+    owner = None
+    if len(sys.argv) == 4:
+        owner = pwd.getpwnam(sys.argv[3]).pw_uid
+    elif 'SUDO_UID' in os.environ:
+        owner = int(os.environ['SUDO_UID'])
+    try:
+        filters_path = load_filters_path(config_file)
+    except ConfigParser.Error:
+        sys.stderr.write('Incorrect configuration file: %s\n' % config_file)
+        sys.exit(RC_BADCONFIG)
+    server = RootwrapServer(wrapper.load_filters(filters_path))
+    server.serve(listen(socket_path, owner))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,13 +15,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import httplib
 import os
+import socket
 
+import mock
 from mock import patch
 
 import quantum.common.test_lib as test_lib
 from quantum.extensions import portbindings
 from quantum.manager import QuantumManager
+from quantum.plugins.bigswitch import plugin as restproxy
+from quantum.tests import base
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 import quantum.tests.unit.test_db_plugin as test_plugin
 
@@ -32,6 +37,7 @@ RESTPROXY_PKG_PATH = 'quantum.plugins.bigswitch.plugin'
 class HTTPResponseMock():
     status = 200
     reason = 'OK'
+    will_close = False
 
     def __init__(self, sock, debuglevel=0, strict=0, method=None,
                  buffering=False):
@@ -111,3 +117,117 @@ class TestBigSwitchProxySync(BigSwitchProxyPluginV2TestCase):
         plugin_obj = QuantumManager.get_plugin()
         result = plugin_obj._send_all_data()
         self.assertEqual(result[0], 200)
+
+
+class TestServerProxy(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServerProxy, self).setUp()
+        self.proxy = restproxy.ServerProxy('server', 8800, False, None,
+                                           'quantum-id', 10, '/base', 'test')
+        self.conn = self._new_conn()
+        patcher = patch('httplib.HTTPConnection', return_value=self.conn)
+        self.http_connection = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _new_conn(self, will_close=False):
+        conn = mock.Mock()
+        response = conn.getresponse.return_value
+        response.status = 200
+        response.reason = 'OK'
+        response.read.return_value = '{"a": 1}'
+        response.will_close = will_close
+        return conn
+
+    def test_connection_is_reused(self):
+        for i in range(3):
+            ret = self.proxy.rest_call('GET', '/x', '', None)
+            self.assertEqual(ret, (200, 'OK', '{"a": 1}', {'a': 1}))
+        self.assertEqual(self.http_connection.call_count, 1)
+        self.assertEqual(self.conn.request.call_count, 3)
+        self.assertFalse(self.conn.close.called)
+
+    def test_connection_closed_by_server(self):
+        self.conn.getresponse.return_value.will_close = True
+        self.proxy.rest_call('GET', '/x', '', None)
+        self.proxy.rest_call('GET', '/x', '', None)
+        self.assertEqual(self.http_connection.call_count, 2)
+        self.assertEqual(self.conn.close.call_count, 2)
+
+    def test_stale_connection_is_replaced(self):
+        self.proxy.rest_call('GET', '/x', '', None)
+        stale = self.conn
+        stale.getresponse.side_effect = httplib.BadStatusLine('')
+        self.http_connection.return_value = self._new_conn()
+        ret = self.proxy.rest_call('GET', '/x', '', None)
+        self.assertEqual(ret[0], 200)
+        self.assertTrue(stale.close.called)
+        self.assertEqual(self.http_connection.call_count, 2)
+
+    def test_unsent_request_is_sent_again(self):
+        self.proxy.rest_call('GET', '/x', '', None)
+        self.conn.request.side_effect = socket.error()
+        new_conn = self._new_conn()
+        self.http_connection.return_value = new_conn
+        ret = self.proxy.rest_call('POST', '/x', {}, None)
+        self.assertEqual(ret[0], 200)
+        self.assertEqual(new_conn.request.call_count, 1)
+
+    def test_sent_post_is_not_sent_again(self):
+        self.proxy.rest_call('GET', '/x', '', None)
+        self.conn.getresponse.side_effect = httplib.BadStatusLine('')
+        ret = self.proxy.rest_call('POST', '/x', {}, None)
+        self.assertEqual(ret, (0, None, None, None))
+        # The controller may have applied the first one
+        self.assertEqual(self.http_connection.call_count, 1)
+        self.assertEqual(self.conn.request.call_count, 2)
+        self.assertEqual(self.proxy._idle_connections, [])
+
+    def test_new_connection_failure_is_not_retried(self):
+        self.conn.request.side_effect = socket.error()
+        ret = self.proxy.rest_call('GET', '/x', '', None)
+        self.assertEqual(ret, (0, None, None, None))
+        self.assertEqual(self.http_connection.call_count, 1)
+        self.assertEqual(self.proxy._idle_connections, [])
+        self.assertEqual(self.proxy.metrics['failures'], 1)
+
+    def test_metrics(self):
+        with patch('time.time', side_effect=[10.0, 10.5, 20.0, 20.1]):
+            self.proxy.rest_call('GET', '/x', '', None)
+            self.proxy.rest_call('GET', '/x', '', None)
+        self.assertEqual(self.proxy.metrics['requests'], 2)
+        self.assertEqual(self.proxy.metrics['failures'], 0)
+        self.assertAlmostEqual(self.proxy.metrics['total_time'], 0.6)
+        self.assertAlmostEqual(self.proxy.metrics['max_time'], 0.5)
+
+
+class TestServerPool(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestServerPool, self).setUp()
+        self.pool = restproxy.ServerPool([('a', 1), ('b', 2)], False, None,
+                                         'quantum-id')
+        self.first, self.second = self.pool.servers
+
+    def test_failed_server_is_tried_last(self):
+        with patch.object(self.first, 'rest_call',
+                          return_value=(0, None, None, None)):
+            with patch.object(self.second, 'rest_call',
+                              return_value=(200, 'OK', '', '')):
+                self.assertEqual(self.pool.get('/x')[0], 200)
+        self.assertEqual(self.pool.servers, [self.second, self.first])
+
+    def test_all_servers_failed(self):
+        for server in self.pool.servers:
+            patcher = patch.object(server, 'rest_call',
+                                   return_value=(503, None, None, None))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.assertEqual(self.pool.get('/x'), (0, None, None, None))
+        self.assertEqual(self.pool.servers, [self.first, self.second])
+
+    def test_get_metrics(self):
+        self.first.metrics.update(requests=4, total_time=2.0, max_time=1.0)
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics['a:1']['average_time'], 0.5)
+        self.assertEqual(metrics['b:2']['average_time'], 0.0)
@@ -54,6 +54,7 @@ origSetUp = test_l3_plugin.L3NatDBTestCase.setUp
 class HTTPResponseMock():
     status = 200
     reason = 'OK'
+    will_close = False
 
     def __init__(self, sock, debuglevel=0, strict=0, method=None,
                  buffering=False):
@@ -13,7 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+
+from quantum.common import constants as q_const
+from quantum import context
 from quantum.extensions import portbindings
+from quantum.manager import QuantumManager
+from quantum.plugins.linuxbridge import lb_quantum_plugin
 from quantum.tests.unit import _test_extension_portbindings as test_bindings
 from quantum.tests.unit import test_db_plugin as test_plugin
 from quantum.tests.unit import test_security_groups_rpc as test_sg_rpc
@@ -54,6 +60,32 @@ class TestLinuxBridgePortsV2(test_plugin.TestPortsV2,
             self.assertEqual(port['port']['status'], 'DOWN')
             self.assertEqual(self.port_create_status, 'DOWN')
 
+    def _test_create_ports_bulk_plugin_failure(self):
+        # Bulk ports do not go through create_port, fail in the processing
+        # done for each port instead
+        plugin = QuantumManager.get_plugin()
+        orig = plugin._process_port_create_security_group
+        with self.network() as net:
+            with mock.patch.object(plugin,
+                                   '_process_port_create_security_group'
+                                   ) as patched_plugin:
+
+                def side_effect(*args, **kwargs):
+                    return self._do_side_effect(patched_plugin, orig,
+                                                *args, **kwargs)
+
+                patched_plugin.side_effect = side_effect
+                res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                             'test', True)
+                # We expect a 500 as we injected a fault in the plugin
+                self._validate_behavior_on_bulk_failure(res, 'ports', 500)
+
+    def test_create_ports_bulk_emulated_plugin_failure(self):
+        self._test_create_ports_bulk_plugin_failure()
+
+    def test_create_ports_bulk_native_plugin_failure(self):
+        self._test_create_ports_bulk_plugin_failure()
+
 
 class TestLinuxBridgePortBinding(LinuxBridgePluginV2TestCase,
                                  test_bindings.PortBindingsTestCase):
@@ -65,7 +97,68 @@ class TestLinuxBridgePortBinding(LinuxBridgePluginV2TestCase,
         test_sg_rpc.set_firewall_driver(self.FIREWALL_DRIVER)
         super(TestLinuxBridgePortBinding, self).setUp()
 
+    def test_create_ports_bulk_native(self):
+        plugin = QuantumManager.get_plugin()
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            with mock.patch.object(plugin, '_create_ports_in_bulk',
+                                   wraps=plugin._create_ports_in_bulk) as f:
+                res = self._create_port_bulk(self.fmt, 3, net_id, 'test',
+                                             True)
+            self.assertEqual(res.status_int, 201)
+            self.assertEqual(f.call_count, 1)
+            ctx = context.get_admin_context()
+            for port in self.deserialize(self.fmt, res)['ports']:
+                self.assertEqual(port['status'], q_const.PORT_STATUS_DOWN)
+                self._check_response_portbindings(port)
+                # Bound to the default security group
+                self.assertEqual(
+                    len(plugin.get_port(ctx, port['id'])['security_groups']),
+                    1)
+                self._delete('ports', port['id'])
+
 
 class TestLinuxBridgePortBindingNoSG(TestLinuxBridgePortBinding):
     HAS_PORT_FILTER = False
     FIREWALL_DRIVER = test_sg_rpc.FIREWALL_NOOP_DRIVER
+
+
+class TestLinuxBridgeRpcCallbacks(LinuxBridgePluginV2TestCase):
+
+    def setUp(self):
+        super(TestLinuxBridgeRpcCallbacks, self).setUp()
+        self.callbacks = lb_quantum_plugin.LinuxBridgeRpcCallbacks()
+        self.ctx = context.get_admin_context()
+
+    def test_get_devices_details_list(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet) as port1:
+                with self.port(subnet=subnet,
+                               admin_state_up=False) as port2:
+                    devices = ['tap' + port1['port']['id'][:11], 'tapunknown',
+                               'tap' + port2['port']['id'][:11]]
+                    details = self.callbacks.get_devices_details_list(
+                        self.ctx, devices=devices, agent_id='agent')
+                    self.assertEqual([entry['device'] for entry in details],
+                                     devices)
+                    self.assertEqual(details[0]['port_id'],
+                                     port1['port']['id'])
+                    self.assertIn('vlan_id', details[0])
+                    self.assertNotIn('port_id', details[1])
+                    self.assertFalse(details[2]['admin_state_up'])
+                    port = self._show('ports', port1['port']['id'])['port']
+                    self.assertEqual(port['status'],
+                                     q_const.PORT_STATUS_ACTIVE)
+
+    def test_update_devices_down(self):
+        with self.port() as port:
+            device = 'tap' + port['port']['id'][:11]
+            self.callbacks.get_device_details(
+                self.ctx, device=device, agent_id='agent')
+            details = self.callbacks.update_devices_down(
+                self.ctx, devices=[device, 'tapunknown'], agent_id='agent')
+            self.assertEqual(details, [{'device': device, 'exists': True},
+                                       {'device': 'tapunknown',
+                                        'exists': False}])
+            port = self._show('ports', port['port']['id'])['port']
+            self.assertEqual(port['status'], q_const.PORT_STATUS_DOWN)
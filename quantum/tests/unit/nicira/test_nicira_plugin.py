@@ -862,6 +862,94 @@ class NiciraQuantumNVPOutOfSync(test_l3_plugin.L3NatTestCaseBase,
                          constants.NET_STATUS_ERROR)
 
 
+class NiciraQuantumNVPStatusCache(test_l3_plugin.L3NatTestCaseBase,
+                                  NiciraPluginV2TestCase):
+
+    def setUp(self):
+        cfg.CONF.set_override('state_sync_interval', 60, 'NVP')
+        # Synchronizations are triggered by the tests
+        self.mock_start = mock.patch.object(
+            QuantumPlugin.nvp_sync.NvpStatusSynchronizer, 'start')
+        self.mock_start.start()
+        self.addCleanup(self.mock_start.stop)
+        super(NiciraQuantumNVPStatusCache, self).setUp()
+        self.plugin = manager.QuantumManager.get_plugin()
+
+    def _sync(self):
+        self.plugin._status_synchronizer.sync()
+
+    def test_list_networks_from_cache(self):
+        res = self._create_network('json', 'net1', True)
+        self.deserialize('json', res)
+        self._sync()
+        self.fc._fake_lswitch_dict.clear()
+        req = self.new_list_request('networks')
+        nets = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(nets['networks'][0]['status'],
+                         constants.NET_STATUS_ACTIVE)
+
+    def test_list_networks_fresh(self):
+        res = self._create_network('json', 'net1', True)
+        self.deserialize('json', res)
+        self._sync()
+        self.fc._fake_lswitch_dict.clear()
+        req = self.new_list_request('networks', params='fresh=true')
+        nets = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(nets['networks'][0]['status'],
+                         constants.NET_STATUS_ERROR)
+
+    def test_list_networks_expired_cache(self):
+        res = self._create_network('json', 'net1', True)
+        self.deserialize('json', res)
+        self._sync()
+        self.fc._fake_lswitch_dict.clear()
+        self.plugin._status_cache.timestamp -= 3600
+        req = self.new_list_request('networks')
+        nets = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(nets['networks'][0]['status'],
+                         constants.NET_STATUS_ERROR)
+
+    def test_list_networks_never_synchronized(self):
+        res = self._create_network('json', 'net1', True)
+        self.deserialize('json', res)
+        self.fc._fake_lswitch_dict.clear()
+        req = self.new_list_request('networks')
+        nets = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(nets['networks'][0]['status'],
+                         constants.NET_STATUS_ERROR)
+
+    def test_list_ports_from_cache(self):
+        res = self._create_network('json', 'net1', True)
+        net1 = self.deserialize('json', res)
+        res = self._create_port('json', net1['network']['id'])
+        self.deserialize('json', res)
+        self._sync()
+        self.fc._fake_lswitch_lport_dict.clear()
+        req = self.new_list_request('ports')
+        ports = self.deserialize('json', req.get_response(self.api))
+        # The fake NVP client reports logical ports as down
+        self.assertEqual(ports['ports'][0]['status'],
+                         constants.PORT_STATUS_DOWN)
+        req = self.new_list_request('ports', params='fresh=true')
+        ports = self.deserialize('json', req.get_response(self.api))
+        self.assertEqual(ports['ports'][0]['status'],
+                         constants.PORT_STATUS_ERROR)
+
+    def test_list_routers_from_cache(self):
+        res = self._create_router('json', 'tenant')
+        self.deserialize('json', res)
+        self._sync()
+        self.fc._fake_lrouter_dict.clear()
+        req = self.new_list_request('routers')
+        routers = self.deserialize('json', req.get_response(self.ext_api))
+        self.assertEqual(routers['routers'][0]['status'],
+                         constants.NET_STATUS_ACTIVE)
+        req = self.new_list_request('routers', params='fresh=true')
+        routers = self.deserialize('json', req.get_response(self.ext_api))
+        self.assertEqual(routers['routers'][0]['status'],
+                         constants.NET_STATUS_ERROR)
+
+
 class TestNiciraNetworkGateway(test_l2_gw.NetworkGatewayDbTestCase,
                                NiciraPluginV2TestCase):
 
@@ -15,11 +15,15 @@
 #
 # @author: Salvatore Orlando, VMware
 
+import eventlet
 import mock
 import os
 
+from quantum.common import exceptions
 from quantum.openstack.common import jsonutils as json
 import quantum.plugins.nicira.nicira_nvp_plugin as nvp_plugin
+from quantum.plugins.nicira.nicira_nvp_plugin.api_client import (
+    request_eventlet)
 from quantum.plugins.nicira.nicira_nvp_plugin import nvp_cluster
 from quantum.plugins.nicira.nicira_nvp_plugin import NvpApiClient
 from quantum.plugins.nicira.nicira_nvp_plugin import nvplib
@@ -93,6 +97,30 @@ class TestNvplibNatRules(NvplibTestCase):
         self.assertEqual('192.168.0.5',
                          resp_obj['match']['destination_ip_addresses'])
 
+    def test_create_lrouter_dnat_rule_returns_rule(self):
+        self.fake_cluster.api_client.get_nvp_version.return_value = '3.1'
+        lrouter = nvplib.create_lrouter(self.fake_cluster, 'pippo',
+                                        'fake_router', '192.168.0.1')
+        nat_rule = nvplib.create_lrouter_dnat_rule(
+            self.fake_cluster, lrouter['uuid'], '10.0.0.99', order=200,
+            match_criteria={'destination_ip_addresses': '192.168.0.5'})
+        self.assertEqual('DestinationNatRule', nat_rule['type'])
+        self.assertIn('uuid', nat_rule)
+
+
+class TestNvplibLogicalRouters(NvplibTestCase):
+
+    def test_create_lrouter_with_tags(self):
+        tenant_id = 'pippo'
+        lrouter = nvplib.create_lrouter(
+            self.fake_cluster, tenant_id, 'fake_router', '192.168.0.1',
+            tags=[{'scope': 'q_router_id', 'tag': 'whatever'}])
+        res_lrouter = nvplib.get_lrouter(self.fake_cluster, lrouter['uuid'])
+        self.assertIn({'scope': 'os_tid', 'tag': tenant_id},
+                      res_lrouter['tags'])
+        self.assertIn({'scope': 'q_router_id', 'tag': 'whatever'},
+                      res_lrouter['tags'])
+
 
 class NvplibL2GatewayTestCase(NvplibTestCase):
 
@@ -204,3 +232,129 @@ class TestNvpLibLogicalPorts(NvplibTestCase):
                                                lswitch['uuid'],
                                                quantum_port_id)
         self.assertIsNone(lport)
+
+
+class TestNvplibClusterFanOut(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNvplibClusterFanOut, self).setUp()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _make_cluster(self, name, response=None, delay=0):
+        cluster = mock.Mock()
+        cluster.name = name
+
+        def _request(*args):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            eventlet.sleep(delay)
+            self.in_flight -= 1
+            return response
+        cluster.api_client.request.side_effect = _request
+        return cluster
+
+    def _lport_response(self, *lports):
+        return json.dumps({'results': list(lports),
+                           'result_count': len(lports)})
+
+    def test_do_multi_request_is_concurrent(self):
+        clusters = [self._make_cluster('c%d' % i, response=i)
+                    for i in range(3)]
+        results = nvplib.do_multi_request('GET', '/ws.v1/lswitch',
+                                          clusters=clusters)
+        self.assertEqual([0, 1, 2], results)
+        self.assertEqual(3, self.max_in_flight)
+
+    def test_do_multi_request_leaves_api_request_pool_alone(self):
+        # Api client requests take their green threads from this pool
+        clusters = [self._make_cluster('c%d' % i, response=i)
+                    for i in range(3)]
+        with mock.patch.object(request_eventlet.NvpApiRequestEventlet,
+                               'API_REQUEST_POOL') as api_pool:
+            results = nvplib.do_multi_request('GET', '/ws.v1/lswitch',
+                                              clusters=clusters)
+        self.assertEqual([0, 1, 2], results)
+        self.assertEqual([], api_pool.mock_calls)
+
+    def test_do_multi_request_raises(self):
+        clusters = [self._make_cluster('c0', response=0),
+                    self._make_cluster('c1')]
+        clusters[1].api_client.request.side_effect = (
+            NvpApiClient.NvpApiException)
+        self.assertRaises(NvpApiClient.NvpApiException,
+                          nvplib.do_multi_request, 'GET', '/ws.v1/lswitch',
+                          clusters=clusters)
+
+    def test_find_port_and_cluster_first_hit(self):
+        lport = {'uuid': _uuid()}
+        slow = self._make_cluster('slow', delay=10,
+                                  response=self._lport_response(lport))
+        miss = self._make_cluster('miss', response=self._lport_response())
+        hit = self._make_cluster('hit', response=self._lport_response(lport))
+        with eventlet.Timeout(5):
+            port, cluster = nvplib.find_port_and_cluster([slow, miss, hit],
+                                                         lport['uuid'])
+        self.assertEqual(lport, port)
+        self.assertEqual(hit, cluster)
+
+    def test_find_port_and_cluster_not_found(self):
+        clusters = [self._make_cluster('miss',
+                                       response=self._lport_response()),
+                    self._make_cluster('error')]
+        clusters[1].api_client.request.side_effect = (
+            NvpApiClient.NvpApiException)
+        self.assertEqual((None, None),
+                         nvplib.find_port_and_cluster(clusters, _uuid()))
+
+    def test_get_port_by_display_name_not_found(self):
+        clusters = [self._make_cluster('miss',
+                                       response=self._lport_response()),
+                    self._make_cluster('error')]
+        clusters[1].api_client.request.side_effect = (
+            NvpApiClient.NvpApiException)
+        self.assertRaises(exceptions.PortNotFound,
+                          nvplib.get_port_by_display_name,
+                          clusters, '*', 'foo')
+
+
+class TestNvplibQueryPages(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNvplibQueryPages, self).setUp()
+        self.pages = {
+            '/ws.v1/lswitch?fields=uuid': {'results': [{'uuid': 1},
+                                                       {'uuid': 2}],
+                                           'page_cursor': 'p2'},
+            '/ws.v1/lswitch?fields=uuid&_page_cursor=p2': {
+                'results': [{'uuid': 3}]}}
+        self.cluster = mock.Mock()
+        self.cluster.api_client.request.side_effect = (
+            lambda method, path: json.dumps(self.pages[path]))
+
+    def test_iter_query_pages(self):
+        results = nvplib.iter_query_pages('/ws.v1/lswitch?fields=uuid',
+                                          self.cluster)
+        self.assertEqual([1, 2, 3], [res['uuid'] for res in results])
+
+    def test_iter_query_pages_prefetches_next_page(self):
+        results = nvplib.iter_query_pages('/ws.v1/lswitch?fields=uuid',
+                                          self.cluster)
+        self.assertEqual({'uuid': 1}, results.next())
+        # Let the request for the second page run
+        eventlet.sleep(0)
+        self.assertEqual(2, self.cluster.api_client.request.call_count)
+        self.assertEqual([{'uuid': 2}, {'uuid': 3}], list(results))
+
+    def test_iter_query_pages_leaves_api_request_pool_alone(self):
+        with mock.patch.object(request_eventlet.NvpApiRequestEventlet,
+                               'API_REQUEST_POOL') as api_pool:
+            results = list(nvplib.iter_query_pages(
+                '/ws.v1/lswitch?fields=uuid', self.cluster))
+        self.assertEqual([1, 2, 3], [res['uuid'] for res in results])
+        self.assertEqual([], api_pool.mock_calls)
+
+    def test_get_all_query_pages(self):
+        self.assertEqual([{'uuid': 1}, {'uuid': 2}, {'uuid': 3}],
+                         nvplib.get_all_query_pages(
+                             '/ws.v1/lswitch?fields=uuid', self.cluster))
@@ -840,6 +840,34 @@ class OvsDhcpAgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                     topic='dhcp_agent.' + DHCP_HOSTA)]
             self.assertEqual(mock_dhcp.call_args_list, expected_calls)
 
+    def test_network_port_bulk_create_notification(self):
+        self.config(agent_notifications_batch=True)
+        self._register_one_agent_state({
+            'binary': 'quantum-dhcp-agent',
+            'host': DHCP_HOSTA,
+            'topic': 'dhcp_agent',
+            'configurations': {'dhcp_driver': 'dhcp_driver',
+                               'use_namespaces': True},
+            'agent_type': constants.AGENT_TYPE_DHCP})
+        with self.network(do_delete=False) as net1:
+            network_id = net1['network']['id']
+            with self.subnet(network=net1, do_delete=False):
+                with mock.patch.object(self.dhcp_notifier,
+                                       'cast') as mock_dhcp:
+                    res = self._create_port_bulk(self.fmt, 3, network_id,
+                                                 'test', True)
+                    ports = self.deserialize(self.fmt, res)['ports']
+        # A single message carries the scheduling of the network and the
+        # creation of every port
+        self.assertEqual(mock_dhcp.call_count, 1)
+        msg = mock_dhcp.call_args[0][1]
+        self.assertEqual(msg['method'], 'notifications_batch')
+        self.assertEqual(
+            [(n['method'], n['args']['payload']) for n in
+             msg['args']['notifications']],
+            [('network_create_end', {'network': {'id': network_id}})] +
+            [('port_create_end', {'port': port}) for port in ports])
+
 
 class OvsL3AgentNotifierTestCase(test_l3_plugin.L3NatTestCaseMixin,
                                  test_agent_ext_plugin.AgentDBTestMixIn,
@@ -15,6 +15,8 @@
 #    under the License.
 # @author: Dan Wendlandt, Nicira, Inc.
 
+import json
+
 import mox
 
 from quantum.agent.linux import ovs_lib, utils
@@ -227,7 +229,7 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
-        ofport = "6"
+        ofport = 6
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
 
@@ -235,18 +237,21 @@ class OVS_Lib_Test(base.BaseTestCase):
                       root_helper=self.root_helper).AndReturn("%s\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = ["map", [["attached-mac", mac],
+                                    ["xs-vif-uuid", vif_id]]]
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
-
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                       "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+            external_ids = ["map", [["attached-mac", mac],
+                                    ["iface-id", vif_id]]]
+
+        # Interfaces of other bridges are listed too
+        interfaces = {"headings": ["name", "ofport", "external_ids"],
+                      "data": [[pname, ofport, external_ids],
+                               ["tap100", 7, external_ids]]}
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids", "list",
+                       "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          json.dumps(interfaces))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                            "param-key=nicira-iface-id", "uuid=" + vif_id],
@@ -268,6 +273,44 @@ class OVS_Lib_Test(base.BaseTestCase):
     def test_get_vif_ports_xen(self):
         self._test_get_vif_ports(True)
 
+    def test_get_vif_port_set(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "tap1\ntap2\npatch-tun\n")
+        external_ids = ["map", [["attached-mac", "ca:fe:de:ad:be:ef"],
+                                ["iface-id", "port1"]]]
+        interfaces = {"headings": ["name", "ofport", "external_ids"],
+                      "data": [["tap1", 1, external_ids],
+                               ["tap2", ["set", []],
+                                ["map", [["attached-mac",
+                                          "ca:fe:de:ad:be:ee"],
+                                         ["iface-id", "port2"]]]],
+                               ["patch-tun", 2, ["map", []]]]}
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids", "list",
+                       "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          json.dumps(interfaces))
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.get_vif_port_set(), set(["port1", "port2"]))
+        self.mox.VerifyAll()
+
+    def test_get_interfaces_unassigned_ofport(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("tap1\n")
+        interfaces = {"headings": ["name", "ofport", "external_ids"],
+                      "data": [["tap1", ["set", []], ["map", []]]]}
+        utils.execute(["ovs-vsctl", self.TO, "--format=json", "--",
+                       "--columns=name,ofport,external_ids", "list",
+                       "Interface"],
+                      root_helper=self.root_helper).AndReturn(
+                          json.dumps(interfaces))
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.get_interfaces(), [("tap1", -1, {})])
+        self.mox.VerifyAll()
+
     def test_clear_db_attribute(self):
         pname = "tap77"
         utils.execute(["ovs-vsctl", self.TO, "clear", "Port",
@@ -98,8 +98,26 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         actual = self.mock_update_ports(vif_port_set, registered_ports)
         self.assertEqual(expected, actual)
 
+    def test_update_ports_uses_active_ovsdb_monitor(self):
+        self.agent.ovsdb_monitor = mock.Mock()
+        self.agent.ovsdb_monitor.is_active = True
+        self.agent.ovsdb_monitor.get_vif_port_set.return_value = set([1])
+        with mock.patch.object(self.agent.int_br,
+                               'get_vif_port_set') as get_vif_port_set:
+            actual = self.agent.update_ports(set())
+        self.assertFalse(get_vif_port_set.called)
+        self.assertEqual(actual['added'], set([1]))
+
+    def test_update_ports_polls_without_active_ovsdb_monitor(self):
+        self.agent.ovsdb_monitor = mock.Mock()
+        self.agent.ovsdb_monitor.is_active = False
+        actual = self.mock_update_ports(set([1]), set())
+        self.assertFalse(self.agent.ovsdb_monitor.get_vif_port_set.called)
+        self.assertEqual(actual['added'], set([1]))
+
     def test_treat_devices_added_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_added([{}]))
 
@@ -107,14 +125,16 @@ class TestOvsQuantumAgent(base.BaseTestCase):
         """
 
         :param details: the details to return for the device
-        :param port: the port that get_vif_port_by_id should return
+        :param port: the VIF port of the device on the bridge
         :param func_name: the function that should be called
         :returns: whether the named function was called
         """
-        with mock.patch.object(self.agent.plugin_rpc, 'get_device_details',
-                               return_value=details):
-            with mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
-                                   return_value=port):
+        port.vif_id = details['device']
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'get_devices_details_list',
+                               return_value=[details]):
+            with mock.patch.object(self.agent.int_br, 'get_vif_ports',
+                                   return_value=[port]):
                 with mock.patch.object(self.agent, func_name) as func:
                     self.assertFalse(self.agent.treat_devices_added([{}]))
         return func.called
@@ -139,14 +159,14 @@ class TestOvsQuantumAgent(base.BaseTestCase):
                                                       'treat_vif_port'))
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='tap1', exists=port_exists)
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
+                               return_value=[details]):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
         self.assertEqual(port_unbound.called, not port_exists)
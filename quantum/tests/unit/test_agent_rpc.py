@@ -20,6 +20,7 @@ from oslo.config import cfg
 
 from quantum.agent import rpc
 from quantum.openstack.common import context
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.tests import base
 
 
@@ -46,6 +47,54 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
+    def _test_bulk_call(self, method):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('quantum.openstack.common.rpc.call') as rpc_call:
+            rpc_call.return_value = ['foo', 'bar']
+            actual_val = getattr(agent, method)(ctxt, ['dev1', 'dev2'],
+                                                'fake_agent_id')
+        self.assertEqual(actual_val, ['foo', 'bar'])
+        self.assertEqual(rpc_call.call_count, 1)
+        msg = rpc_call.call_args[0][2]
+        self.assertEqual(msg['method'], method)
+        self.assertEqual(msg['version'], '1.2')
+        self.assertEqual(msg['args']['devices'], ['dev1', 'dev2'])
+
+    def test_get_devices_details_list(self):
+        self._test_bulk_call('get_devices_details_list')
+
+    def test_update_devices_down(self):
+        self._test_bulk_call('update_devices_down')
+
+    def test_bulk_call_falls_back_to_single_calls(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        unsupported = rpc_common.RemoteError('UnsupportedRpcVersion')
+        with mock.patch('quantum.openstack.common.rpc.call',
+                        side_effect=[unsupported, 'foo', 'bar']) as rpc_call:
+            actual_val = agent.get_devices_details_list(
+                ctxt, ['dev1', 'dev2'], 'fake_agent_id')
+        self.assertEqual(actual_val, ['foo', 'bar'])
+        self.assertEqual(rpc_call.call_count, 3)
+        self.assertFalse(agent.bulk_supported)
+        # The bulk call is not tried again
+        with mock.patch('quantum.openstack.common.rpc.call',
+                        return_value='foo') as rpc_call:
+            agent.update_devices_down(ctxt, ['dev1'], 'fake_agent_id')
+        self.assertEqual(rpc_call.call_args[0][2]['method'],
+                         'update_device_down')
+
+    def test_bulk_call_reraises_other_errors(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        with mock.patch('quantum.openstack.common.rpc.call',
+                        side_effect=rpc_common.RemoteError('ValueError')):
+            self.assertRaises(rpc_common.RemoteError,
+                              agent.get_devices_details_list,
+                              ctxt, ['dev1'], 'fake_agent_id')
+        self.assertTrue(agent.bulk_supported)
+
 
 class AgentPluginReportState(base.BaseTestCase):
     def test_plugin_report_state(self):
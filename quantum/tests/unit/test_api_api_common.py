@@ -18,6 +18,7 @@
 # @author: Zhongyue Luo, Intel Corporation.
 #
 
+import mock
 from testtools import matchers
 from webob import exc
 
@@ -97,3 +98,16 @@ class APICommonTestCase(base.BaseTestCase):
                           self.controller._prepare_request_body,
                           body,
                           params)
+
+
+class SortingEmulatedHelperTestCase(base.BaseTestCase):
+
+    def test_sort_on_several_keys(self):
+        with mock.patch.object(common, 'get_sorts',
+                               return_value=[('a', True), ('b', False)]):
+            helper = common.SortingEmulatedHelper(mock.Mock(), {})
+        items = [{'a': 2, 'b': 1, 'id': 1}, {'a': 1, 'b': 1, 'id': 2},
+                 {'a': 2, 'b': 3, 'id': 3}, {'a': 1, 'b': 2, 'id': 4},
+                 {'a': 1, 'b': 2, 'id': 5}]
+        self.assertEqual([item['id'] for item in helper.sort(items)],
+                         [4, 5, 2, 3, 1])
@@ -0,0 +1,180 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from quantum.common import rpc as q_rpc
+from quantum import context
+from quantum.openstack.common.rpc import proxy
+from quantum.tests import base
+
+
+class FakeProxy(proxy.RpcProxy):
+    BATCH_RPC_API_VERSION = '1.1'
+
+    def __init__(self):
+        super(FakeProxy, self).__init__(topic='agent',
+                                        default_version='1.0')
+        self.cast = mock.Mock()
+        self.fanout_cast = mock.Mock()
+
+
+class TestNotificationBatch(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNotificationBatch, self).setUp()
+        self.proxy = FakeProxy()
+        self.context = context.Context('user', 'tenant')
+
+    def test_cast_without_batch(self):
+        msg = self.proxy.make_msg('port_update_end', payload={})
+        q_rpc.batched_cast(self.proxy, self.context, msg, topic='agent.a')
+        self.proxy.cast.assert_called_once_with(self.context, msg,
+                                                topic='agent.a')
+
+    def test_casts_are_held_until_the_end(self):
+        msg = self.proxy.make_msg('port_update_end', payload={})
+        with q_rpc.batch_notifications(self.context):
+            q_rpc.batched_cast(self.proxy, self.context, msg,
+                               topic='agent.a')
+            self.assertFalse(self.proxy.cast.called)
+        self.proxy.cast.assert_called_once_with(self.context, msg,
+                                                topic='agent.a')
+
+    def test_identical_casts_are_sent_once(self):
+        with q_rpc.batch_notifications(self.context):
+            for i in range(3):
+                q_rpc.batched_fanout_cast(
+                    self.proxy, self.context,
+                    self.proxy.make_msg('provider_updated'), version='1.1',
+                    topic='agent')
+        self.proxy.fanout_cast.assert_called_once_with(
+            self.context, self.proxy.make_msg('provider_updated'),
+            version='1.1', topic='agent')
+
+    def test_merged_casts(self):
+        with q_rpc.batch_notifications(self.context):
+            for groups in (['sg1'], ['sg2', 'sg1'], ['sg3']):
+                q_rpc.batched_fanout_cast(
+                    self.proxy, self.context,
+                    self.proxy.make_msg('member_updated',
+                                        security_groups=groups),
+                    merge='security_groups', topic='agent')
+            q_rpc.batched_fanout_cast(
+                self.proxy, self.context,
+                self.proxy.make_msg('member_updated',
+                                    security_groups=['sg4']),
+                merge='security_groups', topic='other_agent')
+        self.assertEqual(self.proxy.fanout_cast.call_args_list, [
+            mock.call(self.context,
+                      self.proxy.make_msg(
+                          'member_updated',
+                          security_groups=['sg1', 'sg2', 'sg3']),
+                      topic='agent'),
+            mock.call(self.context,
+                      self.proxy.make_msg('member_updated',
+                                          security_groups=['sg4']),
+                      topic='other_agent')])
+
+    def test_merged_dicts_keep_last_version(self):
+        with q_rpc.batch_notifications(self.context):
+            for routers in ([{'id': 'r1', 'rev': 1}],
+                            [{'id': 'r2'}, {'id': 'r1', 'rev': 2}]):
+                q_rpc.batched_cast(
+                    self.proxy, self.context,
+                    self.proxy.make_msg('routers_updated', routers=routers),
+                    merge='routers', topic='agent.a')
+        self.proxy.cast.assert_called_once_with(
+            self.context,
+            self.proxy.make_msg('routers_updated',
+                                routers=[{'id': 'r1', 'rev': 2},
+                                         {'id': 'r2'}]),
+            topic='agent.a')
+
+    def test_casts_to_same_topic_are_sent_one_by_one(self):
+        msgs = [self.proxy.make_msg('port_create_end',
+                                    payload={'port': {'id': i}})
+                for i in range(2)]
+        with q_rpc.batch_notifications(self.context):
+            for msg in msgs:
+                q_rpc.batched_cast(self.proxy, self.context, msg,
+                                   topic='agent.a')
+        self.assertEqual(self.proxy.cast.call_args_list,
+                         [mock.call(self.context, msg, topic='agent.a')
+                          for msg in msgs])
+
+    def test_casts_to_same_topic_are_batched(self):
+        self.config(agent_notifications_batch=True)
+        msgs = [self.proxy.make_msg('port_create_end',
+                                    payload={'port': {'id': i}})
+                for i in range(3)]
+        with q_rpc.batch_notifications(self.context):
+            for msg in msgs:
+                q_rpc.batched_cast(self.proxy, self.context, msg,
+                                   topic='agent.a')
+        self.proxy.cast.assert_called_once_with(
+            self.context,
+            self.proxy.make_msg('notifications_batch', notifications=msgs),
+            topic='agent.a', version='1.1')
+
+    def test_no_batch_message_without_batch_version(self):
+        self.config(agent_notifications_batch=True)
+        self.proxy.BATCH_RPC_API_VERSION = None
+        msgs = [self.proxy.make_msg('port_create_end',
+                                    payload={'port': {'id': i}})
+                for i in range(2)]
+        with q_rpc.batch_notifications(self.context):
+            for msg in msgs:
+                q_rpc.batched_cast(self.proxy, self.context, msg,
+                                   topic='agent.a')
+        self.assertEqual(self.proxy.cast.call_args_list,
+                         [mock.call(self.context, msg, topic='agent.a')
+                          for msg in msgs])
+
+    def test_nested_batches_flush_once(self):
+        msg = self.proxy.make_msg('port_update_end', payload={})
+        with q_rpc.batch_notifications(self.context):
+            with q_rpc.batch_notifications(self.context):
+                q_rpc.batched_cast(self.proxy, self.context, msg,
+                                   topic='agent.a')
+            self.assertFalse(self.proxy.cast.called)
+        self.assertEqual(self.proxy.cast.call_count, 1)
+
+    def test_elevated_context_after_batch(self):
+        msg = self.proxy.make_msg('port_update_end', payload={})
+        with q_rpc.batch_notifications(self.context):
+            admin_context = self.context.elevated()
+        q_rpc.batched_cast(self.proxy, admin_context, msg, topic='agent.a')
+        self.proxy.cast.assert_called_once_with(admin_context, msg,
+                                                topic='agent.a')
+
+
+class TestNotificationsBatchMixin(base.BaseTestCase):
+
+    def test_notifications_batch(self):
+        agent = q_rpc.NotificationsBatchMixin()
+        agent.port_create_end = mock.Mock(side_effect=[Exception(), None])
+        ctx = mock.Mock()
+        agent.notifications_batch(
+            ctx,
+            notifications=[{'method': 'port_create_end',
+                            'namespace': None,
+                            'args': {'payload': {'port': {'id': i}}}}
+                           for i in range(2)])
+        self.assertEqual(agent.port_create_end.call_args_list,
+                         [mock.call(ctx, payload={'port': {'id': i}})
+                          for i in range(2)])
@@ -0,0 +1,126 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+
+from quantum import context
+from quantum.db import db_base_plugin_v2
+from quantum.db import ipam_db
+from quantum.db import models_v2
+from quantum.tests import base
+from quantum.tests.unit import test_db_plugin
+
+BITMAP_DRIVER = 'quantum.db.ipam_db.BitmapIpamDriver'
+
+
+class TestBitmapEncoding(base.BaseTestCase):
+
+    def test_encode_decode(self):
+        for bits in (0, 1, 0xff, 0x100, 1 << 300 | 5):
+            self.assertEqual(
+                bits, ipam_db._decode_bitmap(ipam_db._encode_bitmap(bits)))
+
+    def test_encode_is_compact(self):
+        self.assertEqual('', ipam_db._encode_bitmap(0))
+        self.assertEqual('\x01\x00', ipam_db._encode_bitmap(0x100))
+
+    def test_lowest_free(self):
+        self.assertEqual(0, ipam_db._lowest_free(0))
+        self.assertEqual(1, ipam_db._lowest_free(0x1))
+        self.assertEqual(2, ipam_db._lowest_free(0xb))
+        self.assertEqual(8, ipam_db._lowest_free(0xff))
+
+
+class IpamDriverTestMixin(object):
+
+    def _generate_ips(self, subnet, count):
+        ctx = context.get_admin_context()
+        with ctx.session.begin(subtransactions=True):
+            return [ip['ip_address'] for ip in
+                    db_base_plugin_v2.QuantumDbPluginV2._generate_ips(
+                        ctx, [subnet['subnet']], count)]
+
+    def test_generate_ips_in_one_pass(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                             self._generate_ips(subnet, 3))
+            self.assertEqual(['10.0.0.5', '10.0.0.6'],
+                             self._generate_ips(subnet, 2))
+
+    def test_generate_ips_exhausted(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            self.assertRaises(db_base_plugin_v2.q_exc.
+                              IpAddressGenerationFailure,
+                              self._generate_ips, subnet, 6)
+
+
+class TestRangeIpamPortsV2(IpamDriverTestMixin,
+                           test_db_plugin.QuantumDbPluginV2TestCase):
+    pass
+
+
+class TestBitmapIpamPortsV2(IpamDriverTestMixin, test_db_plugin.TestPortsV2):
+
+    def setUp(self):
+        super(TestBitmapIpamPortsV2, self).setUp()
+        cfg.CONF.set_override('ipam_driver', BITMAP_DRIVER)
+
+    def test_bitmap_built_for_range_pools(self):
+        cfg.CONF.clear_override('ipam_driver')
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet) as port:
+                self.assertEqual('10.0.0.2',
+                                 port['port']['fixed_ips'][0]['ip_address'])
+                cfg.CONF.set_override('ipam_driver', BITMAP_DRIVER)
+                with self.port(subnet=subnet) as port2:
+                    self.assertEqual(
+                        '10.0.0.3',
+                        port2['port']['fixed_ips'][0]['ip_address'])
+                    ctx = context.get_admin_context()
+                    self.assertEqual(
+                        0, ctx.session.query(
+                            models_v2.IPAvailabilityRange).count())
+                    self.assertEqual(
+                        1, ctx.session.query(
+                            ipam_db.IPAvailabilityBitmap).count())
+
+    def test_bitmap_built_while_waiting_for_pool_lock(self):
+        cfg.CONF.clear_override('ipam_driver')
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet):
+                cfg.CONF.set_override('ipam_driver', BITMAP_DRIVER)
+                driver = ipam_db.get_ipam_driver()
+                ctx = context.get_admin_context()
+                pool = ctx.session.query(models_v2.IPAllocationPool).one()
+                with ctx.session.begin(subtransactions=True):
+                    built = driver._get_bitmap(ctx, pool)
+                # The first lookup happened before the concurrent build
+                with mock.patch.object(driver, '_lock_bitmap',
+                                       side_effect=[None, built]):
+                    with mock.patch.object(ctx.session, 'add') as add:
+                        with ctx.session.begin(subtransactions=True):
+                            bitmap = driver._get_bitmap(ctx, pool)
+                self.assertIs(built, bitmap)
+                self.assertFalse(add.called)
+
+
+class TestBitmapIpamSubnetsV2(test_db_plugin.TestSubnetsV2):
+
+    def setUp(self):
+        super(TestBitmapIpamSubnetsV2, self).setUp()
+        cfg.CONF.set_override('ipam_driver', BITMAP_DRIVER)
@@ -858,6 +858,47 @@ class TestPortsV2(QuantumDbPluginV2TestCase):
                 for p in self.deserialize(self.fmt, res)['ports']:
                     self._delete('ports', p['id'])
 
+    def test_create_ports_bulk_native_allocates_in_one_pass(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port_bulk(self.fmt, 3, net_id, 'test', True)
+            self.assertEqual(res.status_int, 201)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(['test_0', 'test_1', 'test_2'],
+                             [p['name'] for p in ports])
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                             [p['fixed_ips'][0]['ip_address']
+                              for p in ports])
+            self.assertEqual(3, len(set(p['mac_address'] for p in ports)))
+            for p in ports:
+                port = self._show('ports', p['id'])
+                self.assertEqual(p['fixed_ips'], port['port']['fixed_ips'])
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_native_duplicate_ip(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            fixed_ips = [{'subnet_id': subnet['subnet']['id'],
+                          'ip_address': '10.0.0.5'}]
+            res = self._create_port_bulk(
+                self.fmt, 2, subnet['subnet']['network_id'], 'test', True,
+                override={0: {'fixed_ips': fixed_ips},
+                          1: {'fixed_ips': fixed_ips}})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
+    def test_create_ports_bulk_native_duplicate_mac(self):
+        if self._skip_native_bulk:
+            self.skipTest("Plugin does not support native bulk port create")
+        with self.network() as net:
+            mac = {'mac_address': '00:11:22:33:44:55'}
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True,
+                                         override={0: mac, 1: mac})
+            self._validate_behavior_on_bulk_failure(res, 'ports', 409)
+
     def test_create_ports_bulk_wrong_input(self):
         with self.network() as net:
             overrides = {1: {'admin_state_up': 'doh'}}
@@ -3453,6 +3494,49 @@ class TestSubnetsV2(QuantumDbPluginV2TestCase):
         self.assertEqual(res.status_int, 204)
 
 
+class TestCollectionProjection(QuantumDbPluginV2TestCase):
+
+    def test_list_column_fields(self):
+        with self.network(name='net1') as net:
+            with self.subnet(network=net) as subnet:
+                with self.port(subnet=subnet) as port:
+                    res = self._list(
+                        'ports', query_params='fields=id&fields=mac_address')
+                    self.assertEqual(
+                        res['ports'],
+                        [{'id': port['port']['id'],
+                          'mac_address': port['port']['mac_address']}])
+
+    def test_get_projection(self):
+        plugin = QuantumManager.get_plugin()
+        self.assertEqual(
+            plugin._get_projection(models_v2.Network,
+                                   plugin._make_network_dict,
+                                   ['id', 'name', 'id']),
+            ['id', 'name'])
+        # Subnet ids are read from another table
+        self.assertIsNone(
+            plugin._get_projection(models_v2.Network,
+                                   plugin._make_network_dict,
+                                   ['id', 'subnets']))
+        self.assertIsNone(
+            plugin._get_projection(models_v2.Network,
+                                   plugin._make_network_dict, None))
+        self.assertIsNone(
+            plugin._get_projection(models_v2.Network, mock.Mock(), ['id']))
+
+    def test_projection_matches_objects(self):
+        fields = ['id', 'name', 'admin_state_up', 'shared']
+        with contextlib.nested(self.network(name='net1'),
+                               self.network(name='net2')):
+            plugin = QuantumManager.get_plugin()
+            ctx = context.get_admin_context()
+            expected = [plugin._fields(network, fields)
+                        for network in plugin.get_networks(ctx)]
+            self.assertEqual(plugin.get_networks(ctx, fields=fields),
+                             expected)
+
+
 class DbModelTestCase(base.BaseTestCase):
     """ DB model tests """
     def test_repr(self):
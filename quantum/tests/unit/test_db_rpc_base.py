@@ -15,8 +15,10 @@
 
 import mock
 
+from quantum import context
 from quantum.db import dhcp_rpc_base
 from quantum.tests import base
+from quantum.tests.unit import test_db_plugin
 
 
 class TestDhcpRpcCallackMixin(base.BaseTestCase):
@@ -64,6 +66,36 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
         self.assertEqual(retval['subnets'], subnet_retval)
         self.assertEqual(retval['ports'], port_retval)
 
+    def test_get_networks_info(self):
+        self.plugin.networks_info_from_db = False
+        self.plugin.get_networks.return_value = [dict(id='a'), dict(id='b')]
+        self.plugin.get_subnets.return_value = []
+        self.plugin.get_ports.return_value = []
+
+        retval = self.callbacks.get_networks_info(mock.Mock(),
+                                                  network_ids=['a', 'b'])
+        self.assertEqual([network['id'] for network in retval], ['a', 'b'])
+        self.plugin.assert_has_calls(
+            [mock.call.get_networks(mock.ANY, filters=dict(id=['a', 'b'])),
+             mock.call.get_subnets(mock.ANY, filters=dict(network_id=['a'])),
+             mock.call.get_ports(mock.ANY, filters=dict(network_id=['a']))])
+
+    def test_get_networks_info_from_db(self):
+        self.plugin.networks_info_from_db = True
+        ctx = mock.Mock()
+        with mock.patch.object(self.callbacks,
+                               '_get_networks_info_from_db') as from_db:
+            retval = self.callbacks.get_networks_info(ctx,
+                                                      network_ids=['a'])
+        from_db.assert_called_once_with(ctx, self.plugin, ['a'])
+        self.assertEqual(retval, from_db.return_value)
+        self.assertFalse(self.plugin.get_networks.called)
+
+    def test_get_networks_info_no_networks(self):
+        self.assertEqual(
+            self.callbacks.get_networks_info(mock.Mock(), network_ids=[]), [])
+        self.assertFalse(self.plugin.get_networks.called)
+
     def _test_get_dhcp_port_helper(self, port_retval, other_expectations=[],
                                    update_port=None, create_port=None):
         subnets_retval = [dict(id='a', enable_dhcp=True),
@@ -148,3 +180,25 @@ class TestDhcpRpcCallackMixin(base.BaseTestCase):
                                                        device_id=['devid'])),
             mock.call.update_port(mock.ANY, 'port_id',
                                   dict(port=port_update))])
+
+
+class TestDhcpRpcCallbackMixinDb(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def test_get_networks_info_matches_get_network_info(self):
+        callbacks = dhcp_rpc_base.DhcpRpcCallbackMixin()
+        ctx = context.get_admin_context()
+        with self.subnet(dns_nameservers=['8.8.8.8'],
+                         host_routes=[{'destination': '10.1.0.0/16',
+                                       'nexthop': '10.0.0.2'}]) as subnet:
+            with self.port(subnet=subnet):
+                with self.network() as other:
+                    network_ids = [subnet['subnet']['network_id'],
+                                   other['network']['id']]
+                    expected = [
+                        callbacks.get_network_info(ctx, network_id=net_id)
+                        for net_id in network_ids]
+                    networks = callbacks.get_networks_info(
+                        ctx, network_ids=network_ids + ['unknown'])
+        key = lambda network: network['id']
+        self.assertEqual(sorted(networks, key=key),
+                         sorted(expected, key=key))
@@ -33,6 +33,7 @@ from quantum.agent.linux import interface
 from quantum.common import constants
 from quantum.common import exceptions
 from quantum.openstack.common import jsonutils
+from quantum.openstack.common.rpc import common as rpc_common
 from quantum.tests import base
 
 
@@ -265,6 +266,9 @@ class TestDhcpAgent(base.BaseTestCase):
         with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
             mock_plugin = mock.Mock()
             mock_plugin.get_active_networks.return_value = active_networks
+            networks = [dhcp_agent.DictModel(dict(id=net_id))
+                        for net_id in active_networks]
+            mock_plugin.get_networks_info.return_value = networks
             plug.return_value = mock_plugin
 
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
@@ -278,7 +282,7 @@ class TestDhcpAgent(base.BaseTestCase):
                 dhcp.sync_state()
 
                 exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
+                    mock.call(net.id, net) for net in networks]
 
                 diff = set(known_networks) - set(active_networks)
                 exp_disable = [mock.call(net_id) for net_id in diff]
@@ -309,6 +313,41 @@ class TestDhcpAgent(base.BaseTestCase):
                 self.assertTrue(log.called)
                 self.assertTrue(dhcp.needs_resync)
 
+    def test_sync_state_network_error(self):
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks.return_value = ['a', 'b']
+            mock_plugin.get_networks_info.return_value = []
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp, 'refresh_dhcp_helper',
+                                   side_effect=[Exception(), None]) as refresh:
+                with mock.patch.object(dhcp_agent.LOG, 'exception'):
+                    dhcp.sync_state()
+                # A failing network does not keep the others down
+                self.assertEqual(refresh.call_count, 2)
+                self.assertTrue(dhcp.needs_resync)
+
+    def test_sync_state_fetches_networks_at_once(self):
+        with mock.patch('quantum.agent.dhcp_agent.DhcpPluginApi') as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks.return_value = ['a', 'b']
+            network = dhcp_agent.DictModel(dict(id='a'))
+            # 'b' was deleted after get_active_networks
+            mock_plugin.get_networks_info.return_value = [network]
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp, 'refresh_dhcp_helper') as refresh:
+                dhcp.sync_state()
+            self.assertEqual(
+                sorted(mock_plugin.get_networks_info.call_args[0][0]),
+                ['a', 'b'])
+            refresh.assert_has_calls([mock.call('a', network),
+                                      mock.call('b', None)], any_order=True)
+            self.assertFalse(mock_plugin.get_network_info.called)
+
     def test_periodic_resync(self):
         dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
@@ -426,6 +465,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache = mock.Mock()
         cache_cls.return_value = self.cache
 
+        cfg.CONF.set_override('port_events_window', 0)
+
         self.dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         self.call_driver_p = mock.patch.object(self.dhcp, 'call_driver')
 
@@ -750,6 +791,24 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_port_events_are_coalesced(self):
+        cfg.CONF.set_override('port_events_window', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port1)))
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port2)))
+            spawn_after.assert_called_once_with(
+                0.5, self.dhcp._reload_allocations, fake_network.id)
+            self.assertFalse(self.call_driver.called)
+
+            self.dhcp._reload_allocations(fake_network.id)
+            self.call_driver.assert_called_once_with('reload_allocations',
+                                                     fake_network)
+            # Later events need another reload
+            self.dhcp.port_update_end(None, dict(port=vars(fake_port2)))
+            self.assertEqual(spawn_after.call_count, 2)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
@@ -791,6 +850,38 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
                                               network_id='netid',
                                               host='foo')
 
+    def test_get_networks_info(self):
+        self.call.return_value = [dict(id='a'), dict(id='b')]
+        retval = self.proxy.get_networks_info(['a', 'b'])
+        self.assertEqual([network.id for network in retval], ['a', 'b'])
+        self.make_msg.assert_called_once_with('get_networks_info',
+                                              network_ids=['a', 'b'],
+                                              host='foo')
+        self.assertEqual(self.call.call_args[1]['version'],
+                         dhcp_agent.DhcpPluginApi.BULK_RPC_API_VERSION)
+
+    def test_get_networks_info_falls_back(self):
+        unsupported = rpc_common.RemoteError('UnsupportedRpcVersion')
+        not_found = rpc_common.RemoteError('NetworkNotFound')
+        self.call.side_effect = [unsupported, dict(id='a'), not_found,
+                                 dict(id='a')]
+        retval = self.proxy.get_networks_info(['a', 'b'])
+        self.assertEqual([network.id for network in retval], ['a'])
+        self.assertFalse(self.proxy.bulk_supported)
+        self.assertEqual(self.call.call_count, 3)
+        # The plugin is not asked for the bulk call again
+        self.proxy.get_networks_info(['a'])
+        self.assertEqual(self.call.call_count, 4)
+        self.assertEqual(self.make_msg.call_args,
+                         mock.call('get_network_info', network_id='a',
+                                   host='foo'))
+
+    def test_get_networks_info_reraises(self):
+        self.call.side_effect = rpc_common.RemoteError('RuntimeError')
+        self.assertRaises(rpc_common.RemoteError,
+                          self.proxy.get_networks_info, ['a'])
+        self.assertTrue(self.proxy.bulk_supported)
+
     def test_get_dhcp_port(self):
         self.call.return_value = dict(a=1)
         retval = self.proxy.get_dhcp_port('netid', 'devid')
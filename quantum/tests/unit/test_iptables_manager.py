@@ -97,13 +97,7 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               bn, bn, bn, bn)), root_helper=self.root_helper
                               ).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'nat'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=nat_dump,
-                              root_helper=self.root_helper).AndReturn(None)
-
+        # nat is left untouched the second time, it did not change
         self.mox.ReplayAll()
 
         self.iptables.ipv4['filter'].add_chain('filter')
@@ -162,13 +156,7 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               bn)), root_helper=self.root_helper
                               ).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'nat'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=nat_dump,
-                              root_helper=self.root_helper).AndReturn(None)
-
+        # nat is left untouched the second time, it did not change
         self.mox.ReplayAll()
 
         self.iptables.ipv4['filter'].add_chain('filter')
@@ -226,13 +214,7 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                               bn, bn, bn, bn, bn, bn, bn, bn, bn, bn, bn)),
                               root_helper=self.root_helper).AndReturn(None)
 
-        self.iptables.execute(['iptables-save', '-t', 'filter'],
-                              root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(['iptables-restore'],
-                              process_input=filter_dump,
-                              root_helper=self.root_helper).AndReturn(None)
-
+        # filter is left untouched the second time, it did not change
         self.iptables.execute(['iptables-save', '-t', 'nat'],
                               root_helper=self.root_helper).AndReturn('')
 
@@ -270,6 +252,84 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.iptables.apply()
         self.mox.VerifyAll()
 
+    def _replay_apply(self):
+        for table in ('filter', 'nat'):
+            self.iptables.execute(['iptables-save', '-t', table],
+                                  root_helper=self.root_helper).AndReturn('')
+            self.iptables.execute(['iptables-restore'],
+                                  process_input=mox.IgnoreArg(),
+                                  root_helper=self.root_helper
+                                  ).AndReturn(None)
+
+    def test_apply_unchanged_tables(self):
+        self._replay_apply()
+        self.mox.ReplayAll()
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.apply()
+        # Nothing changed, neither iptables-save nor -restore are run
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_apply_wrapped_chain_rules(self):
+        bn = iptables_manager.binary_name
+        self._replay_apply()
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=(
+                                  '*filter\n:%s-filter - [0:0]\n'
+                                  '-A %s-filter -j DROP\n'
+                                  '-A %s-filter -j ACCEPT\n'
+                                  'COMMIT\n' % (bn, bn, bn)),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        # Only the rules of a wrapped chain changed, that chain alone is
+        # rewritten without saving the table
+        self.iptables.ipv4['filter'].add_rule('filter', '-j ACCEPT')
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_apply_unwrapped_rules(self):
+        self._replay_apply()
+        self.iptables.execute(['iptables-save', '-t', 'filter'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        # Unwrapped chains are shared with other components, the table is
+        # saved and restored as a whole
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j ACCEPT',
+                                              wrap=False)
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
+    def test_apply_failure_restores_table(self):
+        self._replay_apply()
+        self.iptables.execute(['iptables-restore', '--noflush'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper
+                              ).AndRaise(RuntimeError())
+        self.iptables.execute(['iptables-save', '-t', 'filter'],
+                              root_helper=self.root_helper).AndReturn('')
+        self.iptables.execute(['iptables-restore'],
+                              process_input=mox.IgnoreArg(),
+                              root_helper=self.root_helper).AndReturn(None)
+        self.mox.ReplayAll()
+
+        self.iptables.apply()
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j ACCEPT')
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        # The state of the filter table is unknown after the failure, it
+        # is restored as a whole
+        self.iptables.apply()
+        self.mox.VerifyAll()
+
     def test_add_rule_to_a_nonexistent_chain(self):
         self.assertRaises(LookupError, self.iptables.ipv4['filter'].add_rule,
                           'nonexistent', '-j DROP')
@@ -23,6 +23,7 @@ from oslo.config import cfg
 from quantum.agent.common import config as agent_config
 from quantum.agent import l3_agent
 from quantum.agent.linux import interface
+from quantum.agent.linux import iptables_manager
 from quantum.common import config as base_config
 from quantum.common import constants as l3_constants
 from quantum.openstack.common import uuidutils
@@ -362,6 +363,77 @@ class TestBasicRouterOperations(base.BaseTestCase):
         del router['gw_port']
         agent.process_router(ri)
 
+    def _prepare_router_with_floating_ips(self, agent, floating_ips):
+        router_id = _uuid()
+        ex_gw_port = {'id': _uuid(),
+                      'network_id': _uuid(),
+                      'fixed_ips': [{'ip_address': '19.4.4.4',
+                                     'subnet_id': _uuid()}],
+                      'subnet': {'cidr': '19.4.4.0/24',
+                                 'gateway_ip': '19.4.4.1'}}
+        router = {'id': router_id,
+                  l3_constants.FLOATINGIP_KEY: floating_ips,
+                  l3_constants.INTERFACE_KEY: [],
+                  'routes': [],
+                  'gw_port': ex_gw_port}
+        return l3_agent.RouterInfo(router_id, self.conf.root_helper,
+                                   self.conf.use_namespaces, router=router)
+
+    def testProcessRouterAppliesFloatingIPChangesOnly(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        fips = [{'id': _uuid(),
+                 'floating_ip_address': '8.8.8.%d' % i,
+                 'fixed_ip_address': '7.7.7.%d' % i,
+                 'port_id': _uuid()} for i in range(3)]
+        ri = self._prepare_router_with_floating_ips(agent, fips)
+        with mock.patch('quantum.agent.linux.ip_lib.IPDevice') as device_cls:
+            device = device_cls.return_value
+            device.addr.list.return_value = []
+            with mock.patch.object(ri.iptables_manager, '_apply') as apply:
+                agent.process_router(ri)
+                # Every change is applied at once
+                self.assertEqual(apply.call_count, 1)
+            # The gateway addresses are only read once
+            self.assertEqual(device.addr.list.call_count, 1)
+            self.assertEqual(device.addr.add.call_count, 3)
+
+            # remap one floating IP, disassociate another one
+            fips = copy.deepcopy(fips)
+            fips[0]['fixed_ip_address'] = '7.7.7.100'
+            fips[1]['port_id'] = None
+            ri.router[l3_constants.FLOATINGIP_KEY] = fips
+            device.reset_mock()
+            with mock.patch.object(agent, 'floating_ip_added') as added:
+                agent.process_router(ri)
+            self.assertFalse(added.called)
+            device.addr.delete.assert_called_once_with(4, '8.8.8.1/32')
+            self.assertFalse(device.addr.add.called)
+        nat = ri.iptables_manager.ipv4['nat']
+        rules = [str(rule) for rule in nat.rules]
+        self.assertIn('-A %s-PREROUTING -d 8.8.8.0 -j DNAT --to 7.7.7.100' %
+                      iptables_manager.binary_name, rules)
+        self.assertNotIn('-A %s-PREROUTING -d 8.8.8.0 -j DNAT --to 7.7.7.0' %
+                         iptables_manager.binary_name, rules)
+        self.assertEqual(sorted(ri.floating_ips),
+                         sorted([fips[0]['id'], fips[2]['id']]))
+
+    def testProcessRouterGatewayRemovalRemovesFloatingIPs(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        fips = [{'id': _uuid(),
+                 'floating_ip_address': '8.8.8.8',
+                 'fixed_ip_address': '7.7.7.7',
+                 'port_id': _uuid()}]
+        ri = self._prepare_router_with_floating_ips(agent, fips)
+        with mock.patch('quantum.agent.linux.ip_lib.IPDevice'):
+            agent.process_router(ri)
+            del ri.router['gw_port']
+            with mock.patch.object(agent,
+                                   'floating_ip_removed') as removed:
+                agent.process_router(ri)
+        self.assertEqual(removed.call_count, 1)
+        self.assertEqual(ri.floating_ips, {})
+        self.assertIsNone(ri.ex_gw_port)
+
     def testRoutersWithAdminStateDown(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = None
@@ -384,12 +456,112 @@ class TestBasicRouterOperations(base.BaseTestCase):
         agent._process_routers(routers)
 
         agent.router_deleted(None, routers[0]['id'])
+        agent._process_router_update(agent._queue.get())
         # verify that remove is called
         self.assertEqual(self.mock_ip.get_devices.call_count, 1)
 
         self.device_exists.assert_has_calls(
             [mock.call(self.conf.external_network_bridge)])
 
+    def testRouterUpdatesQueuedByPriority(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [{'id': _uuid()}, {'id': _uuid()}]
+        agent._queue.add(l3_agent.RouterUpdate('sync',
+                                               l3_agent.PRIORITY_SYNC))
+        agent.routers_updated(None, routers)
+        agent.router_deleted(None, 'deleted')
+        updates = [agent._queue.get() for i in range(4)]
+        self.assertEqual([update.router_id for update in updates],
+                         [routers[0]['id'], routers[1]['id'], 'deleted',
+                          'sync'])
+        self.assertEqual(updates[0].router, routers[0])
+        self.assertTrue(updates[2].deleted)
+        self.assertEqual(len(agent._queue), 0)
+
+    def testRouterUpdateQueueKeepsLatestUpdate(self):
+        queue = l3_agent.RouterUpdateQueue()
+        queue.add(l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC,
+                                        router='old', timestamp=1))
+        queue.add(l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC,
+                                        router='new', timestamp=2))
+        # Older data do not replace newer ones
+        queue.add(l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC,
+                                        router='stale', timestamp=0))
+        self.assertEqual(len(queue), 1)
+        update = queue.get()
+        self.assertEqual(update.router, 'new')
+        self.assertEqual(update.priority, l3_agent.PRIORITY_RPC)
+
+    def testRouterUpdateQueueSerializesRouter(self):
+        queue = l3_agent.RouterUpdateQueue()
+        queue.add(l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC))
+        self.assertEqual(queue.get().router_id, 'r1')
+        queue.add(l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC))
+        queue.add(l3_agent.RouterUpdate('r2', l3_agent.PRIORITY_SYNC))
+        # r1 is still being processed
+        self.assertEqual(queue.get().router_id, 'r2')
+        self.assertEqual(queue._pop(), None)
+        queue.task_done('r1')
+        self.assertEqual(queue.get().router_id, 'r1')
+
+    def testProcessRouterUpdateSkipsOutdatedUpdate(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._last_processed['r1'] = 10
+        agent.router_info['r1'] = mock.Mock()
+        with mock.patch.object(agent, '_process_routers') as process:
+            agent._process_router_update(
+                l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_SYNC,
+                                      router={'id': 'r1'}, timestamp=5))
+            self.assertFalse(process.called)
+            agent._process_router_update(
+                l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC,
+                                      router={'id': 'r1'}, timestamp=15))
+            process.assert_called_once_with([{'id': 'r1'}])
+        self.assertEqual(agent._last_processed['r1'], 15)
+
+    def testProcessRouterUpdateForgetsRemovedRouter(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info['r1'] = mock.Mock()
+        agent.router_info['r2'] = mock.Mock()
+        agent._queue.add(l3_agent.RouterUpdate('r2', l3_agent.PRIORITY_RPC,
+                                               router={'id': 'r2'},
+                                               timestamp=20))
+        with mock.patch.object(agent, '_router_removed') as removed:
+            removed.side_effect = agent.router_info.pop
+            for router_id in ('r1', 'r2'):
+                agent._process_router_update(
+                    l3_agent.RouterUpdate(router_id, l3_agent.PRIORITY_RPC,
+                                          deleted=True, timestamp=10))
+        self.assertNotIn('r1', agent._last_processed)
+        # The queued update of r2 is still checked against the removal
+        self.assertEqual(agent._last_processed['r2'], 10)
+
+    def testProcessRouterUpdateFailureTriggersFullSync(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.fullsync = False
+        with mock.patch.object(agent, '_process_routers',
+                               side_effect=Exception()):
+            agent._process_router_update(
+                l3_agent.RouterUpdate('r1', l3_agent.PRIORITY_RPC,
+                                      router={'id': 'r1'}))
+        self.assertTrue(agent.fullsync)
+        # The router can be processed again
+        self.assertEqual(agent._queue._in_progress, set())
+
+    def testSyncRoutersQueuesUpdatesAndRemovals(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent.router_info['stale'] = mock.Mock()
+        router = {'id': _uuid()}
+        self.plugin_api.get_routers.return_value = [router]
+        agent._sync_routers_task(agent.context)
+        self.assertFalse(agent.fullsync)
+        updates = [agent._queue.get() for i in range(2)]
+        self.assertEqual(set(update.router_id for update in updates),
+                         set([router['id'], 'stale']))
+        for update in updates:
+            self.assertEqual(update.priority, l3_agent.PRIORITY_SYNC)
+            self.assertEqual(update.deleted, update.router_id == 'stale')
+
     def testDestroyNamespace(self):
 
         class FakeDev(object):
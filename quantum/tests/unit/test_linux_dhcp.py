@@ -583,6 +583,26 @@ tag:tag1,option:classless-static-route,%s,%s""".lstrip() % (fake_v6,
         self.execute.assert_called_once_with(exp_args, root_helper='sudo',
                                              check_exit_code=True)
 
+    def test_reload_allocations_unchanged(self):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(), namespace='qdhcp-ns',
+                          version=float(2.59))
+        with mock.patch.object(dm, '_output_hosts_file'):
+            with mock.patch.object(dm, '_output_opts_file'):
+                dm.reload_allocations()
+        self.assertFalse(self.execute.called)
+
+    def test_replace_conf_file(self):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork())
+        with mock.patch('__builtin__.open') as mock_open:
+            mock_open.return_value.__enter__ = lambda s: s
+            mock_open.return_value.__exit__ = mock.Mock()
+            mock_open.return_value.read.return_value = 'data'
+            self.assertFalse(dm._replace_conf_file('/foo/host', 'data'))
+            self.assertFalse(self.safe.called)
+            self.assertTrue(dm._replace_conf_file('/foo/host', 'new data'))
+        self.safe.assert_called_once_with('/foo/host', 'new data')
+        self.assertTrue(dm.conf_files_changed)
+
     def test_reload_allocations_stale_pid(self):
         exp_host_name = '/dhcp/cccccccc-cccc-cccc-cccc-cccccccccccc/host'
         exp_host_data = """
@@ -0,0 +1,150 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2013 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import StringIO
+
+import eventlet
+import mock
+
+from quantum.agent.linux import ovs_lib
+from quantum.agent.linux import ovsdb_monitor
+from quantum.tests import base
+
+HEADINGS = ['row', 'action', 'name', 'ofport', 'external_ids']
+VIF_IDS = ['map', [['attached-mac', 'fa:16:3e:00:00:01'],
+                   ['iface-id', 'port1']]]
+VIF_IDS2 = ['map', [['attached-mac', 'fa:16:3e:00:00:02'],
+                    ['iface-id', 'port2']]]
+
+
+def _update(*rows):
+    return {'headings': HEADINGS, 'data': [list(row) for row in rows]}
+
+
+class TestInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestInterfaceMonitor, self).setUp()
+        self.bridge = ovs_lib.OVSBridge('br-int', 'sudo')
+        self.monitor = ovsdb_monitor.InterfaceMonitor(self.bridge, 'sudo')
+        # tap2 is plugged in another bridge
+        vsctl_patcher = mock.patch.object(self.bridge, 'run_vsctl',
+                                          return_value='patch-tun\ntap1\n')
+        self.run_vsctl = vsctl_patcher.start()
+        self.addCleanup(vsctl_patcher.stop)
+
+    def test_initial_rows(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS),
+            ('uuid2', 'initial', 'patch-tun', 2, ['map', []])))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+        self.run_vsctl.assert_called_once_with(['list-ifaces', 'br-int'])
+
+    def test_interface_of_other_bridge_is_ignored(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        self.monitor.wait_for_changes(0)
+        self.monitor.process_update(_update(
+            ('uuid3', 'insert', 'tap2', 3, VIF_IDS2)))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+        self.assertFalse(self.monitor._changed.ready())
+        self.assertEqual(self.run_vsctl.call_count, 2)
+
+    def test_interfaces_listed_when_vifs_change(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        # Statistics and the like of the interface changed
+        self.monitor.process_update(_update(
+            ('uuid1', 'old', '', '', ['map', []]),
+            ('uuid1', 'new', 'tap1', 1, VIF_IDS)))
+        self.assertEqual(self.run_vsctl.call_count, 1)
+
+    def test_inactive_until_interfaces_listed(self):
+        self.monitor._reader = mock.Mock()
+        self.run_vsctl.return_value = None
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        self.assertFalse(self.monitor.is_active)
+        self.run_vsctl.return_value = 'tap1\n'
+        self.monitor.process_update(_update(
+            ('uuid2', 'insert', 'patch-tun', 2, ['map', []])))
+        self.assertTrue(self.monitor.is_active)
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_vif_without_ofport_is_ignored(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'insert', 'tap1', ['set', []], VIF_IDS)))
+        self.assertEqual(self.monitor.get_vif_port_set(), set())
+        self.monitor.process_update(_update(
+            ('uuid1', 'old', '', ['set', []], ''),
+            ('uuid1', 'new', 'tap1', 3, VIF_IDS)))
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_delete(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        self.monitor.process_update(_update(
+            ('uuid1', 'delete', 'tap1', 1, VIF_IDS)))
+        self.assertEqual(self.monitor.get_vif_port_set(), set())
+
+    def test_wait_for_changes_returns_on_change(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        with mock.patch.object(eventlet, 'Timeout') as timeout:
+            self.monitor.wait_for_changes(10)
+            timeout.assert_called_once_with(10, False)
+        # The change was consumed
+        self.assertFalse(self.monitor._changed.ready())
+
+    def test_unchanged_ports_do_not_wake_up(self):
+        self.monitor.process_update(_update(
+            ('uuid1', 'initial', 'tap1', 1, VIF_IDS)))
+        self.monitor.wait_for_changes(0)
+        self.monitor.process_update(_update(
+            ('uuid1', 'old', '', '', ['map', []]),
+            ('uuid1', 'new', 'tap1', 1, VIF_IDS)))
+        self.assertFalse(self.monitor._changed.ready())
+
+    def test_read_updates(self):
+        process = mock.Mock()
+        process.stdout = StringIO.StringIO(
+            json.dumps(_update(('uuid1', 'initial', 'tap1', 1, VIF_IDS))) +
+            '\n')
+        with mock.patch('quantum.common.utils.subprocess_popen',
+                        return_value=process) as popen:
+            self.monitor.start()
+            self.assertFalse(self.monitor.is_active)
+            self.assertEqual(popen.call_args[0][0],
+                             ['sudo'] + ovsdb_monitor.MONITOR_CMD)
+            self.monitor._reader.wait()
+        process.wait.assert_called_once_with()
+        # ovsdb-client exited, the agent has to poll again
+        self.assertFalse(self.monitor.is_active)
+        self.assertEqual(self.monitor.get_vif_port_set(), set(['port1']))
+
+    def test_ensure_started_waits_respawn_interval(self):
+        with mock.patch.object(self.monitor, 'start') as start:
+            self.monitor.ensure_started()
+            self.assertEqual(start.call_count, 1)
+        self.monitor._last_start = 1000
+        with mock.patch.object(self.monitor, 'start') as start:
+            with mock.patch('time.time', return_value=1010):
+                self.monitor.ensure_started()
+                self.assertFalse(start.called)
+            with mock.patch('time.time', return_value=1031):
+                self.monitor.ensure_started()
+                self.assertEqual(start.call_count, 1)
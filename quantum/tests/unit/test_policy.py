@@ -159,6 +159,32 @@ class PolicyTestCase(base.BaseTestCase):
         policy.enforce(admin_context, lowercase_action, self.target)
         policy.enforce(admin_context, uppercase_action, self.target)
 
+    def test_compiled_rules_are_reused(self):
+        action = "example:my_file"
+        policy.check(self.context, action, {'tenant_id': 'fake'})
+        compiled = policy._COMPILED
+        rule = compiled['match'][(action, ())]
+        self.assertFalse(policy.check(self.context, action,
+                                      {'tenant_id': 'another'}))
+        self.assertIs(policy._COMPILED['match'][(action, ())], rule)
+
+    def test_rules_change_recompiles(self):
+        action = "example:allowed"
+        policy.enforce(self.context, action, self.target)
+        common_policy.set_rules(common_policy.Rules(
+            {action: common_policy.parse_rule('!')}))
+        self.assertRaises(exceptions.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+    def test_missing_target_key_fails_closed(self):
+        self.assertFalse(policy.check(self.context, "example:my_file", {}))
+
+    def test_check_list(self):
+        targets = [{'tenant_id': 'fake'}, {'tenant_id': 'another'}]
+        self.assertEqual(
+            policy.check_list(self.context, "example:my_file", targets),
+            [True, False])
+
 
 class DefaultPolicyTestCase(base.BaseTestCase):
 
@@ -293,6 +319,34 @@ class QuantumPolicyTestCase(base.BaseTestCase):
         result = policy.enforce(self.context, action, target, None)
         self.assertTrue(result)
 
+    def test_check_list_matches_check(self):
+        action = "get_network"
+        targets = [{'shared': True, 'tenant_id': 'somebody_else'},
+                   {'shared': False, 'tenant_id': 'somebody_else'},
+                   {'shared': False, 'tenant_id': 'fake'}]
+        self.assertEqual(
+            policy.check_list(self.context, action, targets, None),
+            [policy.check(self.context, action, target, None)
+             for target in targets])
+
+    def test_check_list_fetches_parents_once(self):
+        rules = {"get_port": "rule:admin_or_network_owner"}
+        self.rules.update((k, common_policy.parse_rule(v))
+                          for k, v in rules.items())
+        targets = [{'network_id': 'net1'}, {'network_id': 'net1'},
+                   {'network_id': 'net2'}, {'network_id': 'gone'}]
+        networks = [{'id': 'net1', 'tenant_id': 'fake'},
+                    {'id': 'net2', 'tenant_id': 'somebody_else'}]
+        with mock.patch.object(self.plugin, 'get_networks',
+                               return_value=networks) as get_networks:
+            result = policy.check_list(self.context, "get_port", targets,
+                                       self.plugin)
+        self.assertEqual(result, [True, True, False, False])
+        self.assertEqual(get_networks.call_count, 1)
+        self.assertEqual(
+            sorted(get_networks.call_args[1]['filters']['id']),
+            ['gone', 'net1', 'net2'])
+
     def test_enforce_parentresource_owner(self):
 
         def fakegetnetwork(*args, **kwargs):
@@ -1,3 +1,5 @@
+import datetime
+
 import mock
 from oslo.config import cfg
 import testtools
@@ -9,10 +11,13 @@ from quantum.common import config
 from quantum.common import exceptions
 from quantum import context
 from quantum.db import api as db
+from quantum.db import quota_db
 from quantum import manager
 from quantum.plugins.linuxbridge.db import l2network_db_v2
 from quantum import quota
+from quantum.openstack.common import timeutils
 from quantum.tests.unit import test_api_v2
+from quantum.tests.unit import test_db_plugin
 from quantum.tests.unit import test_extensions
 from quantum.tests.unit import testlib_api
 
@@ -341,3 +346,105 @@ class QuotaExtensionCfgTestCase(QuotaExtensionTestCase):
 
 class QuotaExtensionCfgTestCaseXML(QuotaExtensionCfgTestCase):
     fmt = 'xml'
+
+
+class QuotaUsageDbTestCase(test_db_plugin.QuantumDbPluginV2TestCase):
+
+    def setUp(self):
+        super(QuotaUsageDbTestCase, self).setUp()
+        engine = quota.QuotaEngine('quantum.db.quota_db.DbQuotaDriver')
+        quota_patcher = mock.patch.object(quota, 'QUOTAS', engine)
+        quota_patcher.start()
+        self.addCleanup(quota_patcher.stop)
+        quota.register_resources_from_config()
+        self.context = context.get_admin_context()
+        self.plugin = manager.QuantumManager.get_plugin()
+
+    def _count(self, resource):
+        return quota.QUOTAS.count(self.context, resource, self.plugin,
+                                  resource + 's', tenant_id=self._tenant_id)
+
+    def _get_usage(self, resource):
+        return self.context.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=self._tenant_id, resource=resource).one()
+
+    def test_usage_is_counted_once(self):
+        with self.network():
+            self.assertEqual(self._count('network'), 1)
+            self.assertEqual(self._get_usage('network').in_use, 1)
+            with self.network():
+                with mock.patch.object(self.plugin,
+                                       'get_networks_count') as count:
+                    self.assertEqual(self._count('network'), 2)
+                    self.assertFalse(count.called)
+
+    def test_usage_follows_deletes(self):
+        with self.network() as network:
+            for resource in ('network', 'subnet', 'port'):
+                self._count(resource)
+            with self.subnet(network=network) as subnet:
+                with self.port(subnet=subnet):
+                    self.assertEqual(self._count('subnet'), 1)
+                    self.assertEqual(self._count('port'), 1)
+                self.assertEqual(self._count('port'), 0)
+            self.assertEqual(self._count('subnet'), 0)
+            self._create_subnet(self.fmt, network['network']['id'],
+                                '10.0.1.0/24')
+            self.assertEqual(self._count('subnet'), 1)
+        # Deleting the network deleted its subnet
+        self.assertEqual(self._count('subnet'), 0)
+        self.assertEqual(self._count('network'), 0)
+
+    def test_bulk_create_updates_usage(self):
+        self._count('network')
+        res = self._create_network_bulk(self.fmt, 2, 'test', True)
+        self.assertEqual(res.status_int, 201)
+        self.assertEqual(self._count('network'), 2)
+
+    def test_usage_is_resynced(self):
+        cfg.CONF.set_override('quota_usage_sync_interval', 60,
+                              group='QUOTAS')
+        self._count('network')
+        usage = self._get_usage('network')
+        usage.update({'in_use': 5})
+        self.context.session.flush()
+        self.assertEqual(self._count('network'), 5)
+        usage.update({'synced_at': timeutils.utcnow() -
+                      datetime.timedelta(seconds=61)})
+        self.context.session.flush()
+        self.assertEqual(self._count('network'), 0)
+        self.context.session.refresh(usage)
+        self.assertEqual(usage.in_use, 0)
+
+    def test_usage_created_concurrently(self):
+        def count():
+            # Another request creates the counter meanwhile
+            other = context.get_admin_context()
+            with other.session.begin():
+                other.session.add(quota_db.QuotaUsage(
+                    tenant_id=self._tenant_id, resource='network',
+                    in_use=0, synced_at=timeutils.utcnow()))
+            return 0
+
+        driver = quota_db.DbQuotaDriver()
+        self.assertEqual(driver.get_usage(self.context, self._tenant_id,
+                                          'network', count), 0)
+        self.assertEqual(self._get_usage('network').in_use, 0)
+        # The counter is still updated
+        with self.network():
+            self.assertEqual(self._count('network'), 1)
+
+    def test_untracked_resource_is_counted(self):
+        quota.QUOTAS.register_resource_by_name('extra1')
+        count = mock.Mock(return_value=3)
+        with mock.patch.object(quota.QUOTAS.resources['extra1'], 'count',
+                               count):
+            self.assertEqual(quota.QUOTAS.count(self.context, 'extra1',
+                                                tenant_id=self._tenant_id),
+                             3)
+            self.assertEqual(quota.QUOTAS.count(self.context, 'extra1',
+                                                tenant_id=self._tenant_id),
+                             3)
+        self.assertEqual(count.call_count, 2)
+        self.assertFalse(self.context.session.query(
+            quota_db.QuotaUsage).count())
@@ -0,0 +1,140 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import stat
+
+import eventlet
+import fixtures
+import mock
+from oslo.config import cfg
+
+from quantum.agent.common import config
+from quantum.agent.linux import utils
+from quantum.rootwrap import daemon
+from quantum.rootwrap import filters
+from quantum.tests import base
+
+
+class RootwrapDaemonTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        self.socket_path = self.useFixture(
+            fixtures.TempDir()).join('rootwrap.sock')
+        self.server = daemon.RootwrapServer([
+            filters.CommandFilter('/bin/cat', 'root'),
+            filters.RegExpFilter('/bin/echo', 'root', 'echo', '[a-z]+'),
+            filters.CommandFilter('/nonexistent/true', 'root')])
+        sock = daemon.listen(self.socket_path)
+        self.addCleanup(sock.close)
+        server = eventlet.spawn(self.server.serve, sock)
+        self.addCleanup(server.kill)
+        self.client = daemon.RootwrapClient(self.socket_path)
+
+    def test_socket_is_private(self):
+        mode = os.stat(self.socket_path).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0600)
+
+    def test_execute(self):
+        self.assertEqual(self.client.execute(['echo', 'foo']),
+                         (0, 'foo\n', ''))
+
+    def test_process_input(self):
+        data = 'binary \xff\x00 data'
+        self.assertEqual(self.client.execute(['cat'], data), (0, data, ''))
+
+    def test_unauthorized_command(self):
+        returncode, stdout, stderr = self.client.execute(['echo', 'FOO'])
+        self.assertEqual(returncode, daemon.RC_UNAUTHORIZED)
+        self.assertEqual(stdout, '')
+
+    def test_missing_executable(self):
+        returncode, stdout, stderr = self.client.execute(['true'])
+        self.assertEqual(returncode, daemon.RC_NOEXECFOUND)
+
+    def test_pipelined_requests(self):
+        pool = eventlet.GreenPool()
+        words = ['foo', 'bar', 'baz', 'qux']
+        results = pool.imap(lambda word: self.client.execute(['echo', word]),
+                            words)
+        self.assertEqual([stdout for _rc, stdout, _err in results],
+                         ['%s\n' % word for word in words])
+        self.assertEqual(self.client._pending, {})
+
+    def test_daemon_unreachable(self):
+        client = daemon.RootwrapClient(self.socket_path + '.missing')
+        self.assertRaises(daemon.RootwrapDaemonError, client.execute,
+                          ['echo', 'foo'])
+
+    def test_connection_lost_fails_pending_commands(self):
+        with mock.patch.object(self.server, 'run_command',
+                               side_effect=lambda *args: eventlet.sleep(10)):
+            waiter = eventlet.spawn(self.client.execute, ['echo', 'foo'])
+            eventlet.sleep(0.1)
+            self.client._sock.shutdown(2)
+            self.assertRaises(RuntimeError, waiter.wait)
+        # The next command opens a new connection
+        self.assertEqual(self.client.execute(['echo', 'foo'])[0], 0)
+
+
+class AgentUtilsRootwrapDaemonTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(AgentUtilsRootwrapDaemonTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon', '/fake/rootwrap.sock',
+                              'AGENT')
+        self.addCleanup(cfg.CONF.reset)
+        self.addCleanup(utils._rootwrap_clients.clear)
+        self.client = mock.Mock()
+        utils._rootwrap_clients['/fake/rootwrap.sock'] = self.client
+
+    def test_execute_through_daemon(self):
+        self.client.execute.return_value = (0, 'foo\n', '')
+        with mock.patch.object(utils, '_execute_subprocess') as subprocess:
+            self.assertEqual(utils.execute(['echo', 'foo'], 'sudo'), 'foo\n')
+        self.client.execute.assert_called_once_with(['echo', 'foo'], None)
+        self.assertFalse(subprocess.called)
+
+    def test_daemon_failure_raises(self):
+        self.client.execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['false'], 'sudo')
+
+    def test_falls_back_to_root_helper(self):
+        self.client.execute.side_effect = daemon.RootwrapDaemonError()
+        with mock.patch.object(utils, '_execute_subprocess',
+                               return_value=(0, 'foo\n', '')) as subprocess:
+            self.assertEqual(utils.execute(['echo', 'foo'], 'sudo'), 'foo\n')
+        subprocess.assert_called_once_with(['sudo', 'echo', 'foo'], None,
+                                           None)
+
+    def test_addl_env_bypasses_daemon(self):
+        with mock.patch.object(utils, '_execute_subprocess',
+                               return_value=(0, 'foo\n', '')) as subprocess:
+            self.assertEqual(utils.execute(['echo', 'foo'], 'sudo',
+                                           addl_env={'FOO': 'bar'}),
+                             'foo\n')
+        self.assertFalse(self.client.execute.called)
+        subprocess.assert_called_once_with(['sudo', 'echo', 'foo'], None,
+                                           {'FOO': 'bar'})
+
+    def test_without_root_helper(self):
+        with mock.patch.object(utils, '_execute_subprocess',
+                               return_value=(0, '', '')):
+            utils.execute(['ls'])
+        self.assertFalse(self.client.execute.called)
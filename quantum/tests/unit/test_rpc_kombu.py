@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo.config import cfg
+
+from quantum.tests import base
+
+try:
+    import kombu
+    from quantum.openstack.common.rpc import impl_kombu
+except ImportError:
+    kombu = None
+    impl_kombu = None
+
+
+class TestKombuConnection(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestKombuConnection, self).setUp()
+        if kombu is None:
+            self.skipTest("Test requires kombu")
+        self.config(fake_rabbit=True)
+        self.conn = impl_kombu.Connection(cfg.CONF)
+        self.addCleanup(self.conn.close)
+        self.received = []
+
+    def _callback(self, message):
+        self.received.append(message)
+
+    def test_publishers_are_reused(self):
+        self.conn.declare_topic_consumer('reused_topic', self._callback)
+        self.conn.topic_send('reused_topic', 'message 1')
+        publishers = self.conn.publishers.values()
+        self.conn.topic_send('reused_topic', 'message 2')
+        self.assertEqual(len(publishers), 1)
+        self.assertEqual(self.conn.publishers.values(), publishers)
+        self.conn.consume(limit=2)
+        self.assertEqual(self.received, ['message 1', 'message 2'])
+
+    def test_least_recently_used_publisher_is_dropped(self):
+        self.config(rabbit_publisher_cache_size=2)
+        for topic in ('topic1', 'topic2', 'topic1', 'topic3'):
+            self.conn.topic_send(topic, 'message')
+        self.assertEqual([key[1] for key in self.conn.publishers],
+                         ['topic1', 'topic3'])
+
+    def test_publishers_not_kept_without_cache(self):
+        self.config(rabbit_publisher_cache_size=0)
+        self.conn.topic_send('a_topic', 'message')
+        self.assertEqual(len(self.conn.publishers), 0)
+
+    def test_direct_publishers_not_kept(self):
+        self.conn.declare_direct_consumer('a_msg_id', self._callback)
+        self.conn.direct_send('a_msg_id', 'reply')
+        self.assertEqual(len(self.conn.publishers), 0)
+        self.conn.consume(limit=1)
+        self.assertEqual(self.received, ['reply'])
+
+    def test_reset_keeps_channel_only_published_on(self):
+        self.conn.topic_send('a_topic', 'message')
+        channel = self.conn.channel
+        publishers = self.conn.publishers.values()
+        self.conn.reset()
+        self.assertIs(self.conn.channel, channel)
+        self.assertEqual(self.conn.publishers.values(), publishers)
+
+    def test_reset_renews_channel_consumed_from(self):
+        self.conn.declare_topic_consumer('reset_topic', self._callback)
+        self.conn.topic_send('reset_topic', 'message')
+        channel = self.conn.channel
+        self.conn.reset()
+        self.assertIsNot(self.conn.channel, channel)
+        self.assertEqual(len(self.conn.publishers), 0)
+        self.assertEqual(self.conn.consumers, [])
+        # Publishers are bound to the new channel again
+        self.conn.declare_topic_consumer('reset_topic', self._callback)
+        self.conn.topic_send('reset_topic', 'message')
+        self.assertIs(self.conn.publishers.values()[0].producer.channel,
+                      self.conn.channel)
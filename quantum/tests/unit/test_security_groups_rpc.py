@@ -637,44 +637,6 @@ IPTABLES_FILTER_1 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
-IPTABLES_FILTER_1_2 = """:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:quantum-filter-top - [0:0]
--A FORWARD -j quantum-filter-top
--A OUTPUT -j quantum-filter-top
--A quantum-filter-top -j %(bn)s-local
--A INPUT -j %(bn)s-INPUT
--A OUTPUT -j %(bn)s-OUTPUT
--A FORWARD -j %(bn)s-FORWARD
--A %(bn)s-sg-fallback -j DROP
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
--A %(bn)s-i_port1 -m state --state INVALID -j DROP
--A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
--A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
--A %(bn)s-i_port1 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port1 ! -s 10.0.0.3 -j DROP
--A %(bn)s-o_port1 -p udp --sport 67 --dport 68 -j DROP
--A %(bn)s-o_port1 -m state --state INVALID -j DROP
--A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j RETURN
--A %(bn)s-o_port1 -j %(bn)s-sg-fallback
--A %(bn)s-sg-chain -j ACCEPT
-""" % IPTABLES_ARG
-
 IPTABLES_ARG['chains'] = CHAINS_2
 
 IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
@@ -736,12 +698,28 @@ IPTABLES_FILTER_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
-IPTABLES_FILTER_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
+IPTABLES_ARG['chains'] = CHAINS_EMPTY
+IPTABLES_FILTER_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
+:quantum-filter-top - [0:0]
+-A FORWARD -j quantum-filter-top
+-A OUTPUT -j quantum-filter-top
+-A quantum-filter-top -j %(bn)s-local
+-A INPUT -j %(bn)s-INPUT
+-A OUTPUT -j %(bn)s-OUTPUT
+-A FORWARD -j %(bn)s-FORWARD
+-A %(bn)s-sg-fallback -j DROP
+""" % IPTABLES_ARG
+
+IPTABLES_ARG['chains'] = CHAINS_1
+IPTABLES_FILTER_V6_1 = """:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
+:%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
@@ -758,43 +736,20 @@ IPTABLES_FILTER_2_2 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
 -A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port1 ! -s 10.0.0.3 -j DROP
--A %(bn)s-o_port1 -p udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port1 -p icmpv6 -j RETURN
 -A %(bn)s-o_port1 -m state --state INVALID -j DROP
 -A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j RETURN
 -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
--A %(bn)s-i_port2 -m state --state INVALID -j DROP
--A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port2 -j RETURN -p tcp --dport 22
--A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
--A %(bn)s-i_port2 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
--A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
--A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
--A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port2 ! -s 10.0.0.4 -j DROP
--A %(bn)s-o_port2 -p udp --sport 67 --dport 68 -j DROP
--A %(bn)s-o_port2 -m state --state INVALID -j DROP
--A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port2 -j RETURN
--A %(bn)s-o_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
-IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
+IPTABLES_ARG['chains'] = CHAINS_2
+IPTABLES_FILTER_V6_2 = """:%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
@@ -816,47 +771,33 @@ IPTABLES_FILTER_2_3 = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
--A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
--A %(bn)s-i_port1 -j RETURN -p icmp
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
 -A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port1 ! -s 10.0.0.3 -j DROP
--A %(bn)s-o_port1 -p udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port1 -p icmpv6 -j RETURN
 -A %(bn)s-o_port1 -m state --state INVALID -j DROP
 -A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j RETURN
 -A %(bn)s-o_port1 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
 -A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
--A %(bn)s-i_port2 -j RETURN -p tcp --dport 22
--A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
--A %(bn)s-i_port2 -j RETURN -p icmp
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
 -A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
--A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
--A %(bn)s-o_port2 ! -s 10.0.0.4 -j DROP
--A %(bn)s-o_port2 -p udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port2 -p icmpv6 -j RETURN
 -A %(bn)s-o_port2 -m state --state INVALID -j DROP
 -A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port2 -j RETURN
 -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-sg-chain -j ACCEPT
 """ % IPTABLES_ARG
 
 IPTABLES_ARG['chains'] = CHAINS_EMPTY
-IPTABLES_FILTER_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
+IPTABLES_FILTER_V6_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
 :%(bn)s-(%(chains)s) - [0:0]
@@ -872,102 +813,104 @@ IPTABLES_FILTER_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
 -A %(bn)s-sg-fallback -j DROP
 """ % IPTABLES_ARG
 
-IPTABLES_ARG['chains'] = CHAINS_1
-IPTABLES_FILTER_V6_1 = """:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:quantum-filter-top - [0:0]
--A FORWARD -j quantum-filter-top
--A OUTPUT -j quantum-filter-top
--A quantum-filter-top -j %(bn)s-local
--A INPUT -j %(bn)s-INPUT
--A OUTPUT -j %(bn)s-OUTPUT
--A FORWARD -j %(bn)s-FORWARD
--A %(bn)s-sg-fallback -j DROP
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+# Once the tables are applied, rules changes only rewrite the chains
+# involved, with iptables-restore --noflush
+IPTABLES_CHAINS_1_2 = """:%(bn)s-i_port1 - [0:0]
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT
+""" % IPTABLES_ARG
+
+IPTABLES_CHAINS_2 = """:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port2 - [0:0]
+:%(bn)s-o_port2 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p icmpv6 -j RETURN
--A %(bn)s-o_port1 -m state --state INVALID -j DROP
--A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j %(bn)s-sg-fallback
+-A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port2 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
+-A %(bn)s-o_port2 -p udp --sport 68 --dport 67 -j RETURN
+-A %(bn)s-o_port2 ! -s 10.0.0.4 -j DROP
+-A %(bn)s-o_port2 -p udp --sport 67 --dport 68 -j DROP
+-A %(bn)s-o_port2 -m state --state INVALID -j DROP
+-A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-o_port2 -j RETURN
+-A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-sg-chain -j ACCEPT
+COMMIT
 """ % IPTABLES_ARG
 
-IPTABLES_ARG['chains'] = CHAINS_2
-IPTABLES_FILTER_V6_2 = """:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:quantum-filter-top - [0:0]
--A FORWARD -j quantum-filter-top
--A OUTPUT -j quantum-filter-top
--A quantum-filter-top -j %(bn)s-local
--A INPUT -j %(bn)s-INPUT
--A OUTPUT -j %(bn)s-OUTPUT
--A FORWARD -j %(bn)s-FORWARD
--A %(bn)s-sg-fallback -j DROP
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+IPTABLES_CHAINS_2_2 = """:%(bn)s-i_port1 - [0:0]
 -A %(bn)s-i_port1 -m state --state INVALID -j DROP
 -A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port1 -j %(bn)s-sg-fallback
+COMMIT
+""" % IPTABLES_ARG
+
+IPTABLES_CHAINS_2_3 = """:%(bn)s-i_port1 - [0:0]
+:%(bn)s-i_port2 - [0:0]
+-A %(bn)s-i_port1 -m state --state INVALID -j DROP
+-A %(bn)s-i_port1 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port1 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port1 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port1 -j RETURN -s 10.0.0.4
+-A %(bn)s-i_port1 -j RETURN -p icmp
 -A %(bn)s-i_port1 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
--A %(bn)s-o_port1 -m mac ! --mac-source 12:34:56:78:9a:bc -j DROP
--A %(bn)s-o_port1 -p icmpv6 -j RETURN
--A %(bn)s-o_port1 -m state --state INVALID -j DROP
--A %(bn)s-o_port1 -m state --state ESTABLISHED,RELATED -j RETURN
--A %(bn)s-o_port1 -j %(bn)s-sg-fallback
--A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
 -A %(bn)s-i_port2 -m state --state INVALID -j DROP
 -A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port2 -j RETURN -p udp --dport 68 --sport 67 -s 10.0.0.2
+-A %(bn)s-i_port2 -j RETURN -p tcp --dport 22
+-A %(bn)s-i_port2 -j RETURN -s 10.0.0.3
+-A %(bn)s-i_port2 -j RETURN -p icmp
 -A %(bn)s-i_port2 -j %(bn)s-sg-fallback
+COMMIT
+""" % IPTABLES_ARG
+
+IPTABLES_CHAINS_V6_2 = """:%(bn)s-FORWARD - [0:0]
+:%(bn)s-INPUT - [0:0]
+:%(bn)s-i_port2 - [0:0]
+:%(bn)s-o_port2 - [0:0]
+:%(bn)s-sg-chain - [0:0]
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-sg-chain
+-A %(bn)s-FORWARD %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-sg-chain
 -A %(bn)s-FORWARD %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-sg-chain
--A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
 -A %(bn)s-INPUT %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
+-A %(bn)s-i_port2 -m state --state INVALID -j DROP
+-A %(bn)s-i_port2 -m state --state ESTABLISHED,RELATED -j RETURN
+-A %(bn)s-i_port2 -j %(bn)s-sg-fallback
 -A %(bn)s-o_port2 -m mac ! --mac-source 12:34:56:78:9a:bd -j DROP
 -A %(bn)s-o_port2 -p icmpv6 -j RETURN
 -A %(bn)s-o_port2 -m state --state INVALID -j DROP
 -A %(bn)s-o_port2 -m state --state ESTABLISHED,RELATED -j RETURN
 -A %(bn)s-o_port2 -j %(bn)s-sg-fallback
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port1 -j %(bn)s-i_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port1 -j %(bn)s-o_port1
+-A %(bn)s-sg-chain %(physdev)s --physdev-INGRESS tap_port2 -j %(bn)s-i_port2
+-A %(bn)s-sg-chain %(physdev)s --physdev-EGRESS tap_port2 -j %(bn)s-o_port2
 -A %(bn)s-sg-chain -j ACCEPT
-""" % IPTABLES_ARG
-
-IPTABLES_ARG['chains'] = CHAINS_EMPTY
-IPTABLES_FILTER_V6_EMPTY = """:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:%(bn)s-(%(chains)s) - [0:0]
-:quantum-filter-top - [0:0]
--A FORWARD -j quantum-filter-top
--A OUTPUT -j quantum-filter-top
--A quantum-filter-top -j %(bn)s-local
--A INPUT -j %(bn)s-INPUT
--A OUTPUT -j %(bn)s-OUTPUT
--A FORWARD -j %(bn)s-FORWARD
--A %(bn)s-sg-fallback -j DROP
+COMMIT
 """ % IPTABLES_ARG
 
 FIREWALL_BASE_PACKAGE = 'quantum.agent.linux.iptables_firewall.'
@@ -1083,37 +1026,32 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         value = value.replace(']', '\]')
         return mox.Regex(value)
 
-    def _replay_iptables(self, v4_filter, v6_filter):
+    def _replay_table(self, cmd, table, value):
         self.iptables.execute(
-            ['iptables-save', '-t', 'filter'],
+            ['%s-save' % cmd, '-t', table],
             root_helper=self.root_helper).AndReturn('')
 
         self.iptables.execute(
-            ['iptables-restore'],
-            process_input=self._regex(v4_filter),
+            ['%s-restore' % cmd],
+            process_input=self._regex(value),
             root_helper=self.root_helper).AndReturn('')
 
-        self.iptables.execute(
-            ['iptables-save', '-t', 'nat'],
-            root_helper=self.root_helper).AndReturn('')
+    def _replay_iptables(self, v4_filter, v6_filter, nat=False):
+        self._replay_table('iptables', 'filter', v4_filter)
+        if nat:
+            self._replay_table('iptables', 'nat', IPTABLES_NAT)
+        self._replay_table('ip6tables', 'filter', v6_filter)
 
+    def _replay_chains(self, cmd, value):
         self.iptables.execute(
-            ['iptables-restore'],
-            process_input=self._regex(IPTABLES_NAT),
-            root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(
-            ['ip6tables-save', '-t', 'filter'],
-            root_helper=self.root_helper).AndReturn('')
-
-        self.iptables.execute(
-            ['ip6tables-restore'],
-            process_input=self._regex(v6_filter),
+            ['%s-restore' % cmd, '--noflush'],
+            process_input=self._regex(value),
             root_helper=self.root_helper).AndReturn('')
 
     def test_prepare_remove_port(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
-        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
+        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1,
+                              nat=True)
         self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
         self.mox.ReplayAll()
 
@@ -1123,10 +1061,12 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
     def test_security_group_member_updated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices1
-        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_1_2, IPTABLES_FILTER_V6_1)
-        self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_2, IPTABLES_FILTER_V6_2)
+        self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1,
+                              nat=True)
+        self._replay_chains('iptables', IPTABLES_CHAINS_1_2)
+        self._replay_chains('iptables', IPTABLES_CHAINS_2)
+        self._replay_chains('ip6tables', IPTABLES_CHAINS_V6_2)
+        self._replay_chains('iptables', IPTABLES_CHAINS_2_2)
         self._replay_iptables(IPTABLES_FILTER_1, IPTABLES_FILTER_V6_1)
         self._replay_iptables(IPTABLES_FILTER_EMPTY, IPTABLES_FILTER_V6_EMPTY)
         self.mox.ReplayAll()
@@ -1144,8 +1084,9 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
 
     def test_security_group_rule_udpated(self):
         self.rpc.security_group_rules_for_devices.return_value = self.devices2
-        self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2)
-        self._replay_iptables(IPTABLES_FILTER_2_3, IPTABLES_FILTER_V6_2)
+        self._replay_iptables(IPTABLES_FILTER_2, IPTABLES_FILTER_V6_2,
+                              nat=True)
+        self._replay_chains('iptables', IPTABLES_CHAINS_2_3)
         self.mox.ReplayAll()
 
         self.agent.prepare_devices_filter(['tap_port1', 'tap_port3'])